@@ -16,6 +16,7 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+from contextlib import contextmanager
 import datetime
 from urllib import quote_plus
 import urlparse
@@ -48,8 +49,27 @@ class ExternalAccount(models.Model):
     def is_for_video_url(self, video_url):
         return video_url.type == self.video_url_type
 
-    def update_subtitles(self, video_url, language):
-        version = language.get_public_tip()
+    def update_subtitles(self, video_url, language, version=None):
+        """Sync the public tip for a language.
+
+        :param version: public tip of the language.  Pass this in if you've
+            already fetched it to avoid another query.
+        """
+        if version is None:
+            version = language.get_public_tip()
+        try:
+            self.do_update_subtitles(video_url, language, version)
+        except StandardError, e:
+            self.record_update_result(video_url, language, version, e)
+        else:
+            self.record_update_result(video_url, language, version)
+
+    def record_update_result(self, video_url, language, version, error=None):
+        """Record the result of calling do_update_subtitles()
+
+        :param error: exception raised by do_update_subtitles(), or None if
+            it succeeded
+        """
         sync_history_values = {
             'account': self,
             'video_url': video_url,
@@ -57,11 +77,8 @@ class ExternalAccount(models.Model):
             'action': SyncHistory.ACTION_UPDATE_SUBTITLES,
             'version': version,
         }
-
-        try:
-            self.do_update_subtitles(video_url, language, version)
-        except StandardError, e:
-            SyncHistory.objects.create_for_error(e, **sync_history_values)
+        if error is not None:
+            SyncHistory.objects.create_for_error(error, **sync_history_values)
         else:
             SyncHistory.objects.create_for_success(**sync_history_values)
             SyncedSubtitleVersion.objects.set_synced_version(
@@ -84,10 +101,21 @@ class ExternalAccount(models.Model):
             SyncedSubtitleVersion.objects.unset_synced_version(
                 self, video_url, language)
 
+    @contextmanager
+    def sync_session(self):
+        """Context manager for syncing many subtitles at once.
+
+        Subclasses can override this to reuse a connection or an API session
+        for all the do_update_subtitles() and do_delete_subtitles() calls made
+        inside the block.
+        """
+        yield
+
     def do_update_subtitles(self, video_url, language, version):
         """Do the work needed to update subititles.
 
-        Subclasses must implement this method.
+        Subclasses must implement this method.  It may be called from a
+        thread other than the main one, so it shouldn't use the database.
         """
         raise NotImplementedError()
 
@@ -118,19 +146,42 @@ class KalturaAccount(ExternalAccount):
     def __unicode__(self):
         return "KalturaAccount: %s" % (self.partner_id)
 
+    # KalturaClient to use inside sync_session()
+    _sync_client = None
+
+    @contextmanager
+    def sync_session(self):
+        client = syncing.kaltura.KalturaClient(self.partner_id, self.secret)
+        self._sync_client = client
+        try:
+            with client:
+                yield
+        finally:
+            self._sync_client = None
+
     def do_update_subtitles(self, video_url, language, tip):
         kaltura_id = video_url.get_video_type().kaltura_id()
         subtitles = tip.get_subtitles()
         sub_data = babelsubs.to(subtitles, 'srt')
 
-        syncing.kaltura.update_subtitles(self.partner_id, self.secret,
-                                         kaltura_id, language.language_code,
-                                         sub_data)
+        if self._sync_client is not None:
+            self._sync_client.update_subtitles(
+                kaltura_id, language.language_code, sub_data)
+        else:
+            syncing.kaltura.update_subtitles(self.partner_id, self.secret,
+                                             kaltura_id,
+                                             language.language_code,
+                                             sub_data)
 
     def do_delete_subtitles(self, video_url, language):
         kaltura_id = video_url.get_video_type().kaltura_id()
-        syncing.kaltura.delete_subtitles(self.partner_id, self.secret,
-                                         kaltura_id, language.language_code)
+        if self._sync_client is not None:
+            self._sync_client.delete_subtitles(kaltura_id,
+                                               language.language_code)
+        else:
+            syncing.kaltura.delete_subtitles(self.partner_id, self.secret,
+                                             kaltura_id,
+                                             language.language_code)
 
 class BrightcoveAccount(ExternalAccount):
     account_type = 'B'
@@ -262,6 +313,14 @@ class SyncedSubtitleVersionManager(models.Manager):
         synced_version.version = version
         synced_version.save()
 
+    def is_synced(self, account, video_url, language, version):
+        """Check if version is already the synced version for a language."""
+        return self.filter(account_type=account.account_type,
+                           account_id=account.id,
+                           video_url=video_url,
+                           language=language,
+                           version=version).exists()
+
     def unset_synced_version(self, account, video_url, language):
         """Set the synced version for a given account/language."""
         self.filter(account_type=account.account_type,
@@ -35,8 +35,7 @@ def on_public_tip_changed(signal, sender, version, **kwargs):
         raise ValueError("version has wrong type: %s" % version)
     language = sender
     for account, video_url in lookup_accounts(language.video):
-        tasks.update_subtitles.delay(account.account_type, account.id,
-                                     video_url.id, language.id)
+        tasks.queue_update_subtitles(account, video_url, language)
 
 @receiver(subtitles.signals.language_deleted)
 def on_language_deleted(signal, sender, **kwargs):
@@ -19,6 +19,7 @@
 """externalsites.syncing.kaltura -- Sync subtitles to/from kaltura"""
 
 from xml.dom import minidom
+import threading
 
 import requests
 
@@ -75,20 +76,29 @@ def _start_session(partner_id, secret):
 def _end_session(ks):
     _make_request('session', 'end', { 'ks': ks })
 
-def _find_existing_captionset(ks, video_id, language_code):
-    language = KalturaLanguageMap.get_name(language_code)
+def _list_captions(ks, video_id):
+    """List the caption assets that we've synced for an entry.
+
+    :returns: list of (caption_id, language_name) tuples
+    """
     result = _make_request('caption_captionasset', 'list', {
         'ks': ks,
         'filter:entryIdEqual': video_id,
     })
 
+    captions = []
     objects = _find_child(result, 'objects')
     for item in objects.getElementsByTagName('item'):
         partner_data = _find_child(item, 'partnerData')
-        language_node = _find_child(item, 'language')
-        if (_node_text(partner_data) == PARTNER_DATA_TAG and
-            _node_text(language_node) == language):
-            return _node_text(_find_child(item, 'id'))
+        if _node_text(partner_data) == PARTNER_DATA_TAG:
+            captions.append((_node_text(_find_child(item, 'id')),
+                             _node_text(_find_child(item, 'language'))))
+    return captions
+
+def _find_caption_id(captions, language):
+    for caption_id, caption_language in captions:
+        if caption_language == language:
+            return caption_id
     return None
 
 def _add_captions(ks, video_id, language_code):
@@ -118,22 +128,77 @@ def _delete_captions(ks, caption_id):
         'captionAssetId': caption_id,
     })
 
-def update_subtitles(partner_id, secret, video_id, language_code,
-                     srt_data):
-    ks = _start_session(partner_id, secret)
-    try:
-        caption_id = _find_existing_captionset(ks, video_id, language_code)
+class KalturaClient(object):
+    """Sync subtitles for many entries using a single session.
+
+    The session is started on the first request and ended by close().  The
+    caption asset list for each entry is fetched once and then kept up to
+    date as we add and delete captions.
+
+    Clients can be shared between threads, as long as each entry is only
+    synced by one thread at a time.
+
+    Use it as a context manager to close it automatically:
+
+    with KalturaClient(partner_id, secret) as client:
+        client.update_subtitles(video_id, 'en', srt_data)
+    """
+    def __init__(self, partner_id, secret):
+        self.partner_id = partner_id
+        self.secret = secret
+        self.ks = None
+        self.session_lock = threading.Lock()
+        # maps entry ids to the list of captions we've synced for them
+        self.caption_lists = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def session(self):
+        with self.session_lock:
+            if self.ks is None:
+                self.ks = _start_session(self.partner_id, self.secret)
+            return self.ks
+
+    def close(self):
+        if self.ks is not None:
+            ks, self.ks = self.ks, None
+            _end_session(ks)
+        self.caption_lists.clear()
+
+    def captions(self, video_id):
+        if video_id not in self.caption_lists:
+            self.caption_lists[video_id] = _list_captions(self.session(),
+                                                          video_id)
+        return self.caption_lists[video_id]
+
+    def update_subtitles(self, video_id, language_code, srt_data):
+        ks = self.session()
+        language = KalturaLanguageMap.get_name(language_code)
+        captions = self.captions(video_id)
+        caption_id = _find_caption_id(captions, language)
         if caption_id is None:
             caption_id = _add_captions(ks, video_id, language_code)
+            captions.append((caption_id, language))
         _update_caption_content(ks, caption_id, srt_data)
-    finally:
-        _end_session(ks)
 
-def delete_subtitles(partner_id, secret, video_id, language_code):
-    ks = _start_session(partner_id, secret)
-    try:
-        caption_id = _find_existing_captionset(ks, video_id, language_code)
+    def delete_subtitles(self, video_id, language_code):
+        ks = self.session()
+        language = KalturaLanguageMap.get_name(language_code)
+        captions = self.captions(video_id)
+        caption_id = _find_caption_id(captions, language)
         if caption_id is not None:
             _delete_captions(ks, caption_id)
-    finally:
-        _end_session(ks)
+            captions[:] = [c for c in captions if c[0] != caption_id]
+
+def update_subtitles(partner_id, secret, video_id, language_code,
+                     srt_data):
+    with KalturaClient(partner_id, secret) as client:
+        client.update_subtitles(video_id, language_code, srt_data)
+
+def delete_subtitles(partner_id, secret, video_id, language_code):
+    with KalturaClient(partner_id, secret) as client:
+        client.delete_subtitles(video_id, language_code)
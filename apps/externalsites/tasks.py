@@ -16,23 +16,51 @@
 # along with this program. If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+import datetime
 import logging
+from multiprocessing.pool import ThreadPool
 
 from celery.task import task
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 
-from externalsites.models import get_account
+from externalsites.models import get_account, SyncedSubtitleVersion
 from subtitles.models import SubtitleLanguage, SubtitleVersion
+from utils.coalesce import CoalescingQueue
 from videos.models import VideoUrl
 
 celery_logger = logging.getLogger('celery.task')
 
+# Number of videos to sync at once in update_all_subtitles
+UPDATE_ALL_CONCURRENCY = 4
+# Number of videos to fetch from the DB at once in update_all_subtitles
+UPDATE_ALL_CHUNK_SIZE = 100
+UPDATE_ALL_PROGRESS_TIMEOUT = 60 * 60 * 24 * 7
+
+# Subtitles often get saved several times in a row while someone is editing
+# them.  Wait until the edits settle down before syncing, but don't put it off
+# for longer than max_wait.
+sync_queue = CoalescingQueue('externalsites-sync', quiet_period=60,
+                             max_wait=60 * 10)
+
+def _sync_key(args):
+    return '-'.join(str(arg) for arg in args)
+
+def queue_update_subtitles(account, video_url, language):
+    """Schedule update_subtitles() to run once a language stops changing."""
+    args = (account.account_type, account.id, video_url.id, language.id)
+    sync_queue.add(_sync_key(args), update_subtitles, args=args)
+
 @task
 def update_subtitles(account_type, account_id, video_url_id, lang_id):
     """Update a subtitles for a language"""
     celery_logger.info("externalsites.tasks.update_subtitles"
                        "(%s, %s, %s, %s, %s)", account_type, account_id,
                        video_url_id, lang_id)
+    args = (account_type, account_id, video_url_id, lang_id)
+    if sync_queue.reschedule(_sync_key(args), update_subtitles, args=args):
+        return
+    sync_queue.pop(_sync_key(args))
     try:
         account = get_account(account_type, account_id)
         language = SubtitleLanguage.objects.get(id=lang_id)
@@ -51,8 +79,13 @@ def update_subtitles(account_type, account_id, video_url_id, lang_id):
             }
         )
         return
-    else:
-        account.update_subtitles(video_url, language)
+    version = language.get_public_tip()
+    if (version is not None and SyncedSubtitleVersion.objects.is_synced(
+            account, video_url, language, version)):
+        celery_logger.info("update_subtitles: version %s already synced",
+                           version.id)
+        return
+    account.update_subtitles(video_url, language, version)
 
 @task
 def delete_subtitles(account_type, account_id, video_url_id, lang_id):
@@ -105,12 +138,141 @@ def update_all_subtitles(account_type, account_id):
             }
         )
         return
-    team = account.team
-    for video in team.videos.all():
-        for video_url in video.get_video_urls():
-            if account.is_for_video_url(video_url):
-                _sync_all_languages(account, video_url, video)
-
-def _sync_all_languages(account, video_url, video):
-    for language in video.newsubtitlelanguage_set.having_public_versions():
-        account.update_subtitles(video_url, language)
+    progress = UpdateAllProgress(account)
+    video_url_ids = list(VideoUrl.objects
+                         .filter(video__teamvideo__team=account.team,
+                                 type=account.video_url_type)
+                         .order_by('pk')
+                         .values_list('pk', flat=True))
+    progress.start(len(video_url_ids))
+    if UPDATE_ALL_CONCURRENCY > 1:
+        pool = ThreadPool(UPDATE_ALL_CONCURRENCY)
+    else:
+        pool = None
+    try:
+        with account.sync_session():
+            for i in xrange(0, len(video_url_ids), UPDATE_ALL_CHUNK_SIZE):
+                chunk_ids = video_url_ids[i:i+UPDATE_ALL_CHUNK_SIZE]
+                _update_all_chunk(account, chunk_ids, pool, progress)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    progress.finish()
+
+def _update_all_chunk(account, video_url_ids, pool, progress):
+    video_urls = list(VideoUrl.objects.filter(pk__in=video_url_ids)
+                      .order_by('pk'))
+    versions_by_video = {}
+    version_qs = (SubtitleVersion.objects.public_tips()
+                  .filter(video__in=[vu.video_id for vu in video_urls])
+                  .select_related('subtitle_language')
+                  .order_by('subtitle_language__id'))
+    for version in version_qs:
+        # Parse the subtitles now, so that the sync threads don't need to
+        # use the database.
+        version.get_subtitles()
+        versions_by_video.setdefault(version.video_id, []).append(version)
+    work = [(video_url, versions_by_video.get(video_url.video_id, []))
+            for video_url in video_urls]
+    if pool is None:
+        # Record each result right after its sync, like update_subtitles()
+        # does.
+        for video_url, versions in work:
+            error_count = 0
+            for version in versions:
+                error = _sync_version(account, video_url, version)
+                account.record_update_result(
+                    video_url, version.subtitle_language, version, error)
+                if error is not None:
+                    error_count += 1
+            progress.add(len(versions), error_count)
+    else:
+        # Sync each video in a worker thread, then record the results in
+        # this one.
+        sync_video = lambda (video_url, versions): _sync_versions(
+            account, video_url, versions)
+        for (video_url, versions), errors in zip(work,
+                                                 pool.imap(sync_video, work)):
+            for version, error in zip(versions, errors):
+                account.record_update_result(
+                    video_url, version.subtitle_language, version, error)
+            progress.add(len(versions),
+                         len([e for e in errors if e is not None]))
+
+def _sync_versions(account, video_url, versions):
+    """Sync versions for a video
+
+    :returns: list containing the exception for each version that failed to
+    sync, or None if it succeeded
+    """
+    return [_sync_version(account, video_url, version)
+            for version in versions]
+
+def _sync_version(account, video_url, version):
+    """Sync a single version
+
+    :returns: the exception if the version failed to sync, or None if it
+    succeeded
+    """
+    try:
+        account.do_update_subtitles(video_url, version.subtitle_language,
+                                    version)
+    except StandardError, e:
+        return e
+    else:
+        return None
+
+class UpdateAllProgress(object):
+    """Tracks the progress of update_all_subtitles for an account.
+
+    Progress is stored in the cache as a dict with these keys:
+      - total: number of videos to sync
+      - videos: number of videos synced so far
+      - languages: number of languages synced so far
+      - errors: number of languages that failed to sync
+      - started/finished: datetimes
+    """
+    def __init__(self, account):
+        self.key = self.cache_key(account.account_type, account.id)
+        self.data = {}
+
+    @staticmethod
+    def cache_key(account_type, account_id):
+        return 'externalsites-update-all-{0}-{1}'.format(account_type,
+                                                         account_id)
+
+    @classmethod
+    def get(cls, account):
+        """Get the progress for an account
+
+        :returns: progress dict, or None if there is no sync in progress or
+        recently finished.
+        """
+        return cache.get(cls.cache_key(account.account_type, account.id))
+
+    def start(self, total):
+        self.data = {
+            'total': total,
+            'videos': 0,
+            'languages': 0,
+            'errors': 0,
+            'started': datetime.datetime.now(),
+            'finished': None,
+        }
+        self.save()
+
+    def add(self, languages, errors):
+        self.data['videos'] += 1
+        self.data['languages'] += languages
+        self.data['errors'] += errors
+        self.save()
+
+    def finish(self):
+        self.data['finished'] = datetime.datetime.now()
+        self.save()
+        celery_logger.info("externalsites.tasks.update_all_subtitles "
+                           "finished: %s", self.data)
+
+    def save(self):
+        cache.set(self.key, self.data, UPDATE_ALL_PROGRESS_TIMEOUT)
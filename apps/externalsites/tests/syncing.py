@@ -22,6 +22,7 @@ import hashlib
 import itertools
 import string
 
+from django.core.cache import cache
 from django.test import TestCase
 from django.db.models.signals import post_save
 import babelsubs
@@ -67,16 +68,29 @@ class SignalHandlingTest(TestCase):
         self.mock_update_all_subtitles.reset_mock()
         self.mock_update_subtitles.reset_mock()
         self.mock_delete_subtitles.reset_mock()
+        # forget about the sync queued up by add_subtitles()
+        cache.clear()
 
     def test_update_subtitles_on_public_tip_changed(self):
         lang = self.video.subtitle_language('en')
         tip = lang.get_tip()
         subtitles.signals.public_tip_changed.send(
             sender=lang, version=tip)
-        self.assertEqual(self.mock_update_subtitles.delay.call_count, 1)
-        self.mock_update_subtitles.delay.assert_called_with(
-            KalturaAccount.account_type, self.account.id, self.video_url.id,
-            lang.id)
+        self.assertEqual(self.mock_update_subtitles.apply_async.call_count, 1)
+        self.assertEqual(
+            self.mock_update_subtitles.apply_async.call_args[1]['args'],
+            (KalturaAccount.account_type, self.account.id, self.video_url.id,
+             lang.id))
+
+    def test_update_subtitles_coalesced(self):
+        # Changing the public tip several times in a row should only
+        # schedule one task
+        lang = self.video.subtitle_language('en')
+        for i in range(3):
+            version = pipeline.add_subtitles(self.video, 'en', None)
+            subtitles.signals.public_tip_changed.send(
+                sender=lang, version=version)
+        self.assertEqual(self.mock_update_subtitles.apply_async.call_count, 1)
 
     def test_delete_subititles_on_language_deleted(self):
         lang = self.video.subtitle_language('en')
@@ -225,6 +239,16 @@ class SubtitleTaskTest(TestCase):
         ])
         self.check_no_synced_version(language)
 
+    def test_upload_subtitles_already_synced(self):
+        # If the public tip is already synced, we shouldn't upload it again
+        language = self.video.subtitle_language('en')
+        version = language.get_tip()
+        SyncedSubtitleVersion.objects.set_synced_version(
+            self.account, self.video_url, language, version)
+        self.run_update_subtitles(language)
+        self.assertEquals(self.mock_update_subtitles.call_count, 0)
+        self.check_sync_history(language, [])
+
     def test_delete_subtitles(self):
         now = self.now
         language = self.video.subtitle_language('en')
@@ -257,6 +281,8 @@ class SubtitleTaskTest(TestCase):
         ])
         self.check_synced_version(language, version)
 
+    # use a single thread so that the SyncHistory timestamps are predictable
+    @mock.patch('externalsites.tasks.UPDATE_ALL_CONCURRENCY', 1)
     def test_upload_all_subtitles(self):
         to_sync = [self.video.subtitle_language('en').get_tip()]
         pipeline.add_subtitles(self.video, 'fr', None)
@@ -292,6 +318,47 @@ class SubtitleTaskTest(TestCase):
                     ('U', 'E', now_values[language.id], version, 'Error'),
                 ])
                 self.check_no_synced_version(language)
+        progress = tasks.UpdateAllProgress.get(self.account)
+        self.assertEquals(progress['languages'], len(to_sync))
+        self.assertEquals(progress['errors'], 1)
+
+    def test_upload_all_subtitles_concurrently(self):
+        videos = [self.video] + [create_kaltura_video('video-%s' % i)
+                                 for i in xrange(3)]
+        for video in videos[1:]:
+            TeamVideoFactory(team=self.team, video=video)
+        to_sync = [self.video.subtitle_language('en').get_tip()]
+        for video in videos[1:]:
+            to_sync.append(pipeline.add_subtitles(video, 'en', None))
+            to_sync.append(pipeline.add_subtitles(video, 'fr', None))
+        self.reset_history()
+
+        def update_subtitles(video_url, language, tip):
+            if language.language_code == 'fr':
+                raise SyncingError('Error')
+        self.mock_update_subtitles.side_effect = update_subtitles
+        self.run_update_all_subtitles()
+        self.assertEquals(self.mock_update_subtitles.call_count,
+                          len(to_sync))
+        for version in to_sync:
+            language = version.subtitle_language
+            video_url = language.video.get_primary_videourl_obj()
+            self.mock_update_subtitles.assert_any_call(video_url, language,
+                                                       version)
+            history = SyncHistory.objects.get(language=language)
+            self.assertEquals(history.version, version)
+            if language.language_code == 'fr':
+                self.assertEquals(history.result, 'E')
+                self.check_no_synced_version(language)
+            else:
+                self.assertEquals(history.result, 'S')
+                self.check_synced_version(language, version)
+        progress = tasks.UpdateAllProgress.get(self.account)
+        self.assertEquals(progress['total'], len(videos))
+        self.assertEquals(progress['videos'], len(videos))
+        self.assertEquals(progress['languages'], len(to_sync))
+        self.assertEquals(progress['errors'], len(videos) - 1)
+        self.assertNotEquals(progress['finished'], None)
 
     def test_history(self):
         en_1 = self.video.subtitle_language('en').get_tip()
@@ -644,6 +711,33 @@ class KalturaSyncingTest(TestCase):
             kaltura.delete_subtitles(self.partner_id, self.secret,
                                      self.video_id, 'en')
 
+    def test_client_reuses_session(self):
+        # KalturaClient should only start 1 session and list the captions for
+        # an entry once
+        mocker = KalturaApiMocker(self.partner_id, self.secret, self.video_id)
+        mocker.expect_session_start()
+        mocker.expect_captionasset_list(return_captions=[
+            ('captionid', 'French', 100, kaltura.PARTNER_DATA_TAG)
+        ])
+        mocker.expect_captionasset_add('captionid2', 'English')
+        mocker.expect_captionasset_setcontent('captionid2', "CaptionData",
+                                              "English")
+        mocker.expect_captionasset_setcontent('captionid', "CaptionData",
+                                              "French")
+        mocker.expect_captionasset_setcontent('captionid2', "CaptionData2",
+                                              "English")
+        mocker.expect_captionasset_delete('captionid')
+        mocker.expect_session_end()
+        with mocker:
+            with kaltura.KalturaClient(self.partner_id,
+                                       self.secret) as client:
+                client.update_subtitles(self.video_id, 'en', "CaptionData")
+                client.update_subtitles(self.video_id, 'fr', "CaptionData")
+                client.update_subtitles(self.video_id, 'en', "CaptionData2")
+                client.delete_subtitles(self.video_id, 'fr')
+                # fr was deleted, so this should be a no-op
+                client.delete_subtitles(self.video_id, 'fr')
+
     def test_auth_error(self):
         mocker = KalturaApiMocker(self.partner_id, self.secret, self.video_id)
         mocker.expect_session_start(return_error=True)
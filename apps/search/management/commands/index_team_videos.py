@@ -16,17 +16,26 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+from optparse import make_option
+import time
+
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
+from django.db import reset_queries
 
 from haystack import site
-from teams.models import Team
+from teams.models import Team, TeamVideo
+from teams.search_indexes import TeamVideoLanguagesIndex
 from videos.models import Video
-import time
 
 class Command(BaseCommand):
     args = '<team slug>'
     help = 'Re-index all videos from a team'
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', '-b', dest='batch_size', type="int",
+                    default=TeamVideoLanguagesIndex.BATCH_SIZE,
+                    help='Team videos to index per batch'),
+    )
 
     def handle(self, *args, **options):
         if len(args) != 1:
@@ -36,6 +45,10 @@ class Command(BaseCommand):
         except Team.DoesNotExist:
             raise CommandError('Team with slug %r not found' % (args[0],))
 
+        self.index_videos(team)
+        self.index_team_videos(team, options['batch_size'])
+
+    def index_videos(self, team):
         video_index = site.get_index(Video)
         self.stdout.write("Fetching videos\n")
         video_list = list(team.videos.all())
@@ -54,3 +67,22 @@ class Command(BaseCommand):
         self.stdout.write("\ndone indexed %s videos in %0.1f seconds\n" %
                           (len(video_list), end_time-start_time))
 
+    def index_team_videos(self, team, batch_size):
+        tv_index = site.get_index(TeamVideo)
+        team_video_ids = list(team.teamvideo_set.order_by('pk')
+                              .values_list('pk', flat=True))
+        start_time = time.time()
+        with transaction.commit_manually():
+            for i in xrange(0, len(team_video_ids), batch_size):
+                batch_ids = team_video_ids[i:i+batch_size]
+                team_videos = (TeamVideo.objects.filter(pk__in=batch_ids)
+                               .select_related('team', 'project', 'video'))
+                tv_index.update_batch(team_videos)
+                transaction.commit()
+                reset_queries()
+                self.stdout.write("indexed %s/%s team videos last pk: %s\n" %
+                                  (i + len(batch_ids), len(team_video_ids),
+                                   batch_ids[-1]))
+                self.stdout.flush()
+        self.stdout.write("done indexed %s team videos in %0.1f seconds\n" %
+                          (len(team_video_ids), time.time() - start_time))
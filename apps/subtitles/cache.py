@@ -18,18 +18,20 @@
 
 from django.core.cache import cache
 
+from utils.cache import KeyNamespace
+
 TIMEOUT = 60 * 60 * 24 * 5 # 5 days
 
+language_namespace = KeyNamespace('subtitle-language')
 
 def _lang_is_synced_id(language, public):
     if public:
-        return u"language-%s-timing-complete-public" % (language.pk,)
+        return language_namespace.key(language.pk, 'timing-complete-public')
     else:
-        return u"language-%s-timing-complete-private" % (language.pk,)
+        return language_namespace.key(language.pk, 'timing-complete-private')
 
 def invalidate_language_cache(language):
-    cache.delete(_lang_is_synced_id(language, True))
-    cache.delete(_lang_is_synced_id(language, False))
+    language_namespace.invalidate(language.pk)
 
 def get_is_synced(language, public):
     cache_key = _lang_is_synced_id(language, public)
@@ -38,3 +40,13 @@ def get_is_synced(language, public):
 def set_is_synced(language, public, value):
     cache_key = _lang_is_synced_id(language, public)
     cache.set(cache_key, value, TIMEOUT)
+
+def _version_items_id(version_id):
+    return u"subtitle-version-%s-items" % (version_id,)
+
+def get_version_items(version_id):
+    return cache.get(_version_items_id(version_id))
+
+def set_version_items(version_id, items):
+    # versions are immutable, so we never need to invalidate this
+    cache.set(_version_items_id(version_id), items, TIMEOUT)
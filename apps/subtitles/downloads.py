@@ -0,0 +1,161 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""Rendered subtitle files for downloads.
+
+SubtitleVersions never change, so neither does the output of babelsubs.to()
+for a version and a format.  Rather than rendering the subtitles for each
+download, we render them once and store the result.
+
+Rendered files are content-addressed: they are named after the SHA1 of their
+contents, which also serves as the ETag for the download.  The Django cache
+maps (version, format) pairs to the stored file.  Files go in the S3 bucket if
+we're using S3, otherwise in the local media storage.
+"""
+
+from hashlib import sha1
+import logging
+import time
+
+import babelsubs
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import (http_date, parse_etags, parse_http_date_safe,
+                               quote_etag)
+
+logger = logging.getLogger('subtitles.downloads')
+
+TIMEOUT = 60 * 60 * 24 * 5 # 5 days
+# Bump this if babelsubs output changes, to avoid serving stale files
+RENDER_VERSION = 1
+
+def _storage():
+    if settings.USE_AMAZON_S3:
+        from utils.amazon import default_s3_store
+        return default_s3_store
+    else:
+        return default_storage
+
+def _cache_key(version, format):
+    return u'rendered-subtitles-{0}-{1}-{2}'.format(RENDER_VERSION,
+                                                   version.pk, format)
+
+def _storage_name(digest, format):
+    return 'subtitles/rendered/{0}/{1}.{2}'.format(digest[:2], digest,
+                                                   format)
+
+def render(version, format):
+    """Render the subtitles for a version using babelsubs
+
+    :returns: the rendered subtitles as a utf-8 encoded str
+    """
+    content = babelsubs.to(version.get_subtitles(), format,
+                           language=version.language_code)
+    if isinstance(content, unicode):
+        content = content.encode('utf-8')
+    return content
+
+def get_rendered(version, format):
+    """Get the rendered subtitles for a version
+
+    :returns: (content, digest) tuple.  content is a utf-8 encoded str and
+        digest is the SHA1 hex digest of it.
+    """
+    storage = _storage()
+    cache_key = _cache_key(version, format)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        digest, name = cached
+        try:
+            f = storage.open(name)
+            try:
+                return f.read(), digest
+            finally:
+                f.close()
+        except Exception:
+            # This can be an IOError or a boto error, depending on the
+            # storage.  Either way, just render the file again.
+            logger.warn("error reading rendered subtitles: %s", name,
+                        exc_info=True)
+    content = render(version, format)
+    digest = sha1(content).hexdigest()
+    name = _storage_name(digest, format)
+    try:
+        if not storage.exists(name):
+            name = storage.save(name, ContentFile(content))
+    except Exception:
+        # We can still serve the content, we'll just need to render it again
+        # next time
+        logger.exception("error storing rendered subtitles")
+        return content, digest
+    cache.set(cache_key, (digest, name), TIMEOUT)
+    return content, digest
+
+def get_digest(version, format):
+    """Get the digest of the rendered subtitles, if we know it.
+
+    This lets us handle conditional GETs without reading the rendered file.
+
+    :returns: digest string or None
+    """
+    cached = cache.get(_cache_key(version, format))
+    if cached is not None:
+        return cached[0]
+    else:
+        return None
+
+def _not_modified(request, version, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since
+        return etag is not None and etag in parse_etags(if_none_match)
+    if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since is not None:
+        if_modified_since = parse_http_date_safe(if_modified_since)
+        return (if_modified_since is not None and
+                _last_modified(version) <= if_modified_since)
+    return False
+
+def _last_modified(version):
+    return int(time.mktime(version.created.timetuple()))
+
+def download_response(request, version, format):
+    """Create an HttpResponse to download the subtitles for a version
+
+    This handles conditional GETs using the ETag and Last-Modified headers.
+    Callers should add the Content-Disposition header.
+    """
+    digest = get_digest(version, format)
+    if digest is not None and _not_modified(request, version, digest):
+        response = HttpResponseNotModified()
+    else:
+        content, digest = get_rendered(version, format)
+        if _not_modified(request, version, digest):
+            response = HttpResponseNotModified()
+        else:
+            # since this is a download, we can afford not to escape tags,
+            # specially true since speaker change is denoted by '>>' and
+            # that would get entirely stripped out
+            response = HttpResponse(content, mimetype="text/plain")
+            response['Content-Length'] = str(len(content))
+    response['ETag'] = quote_etag(digest)
+    response['Last-Modified'] = http_date(_last_modified(version))
+    return response
@@ -0,0 +1,75 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from subtitles.models import SubtitleVersion
+
+class Command(BaseCommand):
+    help = ('Calculate the timing summary for versions that were created '
+            'before we stored it')
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', '-b', dest='batch_size', type="int",
+                    default=500, help='Versions to update per batch'),
+        make_option('--start-pk', '-s', dest='start_pk', type="int",
+                    default=0, help='Resume after this version pk'),
+        make_option('--sleep', dest='sleep', type="float", default=0,
+                    help='Seconds to sleep between batches'),
+    )
+
+    def handle(self, *args, **options):
+        last_pk = options['start_pk']
+        batch_size = options['batch_size']
+        updated = failed = 0
+        start_time = time.time()
+        while True:
+            batch = self.fetch_batch(last_pk, batch_size)
+            if not batch:
+                break
+            with transaction.commit_on_success():
+                for version in batch:
+                    try:
+                        # get_timing_range() calculates the timings and
+                        # stores them
+                        version.get_timing_range()
+                    except StandardError, e:
+                        self.stderr.write("error updating version %s: %s\n" %
+                                          (version.pk, e))
+                        failed += 1
+                    else:
+                        updated += 1
+            last_pk = batch[-1].pk
+            # print the last pk so that the command can be resumed with
+            # --start-pk if it gets interrupted
+            self.stdout.write("updated: %s failed: %s last pk: %s\n" %
+                              (updated, failed, last_pk))
+            self.stdout.flush()
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write("done: updated %s versions in %0.1f seconds\n" %
+                          (updated, time.time() - start_time))
+
+    def fetch_batch(self, last_pk, batch_size):
+        qs = (SubtitleVersion.objects.full()
+              .filter(pk__gt=last_pk, timing_start__isnull=True)
+              .order_by('pk'))
+        return list(qs[:batch_size])
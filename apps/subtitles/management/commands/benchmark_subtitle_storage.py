@@ -0,0 +1,79 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from optparse import make_option
+import time
+
+from babelsubs import load_from
+from django.core.management.base import BaseCommand
+
+from subtitles import storage
+from subtitles.models import SubtitleVersion
+from utils.compress import decompress
+
+class Command(BaseCommand):
+    help = 'Compare the legacy and compact subtitle storage formats'
+    option_list = BaseCommand.option_list + (
+        make_option('--count', '-c', dest='count', type="int", default=200,
+                    help='Number of versions to test with'),
+    )
+
+    def handle(self, *args, **options):
+        versions = (SubtitleVersion.objects.full()
+                    .filter(compact_subtitles__isnull=True)
+                    .exclude(serialized_subtitles='')
+                    .order_by('-pk')
+                    .values_list('language_code', 'serialized_subtitles'))
+        samples = []
+        for language_code, serialized_subtitles in versions[:options['count']]:
+            compact = storage.encode_compact(load_from(
+                decompress(serialized_subtitles), type='dfxp').to_internal())
+            samples.append((language_code, serialized_subtitles, compact))
+        if not samples:
+            self.stdout.write("No versions to test with\n")
+            return
+
+        def legacy_decode(language_code, serialized_subtitles, compact):
+            load_from(decompress(serialized_subtitles),
+                      type='dfxp').to_internal()
+
+        def compact_decode(language_code, serialized_subtitles, compact):
+            storage.decode_compact(compact, language_code)
+
+        def legacy_stream(language_code, serialized_subtitles, compact):
+            storage.SubtitleStream(serialized_subtitles).summary()
+
+        def compact_stream(language_code, serialized_subtitles, compact):
+            storage.SubtitleStream('', compact).summary()
+
+        self.stdout.write("%s versions\n" % len(samples))
+        self.stdout.write("bytes per row: legacy: %0.1f compact: %0.1f\n" % (
+            sum(len(s[1]) for s in samples) / float(len(samples)),
+            sum(len(s[2]) for s in samples) / float(len(samples))))
+        for label, func in [
+            ('legacy get_subtitles', legacy_decode),
+            ('compact get_subtitles', compact_decode),
+            ('legacy stream summary', legacy_stream),
+            ('compact stream summary', compact_stream),
+        ]:
+            start_time = time.time()
+            for sample in samples:
+                func(*sample)
+            elapsed = time.time() - start_time
+            self.stdout.write("%s: %0.3fms per row\n" % (
+                label, elapsed * 1000 / len(samples)))
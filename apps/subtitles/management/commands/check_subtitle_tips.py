@@ -0,0 +1,113 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from subtitles.models import (SubtitleLanguage, SubtitleLanguageTip,
+                              SubtitleVersion)
+
+class Command(BaseCommand):
+    help = 'Check the SubtitleLanguageTip table against the versions'
+    option_list = BaseCommand.option_list + (
+        make_option('--repair', '-r', dest='repair', action='store_true',
+                    default=False, help='Fix any incorrect rows found'),
+        make_option('--batch-size', '-b', dest='batch_size', type="int",
+                    default=500, help='Languages to check per batch'),
+        make_option('--start-pk', '-s', dest='start_pk', type="int",
+                    default=0, help='Resume after this language pk'),
+    )
+
+    def handle(self, *args, **options):
+        last_pk = options['start_pk']
+        batch_size = options['batch_size']
+        checked = bad = 0
+        start_time = time.time()
+        while True:
+            language_ids = list(SubtitleLanguage.objects
+                                .filter(pk__gt=last_pk).order_by('pk')
+                                .values_list('pk', flat=True)[:batch_size])
+            if not language_ids:
+                break
+            expected = self.calc_tips(language_ids)
+            current = self.fetch_tips(language_ids)
+            with transaction.commit_on_success():
+                for language_id in language_ids:
+                    tips = expected.get(language_id, (None, None))
+                    if current.get(language_id, (None, None)) == tips:
+                        continue
+                    bad += 1
+                    self.stderr.write(
+                        "language %s: tips are %s should be %s\n" %
+                        (language_id, current.get(language_id), tips))
+                    if options['repair']:
+                        self.repair(language_id, tips)
+            checked += len(language_ids)
+            last_pk = language_ids[-1]
+            self.stdout.write("checked: %s bad: %s last pk: %s\n" %
+                              (checked, bad, last_pk))
+            self.stdout.flush()
+        self.stdout.write("done: checked %s languages in %0.1f seconds, "
+                          "%s were bad%s\n" %
+                          (checked, time.time() - start_time, bad,
+                           " (repaired)" if options['repair'] else ""))
+
+    def calc_tips(self, language_ids):
+        """Calculate the correct tips from the versions table.
+
+        :returns: dict mapping language ids to (public_version_id,
+            private_version_id) tuples
+        """
+        qs = (SubtitleVersion.objects.full()
+              .filter(subtitle_language__in=language_ids)
+              .order_by('version_number')
+              .values_list('subtitle_language', 'id', 'visibility',
+                           'visibility_override'))
+        tips = {}
+        # versions are ordered by version_number, so the last one we see for
+        # each language is the tip
+        for language_id, version_id, visibility, visibility_override in qs:
+            public_tip, private_tip = tips.get(language_id, (None, None))
+            if visibility_override != 'deleted':
+                private_tip = version_id
+            if (visibility_override == 'public' or
+                (visibility_override == '' and visibility == 'public')):
+                public_tip = version_id
+            tips[language_id] = (public_tip, private_tip)
+        return tips
+
+    def fetch_tips(self, language_ids):
+        qs = (SubtitleLanguageTip.objects
+              .filter(language__in=language_ids)
+              .values_list('language', 'public_version',
+                           'private_version'))
+        return dict((language_id, (public_tip, private_tip))
+                    for language_id, public_tip, private_tip in qs)
+
+    def repair(self, language_id, tips):
+        public_tip, private_tip = tips
+        updated = (SubtitleLanguageTip.objects.filter(language=language_id)
+                   .update(public_version=public_tip,
+                           private_version=private_tip))
+        if not updated:
+            SubtitleLanguageTip.objects.create(
+                language_id=language_id, public_version_id=public_tip,
+                private_version_id=private_tip)
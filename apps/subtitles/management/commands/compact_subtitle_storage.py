@@ -0,0 +1,88 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from subtitles import storage
+from subtitles.models import SubtitleVersion
+
+class Command(BaseCommand):
+    help = 'Convert stored subtitles to the compact storage format'
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', '-b', dest='batch_size', type="int",
+                    default=500, help='Versions to convert per batch'),
+        make_option('--start-pk', '-s', dest='start_pk', type="int",
+                    default=0, help='Resume after this version pk'),
+        make_option('--sleep', dest='sleep', type="float", default=0,
+                    help='Seconds to sleep between batches'),
+    )
+
+    def handle(self, *args, **options):
+        last_pk = options['start_pk']
+        batch_size = options['batch_size']
+        converted = skipped = 0
+        start_time = time.time()
+        while True:
+            batch = self.fetch_batch(last_pk, batch_size)
+            if not batch:
+                break
+            with transaction.commit_on_success():
+                for pk, language_code, serialized_subtitles in batch:
+                    if self.convert_version(pk, language_code,
+                                            serialized_subtitles):
+                        converted += 1
+                    else:
+                        skipped += 1
+            last_pk = batch[-1][0]
+            # print the last pk so that the command can be resumed with
+            # --start-pk if it gets interrupted
+            self.stdout.write("converted: %s skipped: %s last pk: %s\n" %
+                              (converted, skipped, last_pk))
+            self.stdout.flush()
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write("done: converted %s versions in %0.1f seconds\n" %
+                          (converted, time.time() - start_time))
+
+    def fetch_batch(self, last_pk, batch_size):
+        qs = (SubtitleVersion.objects.full()
+              .filter(pk__gt=last_pk, compact_subtitles__isnull=True)
+              .order_by('pk')
+              .values_list('pk', 'language_code', 'serialized_subtitles'))
+        return list(qs[:batch_size])
+
+    def convert_version(self, pk, language_code, serialized_subtitles):
+        try:
+            data = storage.convert_to_compact(serialized_subtitles,
+                                              language_code)
+        except StandardError, e:
+            self.stderr.write("error converting version %s: %s\n" % (pk, e))
+            return False
+        if data is None:
+            self.stderr.write("version %s doesn't round-trip, "
+                              "skipping\n" % pk)
+            return False
+        # Use update() rather than save() since we don't want to run any of
+        # the save() logic for this.
+        (SubtitleVersion.objects.full().filter(pk=pk)
+         .update(compact_subtitles=data, serialized_subtitles=''))
+        return True
@@ -24,13 +24,14 @@ from datetime import datetime, date, timedelta
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import models, transaction
 from django.db.models import query, Q
 from django.utils import simplejson as json
 from django.utils.translation import ugettext_lazy as _
 
 from apps.subtitles import cache
 from apps.subtitles import shims
+from apps.subtitles import storage
 from apps.auth.models import CustomUser as User
 from apps.videos import metadata
 from apps.videos.models import Video, Action
@@ -143,7 +144,7 @@ def get_lineage(parents):
 
 class SubtitleLanguagageQuerySet(query.QuerySet):
     def fetch_and_join(self, public_tips=False, private_tips=False,
-                       video=None):
+                       video=None, videos=None):
         """Fetch languages and join them to related models.
 
         This method is an efficient way to fetch languages under a couple
@@ -157,12 +158,21 @@ class SubtitleLanguagageQuerySet(query.QuerySet):
         :param public_tips: set the public tip cache for fetched languages
         :param private_tips: set the private tip cache for fetched languages
         :param video: set the cached video for all languages/versions fetched
+        :param videos: list of videos for the languages being fetched.  Use
+            this instead of video when fetching languages for multiple
+            videos.  The cached video will be set for all languages/versions
+            fetched.
         :returns: list of SubtitleLanguage objects
         """
         langs = list(self)
         if video is not None:
             for lang in langs:
                 lang.video = video
+        elif videos is not None:
+            video_map = dict((v.id, v) for v in videos)
+            for lang in langs:
+                if lang.video_id in video_map:
+                    lang.video = video_map[lang.video_id]
 
         def join_tips(base_qs, cache_name):
             qs = base_qs.filter(subtitle_language__in=langs)
@@ -200,40 +210,34 @@ class SubtitleLanguageManager(models.Manager):
     def get_query_set(self):
         return SubtitleLanguagageQuerySet(self.model)
 
-    def having_versions(self):
-        """Return a QS of SLs that have at least 1 version.
-
-        TODO: See if we need to denormalize this into a field.  I don't think we
-        will (and would strongly prefer not to (see the has_version/had_version
-        mess we were in before)).
+    # The tip queries use the SubtitleLanguageTip table, which stores
+    # pointers to the tip versions of each language.  It's maintained by
+    # SubtitleVersion.save() (see SubtitleLanguage.update_tips()), and saves
+    # us from running a MAX(version_number) subquery for each language row.
+    # If it gets out of sync, the check_subtitle_tips command can repair it.
 
-        """
+    def having_versions(self):
+        """Return a QS of SLs that have at least 1 version."""
         return self.get_query_set().extra(where=[
             """
             EXISTS (
                 SELECT 1
-                  FROM subtitles_subtitleversion AS sv
-                 WHERE sv.subtitle_language_id = subtitles_subtitlelanguage.id
-               AND NOT sv.visibility_override = 'deleted'
+                  FROM subtitles_subtitlelanguagetip AS tip
+                 WHERE tip.language_id = subtitles_subtitlelanguage.id
+                   AND tip.private_version_id IS NOT NULL
             )
             """,
         ])
 
     def not_having_versions(self):
-        """Return a QS of SLs that have zero versions.
-
-        TODO: See if we need to denormalize this into a field.  I don't think we
-        will (and would strongly prefer not to (see the has_version/had_version
-        mess we were in before)).
-
-        """
+        """Return a QS of SLs that have zero versions."""
         return self.get_query_set().extra(where=[
             """
             NOT EXISTS (
                 SELECT 1
-                  FROM subtitles_subtitleversion AS sv
-                 WHERE sv.subtitle_language_id = subtitles_subtitlelanguage.id
-               AND NOT sv.visibility_override = 'deleted'
+                  FROM subtitles_subtitlelanguagetip AS tip
+                 WHERE tip.language_id = subtitles_subtitlelanguage.id
+                   AND tip.private_version_id IS NOT NULL
             )
             """,
         ])
@@ -272,15 +276,11 @@ class SubtitleLanguageManager(models.Manager):
             """
             EXISTS (
                 SELECT 1
-                FROM subtitles_subtitleversion AS sv
-                WHERE sv.version_number = (
-                    SELECT MAX(sv2.version_number)
-                    FROM subtitles_subtitleversion sv2
-                    WHERE sv2.subtitle_language_id=subtitles_subtitlelanguage.id
-                    AND sv2.visibility_override != 'deleted'
-                )
-                AND sv.subtitle_count > 0
-                AND sv.subtitle_language_id=subtitles_subtitlelanguage.id
+                  FROM subtitles_subtitlelanguagetip AS tip
+                  JOIN subtitles_subtitleversion AS sv
+                    ON sv.id = tip.private_version_id
+                 WHERE tip.language_id = subtitles_subtitlelanguage.id
+                   AND sv.subtitle_count > 0
             )
             """,
         ])
@@ -291,58 +291,38 @@ class SubtitleLanguageManager(models.Manager):
             """
             NOT EXISTS (
                 SELECT 1
-                FROM subtitles_subtitleversion AS sv
-                WHERE sv.version_number = (
-                    SELECT MAX(sv2.version_number)
-                    FROM subtitles_subtitleversion sv2
-                    WHERE sv2.subtitle_language_id=subtitles_subtitlelanguage.id
-                    AND sv2.visibility_override != 'deleted'
-                )
-                AND sv.subtitle_count > 0
-                AND sv.subtitle_language_id=subtitles_subtitlelanguage.id
+                  FROM subtitles_subtitlelanguagetip AS tip
+                  JOIN subtitles_subtitleversion AS sv
+                    ON sv.id = tip.private_version_id
+                 WHERE tip.language_id = subtitles_subtitlelanguage.id
+                   AND sv.subtitle_count > 0
             )
             """,
         ])
 
 
     def having_public_versions(self):
-        """Return a QS of SLs that have at least 1 publicly-visible versions.
-
-        TODO: See if we need to denormalize this into a field.  I don't think we
-        will (and would strongly prefer not to (see the has_version/had_version
-        mess we were in before)).
-
-        """
+        """Return a QS of SLs that have at least 1 publicly-visible versions."""
         return self.get_query_set().extra(where=[
             """
             EXISTS (
                 SELECT 1
-                  FROM subtitles_subtitleversion AS sv
-                 WHERE sv.subtitle_language_id = subtitles_subtitlelanguage.id
-               AND NOT sv.visibility_override = 'deleted'
-               AND NOT sv.visibility_override = 'private'
-               AND NOT (sv.visibility = 'private' AND sv.visibility_override = '')
+                  FROM subtitles_subtitlelanguagetip AS tip
+                 WHERE tip.language_id = subtitles_subtitlelanguage.id
+                   AND tip.public_version_id IS NOT NULL
             )
             """,
         ])
 
     def not_having_public_versions(self):
-        """Return a QS of SLs that have zero publicly-visible versions.
-
-        TODO: See if we need to denormalize this into a field.  I don't think we
-        will (and would strongly prefer not to (see the has_version/had_version
-        mess we were in before)).
-
-        """
+        """Return a QS of SLs that have zero publicly-visible versions."""
         return self.get_query_set().extra(where=[
             """
             NOT EXISTS (
                 SELECT 1
-                  FROM subtitles_subtitleversion AS sv
-                 WHERE sv.subtitle_language_id = subtitles_subtitlelanguage.id
-               AND NOT sv.visibility_override = 'deleted'
-               AND NOT sv.visibility_override = 'private'
-               AND NOT (sv.visibility = 'private' AND sv.visibility_override = '')
+                  FROM subtitles_subtitlelanguagetip AS tip
+                 WHERE tip.language_id = subtitles_subtitlelanguage.id
+                   AND tip.public_version_id IS NOT NULL
             )
             """,
         ])
@@ -583,12 +563,15 @@ class SubtitleLanguage(models.Model):
         else:
             return self.subtitleversion_set.extant()
 
-    def get_versions(self, public=False, full=False, newest_first=False):
+    def get_versions(self, public=False, full=False, newest_first=False,
+                     load_changes=False):
         """Get a list of versions for this subtitle language
 
         :param public: if True only return versions visible to the public
         :param full: if True only return deleted versions
         :param newest_first: controls ordering of the versions
+        :param load_changes: if True, call load_version_changes() for the
+            versions.
         :returns: list of SubtitleVersion objects
         """
         qs = self._version_qs(public, full)
@@ -599,8 +582,49 @@ class SubtitleLanguage(models.Model):
         versions = [self.optimize_loaded_version(v) for v in qs]
         if not public:
             self._set_previous_version_cache(versions, full)
+        if load_changes:
+            self.load_version_changes(versions)
         return versions
 
+    def load_version_changes(self, versions):
+        """Calculate the time/text changes for a list of versions.
+
+        This is much faster than calling get_changes() on each version since
+        we fetch the previous versions in 2 queries and parse the subtitles
+        for each version only once.  The results get saved to the DB, so we
+        only need to do this once per version.
+
+        :param versions: list of non-deleted versions of this language, in
+            any order.
+        """
+        needed = [v for v in versions if v.computed_time_change is None or
+                  v.computed_text_change is None]
+        if not needed:
+            return
+        min_number = min(v.version_number for v in needed)
+        max_number = max(v.version_number for v in needed)
+        extant = self.subtitleversion_set.extant()
+        candidates = list(extant.filter(version_number__gte=min_number,
+                                        version_number__lte=max_number))
+        candidates.extend(extant.filter(version_number__lt=min_number)
+                          .order_by('-version_number')[:1])
+        # Use the version objects that we were passed where we can, so that
+        # we can reuse their parsed subtitles.
+        by_number = dict((v.version_number, v) for v in candidates)
+        by_number.update((v.version_number, v) for v in versions)
+        all_numbers = sorted(by_number.keys())
+        previous_numbers = dict(zip(all_numbers[1:], all_numbers[:-1]))
+
+        for version in needed:
+            previous_number = previous_numbers.get(version.version_number)
+            if previous_number is None:
+                previous_version = None
+            else:
+                previous_version = self.optimize_loaded_version(
+                    by_number[previous_number])
+            version.cache_previous_version(previous_version)
+            version.calc_changes(previous_version)
+
     def optimize_versions(self, versions):
         """Do performance speedups for versions of this language
 
@@ -653,6 +677,51 @@ class SubtitleLanguage(models.Model):
     def clear_tip_cache(self):
         self._tip_cache = {}
 
+    def update_tips(self):
+        """Update the SubtitleLanguageTip row for this language.
+
+        This gets called by SubtitleVersion.save() whenever a version is
+        created or its visibility changes.  If you change the visibility of
+        versions without calling save() (for example with a queryset
+        update()), you need to call this yourself.
+
+        We lock the language row before reading the versions, so concurrent
+        saves for the same language update the tips one at a time and the
+        last one sees all of the versions.  The check_subtitle_tips command
+        can repair bad rows, but that's only a backstop in case something
+        updates the versions behind our back.
+        """
+        if transaction.is_managed():
+            self._update_tips()
+        else:
+            with transaction.commit_on_success():
+                self._update_tips()
+
+    def _update_tips(self):
+        # this needs to run inside a transaction, otherwise the lock is
+        # released right away
+        list(SubtitleLanguage.objects.select_for_update()
+             .filter(pk=self.pk).values_list('pk', flat=True))
+
+        def find_tip(versions):
+            # Use a locking read here too.  With REPEATABLE READ, a plain
+            # SELECT would use our transaction's snapshot and could miss
+            # versions committed while we were waiting for the lock.
+            qs = (versions.select_for_update().order_by('-version_number')
+                  .values_list('pk', flat=True))
+            tip_ids = list(qs[:1])
+            return tip_ids[0] if tip_ids else None
+
+        public_version = find_tip(self.subtitleversion_set.public())
+        private_version = find_tip(self.subtitleversion_set.extant())
+        updated = (SubtitleLanguageTip.objects.filter(language=self)
+                   .update(public_version=public_version,
+                           private_version=private_version))
+        if not updated:
+            SubtitleLanguageTip.objects.create(
+                language=self, public_version_id=public_version,
+                private_version_id=private_version)
+
     def first_public_version(self):
         """Returns the very fist version to be made public of none"""
         try:
@@ -765,6 +834,8 @@ class SubtitleLanguage(models.Model):
         sv = SubtitleVersion(*args, **kwargs)
 
         sv.set_subtitles(kwargs.get('subtitles', None))
+        if tip and settings.DELTA_SUBTITLE_STORAGE:
+            sv.store_as_delta(tip)
         if metadata is not None:
             sv.update_metadata(metadata, commit=False)
             # save the video to commit the changes to it
@@ -777,6 +848,11 @@ class SubtitleLanguage(models.Model):
         for p in parents:
             sv.parents.add(p)
 
+        if sv.delta_depth:
+            # The new version is the tip, so it's going to be the base for
+            # the next version.  Cache the items so we don't need to go
+            # through the delta chain to get them.
+            cache.set_version_items(sv.pk, sv.get_subtitle_items())
         cache.invalidate_language_cache(self)
         self.clear_tip_cache()
         if sv.is_public():
@@ -1160,36 +1236,28 @@ class SubtitleVersionManager(models.Manager):
         assert False, ('all() is disabled on SubtitleVersion sets.  '
                        'Use full(), extant(), or public() instead.')
 
+    # The tip methods use the SubtitleLanguageTip table rather than
+    # calculating the tips with a MAX(version_number) subquery.
     def private_tips(self):
         tip_where = """\
-subtitles_subtitleversion.version_number = (
-    SELECT MAX(version_number)
-    FROM subtitles_subtitleversion sv2
-    WHERE sv2.subtitle_language_id =
-           subtitles_subtitleversion.subtitle_language_id AND
-           sv2.visibility_override != 'deleted')"""
+subtitles_subtitleversion.id = (
+    SELECT tip.private_version_id
+    FROM subtitles_subtitlelanguagetip tip
+    WHERE tip.language_id = subtitles_subtitleversion.subtitle_language_id)"""
         return self.get_query_set().extra(where=[tip_where])
 
     def public_tips(self):
         public_tip_where = """\
-subtitles_subtitleversion.version_number = (
-    SELECT MAX(version_number)
-    FROM subtitles_subtitleversion sv2 
-    WHERE ((sv2.visibility = 'public' AND sv2.visibility_override = '') OR
-           sv2.visibility_override = 'public') AND
-           sv2.subtitle_language_id =
-           subtitles_subtitleversion.subtitle_language_id)"""
+subtitles_subtitleversion.id = (
+    SELECT tip.public_version_id
+    FROM subtitles_subtitlelanguagetip tip
+    WHERE tip.language_id = subtitles_subtitleversion.subtitle_language_id)"""
         return self.get_query_set().extra(where=[public_tip_where])
 
     def subtitle_count(self):
-        qs = self.get_query_set().extra(select={
+        qs = self.private_tips().extra(select={
             'subs_total': 'SUM(subtitles_subtitleversion.subtitle_count)'
-        }, where=[
-            'subtitles_subtitleversion.version_number = ('
-            'SELECT MAX(version_number) '
-            'FROM subtitles_subtitleversion sv2 '
-            'WHERE sv2.subtitle_language_id = '
-            'subtitles_subtitleversion.subtitle_language_id)'])
+        })
         return qs.values_list('subs_total', flat=True)[0]
 
 ORIGIN_API = 'api'
@@ -1286,16 +1354,43 @@ class SubtitleVersion(models.Model):
     # easier filtering later.
     subtitle_count = models.PositiveIntegerField(default=0)
 
+    # Results of get_changes(), stored so that we only need to calculate them
+    # once.  These are None if they haven't been calculated yet.
+    computed_time_change = models.FloatField(null=True, blank=True,
+                                             default=None)
+    computed_text_change = models.FloatField(null=True, blank=True,
+                                             default=None)
+
+    # Denormalized timing summary of the subtitles, in milliseconds.  These go
+    # from the first time set in the subtitles to the last one (both are 0 if
+    # nothing is synced).  They're None for versions created before the fields
+    # existed, use get_timing_range() to handle that case.
+    timing_start = models.PositiveIntegerField(null=True, blank=True,
+                                               default=None)
+    timing_end = models.PositiveIntegerField(null=True, blank=True,
+                                             default=None)
+
     created = models.DateTimeField(editable=False)
 
     meta_1_content = metadata.MetadataContentField()
     meta_2_content = metadata.MetadataContentField()
     meta_3_content = metadata.MetadataContentField()
 
-    # Subtitles are stored in a text blob, serialized as base64'ed zipped XML
-    # (oh the joys of Django).  Use the subtitles property to get and set them.
-    # You shouldn't be touching this field.
-    serialized_subtitles = models.TextField()
+    # Subtitles are stored in one of 2 ways (see apps.subtitles.storage):
+    #   - The legacy way: a text blob, serialized as base64'ed zipped XML (oh
+    #     the joys of Django).
+    #   - The compact way: a binary blob.  If this is set, then
+    #     serialized_subtitles will be empty.
+    # Use get_subtitles() and set_subtitles() to get and set them.  You
+    # shouldn't be touching these fields.
+    serialized_subtitles = models.TextField(blank=True)
+    compact_subtitles = storage.BlobField(null=True, blank=True)
+    # If this is non-zero, compact_subtitles stores a delta against the
+    # previous version (including deleted ones) rather than the full
+    # subtitles.  delta_depth is the number of versions we need to go back to
+    # find one that stores the full subtitles.  Because of this, versions in a
+    # delta chain must never be deleted from the DB individually.
+    delta_depth = models.PositiveIntegerField(default=0)
 
     # Lineage is stored as a blob of JSON to save on DB rows.  You shouldn't
     # need to touch this field yourself, use the lineage property.
@@ -1325,11 +1420,91 @@ class SubtitleVersion(models.Model):
         """
         # We cache the parsed subs for speed.
         if self._subtitles == None:
-            self._subtitles = load_from(decompress(self.serialized_subtitles),
+            if self.delta_depth:
+                self._subtitles = storage.items_to_subtitle_set(
+                    self.get_subtitle_items(), self.language_code)
+            elif self.compact_subtitles:
+                self._subtitles = storage.decode_compact(
+                    self.compact_subtitles, self.language_code)
+            else:
+                self._subtitles = load_from(
+                    decompress(self.serialized_subtitles),
                     type='dfxp').to_internal()
 
         return self._subtitles
 
+    def get_subtitle_stream(self):
+        """Get a SubtitleStream for this version.
+
+        Use this instead of get_subtitles() when you only need to scan through
+        the subtitles once, for example to get the timings or the first few
+        lines.  It avoids building the full SubtitleSet.
+
+        """
+        if self.delta_depth:
+            return storage.SubtitleStream('',
+                                          items=self.get_subtitle_items())
+        return storage.SubtitleStream(self.serialized_subtitles,
+                                      self.compact_subtitles)
+
+    def get_subtitle_items(self):
+        """Get the subtitles for this version as a list of items.
+
+        See apps.subtitles.storage.subtitle_set_items() for the format.
+        """
+        if self._subtitle_items is None:
+            if self.delta_depth:
+                self._subtitle_items = self._materialize_delta()
+            elif self._subtitles is not None:
+                self._subtitle_items = storage.subtitle_set_items(
+                    self._subtitles)
+            elif self.compact_subtitles:
+                self._subtitle_items = list(
+                    storage.iter_compact(self.compact_subtitles))
+            else:
+                self._subtitle_items = storage.subtitle_set_items(
+                    self.get_subtitles())
+        return self._subtitle_items
+
+    def _materialize_delta(self):
+        if self.pk:
+            items = cache.get_version_items(self.pk)
+            if items is not None:
+                return items
+        first_version_number = self.version_number - self.delta_depth
+        chain = list(SubtitleVersion.objects.full()
+                     .filter(subtitle_language=self.subtitle_language_id,
+                             version_number__gte=first_version_number,
+                             version_number__lt=self.version_number)
+                     .order_by('version_number'))
+        if len(chain) != self.delta_depth or chain[0].delta_depth != 0:
+            raise storage.CompactFormatError(
+                "Broken delta chain for %s" % self)
+        items = chain[0].get_subtitle_items()
+        for version in chain[1:] + [self]:
+            items = storage.apply_delta(items, version.compact_subtitles)
+        if self.pk:
+            cache.set_version_items(self.pk, items)
+        return items
+
+    def store_as_delta(self, base):
+        """Store our subtitles as a delta against another version.
+
+        base must be the version right before this one, including deleted
+        versions.  To keep delta chains short, every
+        SUBTITLE_DELTA_KEYFRAME_INTERVAL versions we store the full subtitles
+        instead.
+        """
+        delta_depth = base.delta_depth + 1
+        if delta_depth >= settings.SUBTITLE_DELTA_KEYFRAME_INTERVAL:
+            return
+        items = storage.subtitle_set_items(self.get_subtitles())
+        self.compact_subtitles = storage.encode_delta(
+            base.get_subtitle_items(), items)
+        self.serialized_subtitles = ''
+        self.delta_depth = delta_depth
+        self._subtitle_items = items
+
     def set_subtitles(self, subtitles):
         """Set the SubtitleSet for this version.
 
@@ -1357,8 +1532,18 @@ class SubtitleVersion(models.Model):
                 raise TypeError("Cannot create SubtitleSet from type %s"
                                 % str(type(subtitles)))
 
-        self.subtitle_count = len(subtitles)
-        self.serialized_subtitles = compress(subtitles.to_xml())
+        summary = storage.calc_summary(subtitles.subtitle_items())
+        self.subtitle_count = summary.subtitle_count
+        self.timing_start = summary.timing_start
+        self.timing_end = summary.timing_end
+        if settings.COMPACT_SUBTITLE_STORAGE:
+            self.compact_subtitles = storage.encode_compact(subtitles)
+            self.serialized_subtitles = ''
+        else:
+            self.serialized_subtitles = compress(subtitles.to_xml())
+            self.compact_subtitles = None
+        self.delta_depth = 0
+        self._subtitle_items = None
 
         # We cache the parsed subs for speed.
         self._subtitles = subtitles
@@ -1411,6 +1596,7 @@ class SubtitleVersion(models.Model):
         super(SubtitleVersion, self).__init__(*args, **kwargs)
 
         self._subtitles = None
+        self._subtitle_items = None
         if has_subtitles:
             self.set_subtitles(subtitles)
 
@@ -1418,6 +1604,9 @@ class SubtitleVersion(models.Model):
         if lineage != None:
             self.lineage = lineage
 
+        self._initial_visibility = self.visibility
+        self._initial_visibility_override = self.visibility_override
+
     def __unicode__(self):
         return u'SubtitleVersion %s / %s / %s v%s' % (
             (self.id or '(unsaved)'), self.video.video_id,
@@ -1456,7 +1645,21 @@ class SubtitleVersion(models.Model):
         else:
             Action.create_caption_handler(self, self.created)
 
-        return super(SubtitleVersion, self).save(*args, **kwargs)
+        deleted_changed = not creating and (
+            (self.visibility_override == 'deleted') !=
+            (self._initial_visibility_override == 'deleted'))
+        visibility_changed = creating or (
+            self.visibility != self._initial_visibility or
+            self.visibility_override != self._initial_visibility_override)
+
+        rv = super(SubtitleVersion, self).save(*args, **kwargs)
+        if deleted_changed:
+            self._clear_next_version_changes()
+        if visibility_changed:
+            self.subtitle_language.update_tips()
+        self._initial_visibility = self.visibility
+        self._initial_visibility_override = self.visibility_override
+        return rv
 
 
     def get_ancestors(self):
@@ -1476,8 +1679,33 @@ class SubtitleVersion(models.Model):
         return set(mapcat(_ancestors, self.parents.full()))
 
     def get_subtitle_count(self):
-        # TODO: babelsubs now supports len() on SubtitleSet instances
-        return len([s for s in self.get_subtitles().subtitle_items()])
+        if self._subtitles is not None:
+            return len(self._subtitles)
+        return self.get_subtitle_stream().count()
+
+    def get_timing_range(self):
+        """Get the (start, end) times of the subtitles in milliseconds.
+
+        For versions that were created before we stored the timing summary,
+        this calculates it by streaming through the subtitles and stores it so
+        that we only need to do that once (the backfill_subtitle_timing
+        command can be used to do this for all versions).
+        """
+        if self.timing_start is None or self.timing_end is None:
+            summary = self.get_subtitle_stream().summary()
+            self.timing_start = summary.timing_start
+            self.timing_end = summary.timing_end
+            if self.pk is not None:
+                # Use update() since we don't want to run the save() logic
+                (SubtitleVersion.objects.full().filter(pk=self.pk)
+                 .update(timing_start=self.timing_start,
+                         timing_end=self.timing_end))
+        return self.timing_start, self.timing_end
+
+    def get_duration(self):
+        """Get the time the subtitles span in milliseconds."""
+        start, end = self.get_timing_range()
+        return end - start
 
     def get_changes(self):
         """Return (time_change, text_change).
@@ -1497,17 +1725,55 @@ class SubtitleVersion(models.Model):
         if hasattr(self, '_time_change') and hasattr(self, '_text_change'):
             return (self._time_change, self._text_change)
 
-        parent = self.previous_version()
+        if (self.computed_time_change is not None and
+            self.computed_text_change is not None):
+            self._time_change = self.computed_time_change
+            self._text_change = self.computed_text_change
+            return (self._time_change, self._text_change)
 
-        if not parent:
-            return (1.0, 1.0)
+        return self.calc_changes(self.previous_version())
 
-        self._text_change, self._time_change = calc_changes(
-            parent.get_subtitles(), self.get_subtitles(),
-            HTMLGenerator.MAPPINGS)
+    def calc_changes(self, previous_version):
+        """Calculate the changes from previous_version and save them.
+
+        You probably want to use get_changes() or
+        SubtitleLanguage.load_version_changes() rather than calling this
+        directly.
+
+        :returns: (time_change, text_change) tuple
+        """
+        if previous_version is None:
+            self._time_change, self._text_change = (1.0, 1.0)
+        else:
+            self._text_change, self._time_change = calc_changes(
+                previous_version.get_subtitles(), self.get_subtitles(),
+                HTMLGenerator.MAPPINGS)
+
+        self.computed_time_change = self._time_change
+        self.computed_text_change = self._text_change
+        if self.pk:
+            # Versions are immutable, so we can save the results and never
+            # calculate them again.  Use update() to avoid the save() logic.
+            (SubtitleVersion.objects.full().filter(pk=self.pk)
+             .update(computed_time_change=self._time_change,
+                     computed_text_change=self._text_change))
 
         return self._time_change, self._text_change
 
+    def _clear_next_version_changes(self):
+        """Clear the computed changes for the version after this one.
+
+        get_changes() compares against the previous non-deleted version, so
+        we need to call this when a version gets deleted/undeleted.
+        """
+        qs = (SubtitleVersion.objects.extant()
+              .filter(subtitle_language=self.subtitle_language_id,
+                      version_number__gt=self.version_number)
+              .order_by('version_number'))
+        for next_version in qs[:1]:
+            (SubtitleVersion.objects.full().filter(pk=next_version.pk)
+             .update(computed_time_change=None, computed_text_change=None))
+
     @property
     def time_change(self):
         if not hasattr(self, '_time_change'):
@@ -1829,6 +2095,34 @@ class SubtitleVersionMetadata(models.Model):
             return self.data
 
 
+# Tips ------------------------------------------------------------------------
+class SubtitleLanguageTip(models.Model):
+    """Stores pointers to the tip versions of a SubtitleLanguage.
+
+    This is denormalized data that lets the SubtitleLanguage/SubtitleVersion
+    managers find tips with a simple lookup instead of calculating
+    MAX(version_number) for each language.  It lives in a separate table
+    rather than on SubtitleLanguage so that saving a stale SubtitleLanguage
+    object can't clobber it.
+
+    Rows are kept up to date by SubtitleLanguage.update_tips().  Languages
+    without any versions may not have a row.
+    """
+    language = models.OneToOneField(SubtitleLanguage, primary_key=True,
+                                    related_name='tips')
+    # Tipmost publicly-visible version
+    public_version = models.ForeignKey(SubtitleVersion, null=True,
+                                       blank=True, related_name='+',
+                                       on_delete=models.SET_NULL)
+    # Tipmost non-deleted version (public or private)
+    private_version = models.ForeignKey(SubtitleVersion, null=True,
+                                        blank=True, related_name='+',
+                                        on_delete=models.SET_NULL)
+
+    def __unicode__(self):
+        return u'SubtitleLanguageTip %s (public: %s private: %s)' % (
+            self.language_id, self.public_version_id, self.private_version_id)
+
 # Collaborators ---------------------------------------------------------------
 class CollaboratorManager(models.Manager):
     def get_for(self, subtitle_language):
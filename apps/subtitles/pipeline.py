@@ -376,10 +376,8 @@ def _timings_changed(subtitle_language, new_version):
     previous_version = new_version.previous_version()
     if previous_version is None:
         return False
-    new_timings = [(s.start_time, s.end_time)
-                   for s in new_version.get_subtitles()]
-    old_timings = [(s.start_time, s.end_time)
-                   for s in previous_version.get_subtitles()]
+    new_timings = new_version.get_subtitle_stream().timings()
+    old_timings = previous_version.get_subtitle_stream().timings()
     return new_timings != old_timings
 
 
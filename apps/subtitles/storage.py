@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along
+# with this program.  If not, see http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""Storage of the subtitles for a SubtitleVersion.
+
+Subtitles can be stored in 2 formats:
+
+    - The legacy format: DFXP, zipped then base64'ed and stored in
+      SubtitleVersion.serialized_subtitles
+    - The compact format: a binary encoding of the subtitle items, stored in
+      SubtitleVersion.compact_subtitles.  See encode_compact() for details.
+
+
+SubtitleVersion.get_subtitles() builds a full babelsubs SubtitleSet, which
+means decompressing the blob, building the complete lxml tree and then walking
+it.  Lots of callers only need a small piece of that: the number of
+subtitles, the timings, or the first couple of lines.
+
+SubtitleStream walks the stored DFXP with iterparse instead, throwing away
+each element as soon as it has been read, so memory use doesn't depend on the
+size of the subtitle set and callers can stop reading whenever they want.
+For the compact format, it doesn't need to parse any XML at all.
+"""
+
+import difflib
+import re
+import struct
+import zlib
+from collections import namedtuple
+from cStringIO import StringIO
+from xml.sax.saxutils import escape
+
+from babelsubs import load_from
+from babelsubs.storage import SubtitleLine, SubtitleSet
+from django.db import models
+from django.utils import simplejson as json
+from lxml import etree
+
+from utils.compress import decompress
+
+try:
+    from south.modelsinspector import add_introspection_rules
+except ImportError:
+    pass
+else:
+    add_introspection_rules([], [
+        "^subtitles\.storage\.BlobField",
+        "^apps\.subtitles\.storage\.BlobField",
+    ])
+
+TTML_NAMESPACE = 'http://www.w3.org/ns/ttml'
+_P_TAG = '{%s}p' % TTML_NAMESPACE
+_DIV_TAG = '{%s}div' % TTML_NAMESPACE
+_BR_TAG = '{%s}br' % TTML_NAMESPACE
+
+# babelsubs writes this value for the times of unsynced subtitles
+UNSYNCED_TIME = '99:59:59.999'
+
+_CLOCK_TIME_RE = re.compile(
+    r'^(?P<h>\d+):(?P<m>\d{2}):(?P<s>\d{2}(?:\.\d+)?)$')
+_OFFSET_TIME_RE = re.compile(r'^(?P<value>\d+(?:\.\d+)?)(?P<unit>h|m|s|ms)$')
+_OFFSET_UNITS = {'h': 3600000, 'm': 60000, 's': 1000, 'ms': 1}
+
+# Lightweight version of babelsubs.storage.SubtitleLine.  text is plain text
+# rather than DFXP markup.
+StreamItem = namedtuple('StreamItem', 'start_time end_time text new_paragraph')
+
+SubtitleSummary = namedtuple('SubtitleSummary',
+                             'subtitle_count timing_start timing_end')
+
+def parse_time(value):
+    """Convert a DFXP time expression to milliseconds.
+
+    Returns None for missing/unsynced times.
+    """
+    if not value or value == UNSYNCED_TIME:
+        return None
+    value = value.strip()
+    match = _CLOCK_TIME_RE.match(value)
+    if match:
+        return int(round((int(match.group('h')) * 3600 +
+                          int(match.group('m')) * 60 +
+                          float(match.group('s'))) * 1000))
+    match = _OFFSET_TIME_RE.match(value)
+    if match:
+        return int(round(float(match.group('value')) *
+                         _OFFSET_UNITS[match.group('unit')]))
+    raise ValueError("Invalid time expression: %r" % value)
+
+def _element_text(el):
+    parts = [el.text or '']
+    for child in el:
+        if child.tag == _BR_TAG:
+            parts.append('\n')
+        else:
+            parts.append(_element_text(child))
+        parts.append(child.tail or '')
+    return u''.join(parts)
+
+def calc_summary(items):
+    """Calculate a SubtitleSummary from an iterable of subtitle items.
+
+    items can be babelsubs SubtitleLines or StreamItems, we only look at
+    start_time and end_time.
+
+    The timing range goes from the first time we have to the last time we
+    have.  For a subtitle set that has no synced subtitles both are 0.
+    """
+    count = 0
+    timing_start = timing_end = None
+    for item in items:
+        count += 1
+        if timing_start is None:
+            if item.start_time is not None:
+                timing_start = item.start_time
+            elif item.end_time is not None:
+                # we shouldn't have an end time without a start time, but
+                # handle it just in case
+                timing_start = item.end_time
+        if item.end_time is not None:
+            timing_end = item.end_time
+        elif item.start_time is not None:
+            timing_end = item.start_time
+    if timing_start is None or timing_end is None:
+        timing_start = timing_end = 0
+    return SubtitleSummary(count, timing_start, timing_end)
+
+class SubtitleStream(object):
+    """Iterate over stored subtitles without parsing the whole set.
+
+    :param serialized_subtitles: contents of
+        SubtitleVersion.serialized_subtitles
+    :param compact_subtitles: contents of SubtitleVersion.compact_subtitles.
+        If this is set, we use it rather than serialized_subtitles.
+    :param items: already decoded items, as returned by subtitle_set_items().
+        If this is set, we use it rather than either of the above.
+    """
+    def __init__(self, serialized_subtitles, compact_subtitles=None,
+                 items=None):
+        self.serialized_subtitles = serialized_subtitles
+        self.compact_subtitles = compact_subtitles
+        self.items = items
+
+    def _open(self):
+        if not self.serialized_subtitles:
+            return None
+        return StringIO(decompress(self.serialized_subtitles))
+
+    def __iter__(self):
+        if self.items is not None:
+            return self._iter_items(self.items)
+        elif self.compact_subtitles:
+            return self._iter_items(iter_compact(self.compact_subtitles))
+        else:
+            return self._iter_dfxp()
+
+    def _iter_items(self, items):
+        for start_time, end_time, markup, new_paragraph in items:
+            yield StreamItem(start_time, end_time, markup_to_text(markup),
+                             new_paragraph)
+
+    def _iter_dfxp(self):
+        source = self._open()
+        if source is None:
+            return
+        new_paragraph = False
+        context = etree.iterparse(source, events=('start', 'end'))
+        for event, el in context:
+            if el.tag not in (_DIV_TAG, _P_TAG):
+                continue
+            if el.tag == _DIV_TAG:
+                if event == 'start':
+                    new_paragraph = True
+                else:
+                    el.clear()
+                continue
+            if event == 'start':
+                continue
+            yield StreamItem(parse_time(el.get('begin')),
+                             parse_time(el.get('end')),
+                             _element_text(el), new_paragraph)
+            new_paragraph = False
+            # Free the element and any earlier siblings so that memory use
+            # stays constant.
+            el.clear()
+            while el.getprevious() is not None:
+                del el.getparent()[0]
+
+    def count(self):
+        return sum(1 for item in self)
+
+    def timings(self):
+        """Get a list of (start_time, end_time) tuples."""
+        return [(item.start_time, item.end_time) for item in self]
+
+    def summary(self):
+        return calc_summary(self)
+
+    def excerpt(self, max_items):
+        """Get the first max_items subtitles.
+
+        Only the beginning of the subtitles gets parsed.
+        """
+        items = []
+        if max_items <= 0:
+            return items
+        for item in self:
+            items.append(item)
+            if len(items) >= max_items:
+                break
+        return items
+
+# Compact format --------------------------------------------------------------
+#
+# The compact format is:
+#
+#   - A 3 byte header: the magic string "AS" and the format version
+#   - The zlib-compressed body, which is:
+#     - a varint for the number of subtitles
+#     - for each subtitle:
+#       - a flags byte (see the FLAG_* constants)
+#       - a varint for the start time (only if FLAG_HAS_START is set)
+#       - a varint for the end time (only if FLAG_HAS_END is set)
+#       - a varint for the length of the text, followed by the text.  The text
+#         is the contents of the DFXP <p> element, encoded as UTF-8.
+#
+# If we ever need to change this, bump COMPACT_FORMAT_VERSION and make
+# iter_compact() handle both versions.
+
+COMPACT_MAGIC = 'AS'
+COMPACT_FORMAT_VERSION = 1
+FLAG_NEW_PARAGRAPH = 0x01
+FLAG_HAS_START = 0x02
+FLAG_HAS_END = 0x04
+
+class CompactFormatError(ValueError):
+    pass
+
+def _write_varint(parts, value):
+    while value > 0x7f:
+        parts.append(chr((value & 0x7f) | 0x80))
+        value >>= 7
+    parts.append(chr(value))
+
+def _read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        try:
+            byte = ord(data[pos])
+        except IndexError:
+            raise CompactFormatError("Truncated subtitle data")
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+def _inner_markup(el):
+    """Get the contents of an lxml element as a string of XML."""
+    parts = [escape(el.text or '')]
+    for child in el:
+        parts.append(etree.tostring(child, encoding=unicode, with_tail=True))
+    return u''.join(parts)
+
+def markup_to_text(markup):
+    """Convert the contents of a <p> element to plain text."""
+    if '<' not in markup and '&' not in markup:
+        return markup
+    wrapped = u'<p xmlns="%s">%s</p>' % (TTML_NAMESPACE, markup)
+    return _element_text(etree.fromstring(wrapped.encode('utf-8')))
+
+def subtitle_set_items(subtitle_set):
+    """Get the items for a SubtitleSet
+
+    :returns: list of (start_time, end_time, markup, new_paragraph) tuples,
+        where markup is the contents of the DFXP <p> element.
+    """
+    items = []
+    for el in subtitle_set.get_subtitles():
+        # Paragraphs are stored as <div> elements, so the first subtitle in
+        # each one starts a new paragraph.
+        items.append((parse_time(el.get('begin')), parse_time(el.get('end')),
+                      _inner_markup(el), el.getprevious() is None))
+    return items
+
+def items_to_subtitle_set(items, language_code):
+    """Convert items from subtitle_set_items() back to a SubtitleSet."""
+    lines = [SubtitleLine(start_time, end_time, markup,
+                          {'new_paragraph': new_paragraph})
+             for (start_time, end_time, markup, new_paragraph) in items]
+    return SubtitleSet.from_list(language_code, lines)
+
+def encode_compact(subtitle_set):
+    """Encode a SubtitleSet using the compact format."""
+    return encode_compact_items(subtitle_set_items(subtitle_set))
+
+def encode_compact_items(items):
+    parts = []
+    _write_varint(parts, len(items))
+    for start_time, end_time, markup, new_paragraph in items:
+        flags = 0
+        if new_paragraph:
+            flags |= FLAG_NEW_PARAGRAPH
+        if start_time is not None:
+            flags |= FLAG_HAS_START
+        if end_time is not None:
+            flags |= FLAG_HAS_END
+        parts.append(chr(flags))
+        if start_time is not None:
+            _write_varint(parts, start_time)
+        if end_time is not None:
+            _write_varint(parts, end_time)
+        text = markup.encode('utf-8')
+        _write_varint(parts, len(text))
+        parts.append(text)
+    header = COMPACT_MAGIC + struct.pack('B', COMPACT_FORMAT_VERSION)
+    return header + zlib.compress(''.join(parts))
+
+def iter_compact(data):
+    """Iterate through compact subtitle data
+
+    :yields: (start_time, end_time, markup, new_paragraph) tuples
+    """
+    data = str(data)
+    if data[:2] != COMPACT_MAGIC:
+        raise CompactFormatError("Invalid header")
+    version = struct.unpack('B', data[2:3])[0]
+    if version != COMPACT_FORMAT_VERSION:
+        raise CompactFormatError("Unknown format version: %s" % version)
+    body = zlib.decompress(data[3:])
+    count, pos = _read_varint(body, 0)
+    for i in xrange(count):
+        try:
+            flags = ord(body[pos])
+        except IndexError:
+            raise CompactFormatError("Truncated subtitle data")
+        pos += 1
+        if flags & FLAG_HAS_START:
+            start_time, pos = _read_varint(body, pos)
+        else:
+            start_time = None
+        if flags & FLAG_HAS_END:
+            end_time, pos = _read_varint(body, pos)
+        else:
+            end_time = None
+        length, pos = _read_varint(body, pos)
+        if pos + length > len(body):
+            raise CompactFormatError("Truncated subtitle data")
+        markup = body[pos:pos+length].decode('utf-8')
+        pos += length
+        yield (start_time, end_time, markup,
+               bool(flags & FLAG_NEW_PARAGRAPH))
+
+def decode_compact(data, language_code):
+    """Decode compact subtitle data into a SubtitleSet."""
+    return items_to_subtitle_set(iter_compact(data), language_code)
+
+def convert_to_compact(serialized_subtitles, language_code):
+    """Convert subtitles in the legacy format to the compact format.
+
+    Returns None if the subtitles don't survive the conversion unchanged.  In
+    that case they should stay in the legacy format.
+    """
+    subtitles = load_from(decompress(serialized_subtitles),
+                          type='dfxp').to_internal()
+    data = encode_compact(subtitles)
+    converted = decode_compact(data, language_code)
+    if (list(converted.subtitle_items()) !=
+        list(subtitles.subtitle_items())):
+        return None
+    return data
+
+# Delta format ----------------------------------------------------------------
+#
+# Versions can also be stored as a delta against the version before them.
+# The delta format is:
+#
+#   - A 3 byte header: the magic string "AD" and the format version
+#   - The zlib-compressed JSON list of operations to build the items of the
+#     version from the items of the base version.  Each operation is either:
+#       - [0, start, end]: copy base_items[start:end]
+#       - [1, items]: add new items.  Each item is a list of
+#         [start_time, end_time, markup, new_paragraph]
+
+DELTA_MAGIC = 'AD'
+DELTA_FORMAT_VERSION = 1
+_DELTA_COPY = 0
+_DELTA_INSERT = 1
+
+def encode_delta(base_items, items):
+    """Encode items as a delta against base_items."""
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_items, items, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([_DELTA_COPY, i1, i2])
+        elif j2 > j1:
+            # replace/insert.  For delete we just don't copy the base items.
+            ops.append([_DELTA_INSERT, [list(item) for item in items[j1:j2]]])
+    header = DELTA_MAGIC + struct.pack('B', DELTA_FORMAT_VERSION)
+    return header + zlib.compress(json.dumps(ops, separators=(',', ':')))
+
+def apply_delta(base_items, data):
+    """Apply delta data to base_items
+
+    :returns: list of items for the new version
+    """
+    data = str(data)
+    if data[:2] != DELTA_MAGIC:
+        raise CompactFormatError("Invalid delta header")
+    version = struct.unpack('B', data[2:3])[0]
+    if version != DELTA_FORMAT_VERSION:
+        raise CompactFormatError("Unknown delta format version: %s" % version)
+    items = []
+    for op in json.loads(zlib.decompress(data[3:])):
+        if op[0] == _DELTA_COPY:
+            items.extend(base_items[op[1]:op[2]])
+        elif op[0] == _DELTA_INSERT:
+            items.extend(tuple(item) for item in op[1])
+        else:
+            raise CompactFormatError("Unknown delta operation: %s" % op[0])
+    return items
+
+class BlobField(models.Field):
+    """Stores binary data.
+
+    Values are bytestrings on the python side.
+    """
+    __metaclass__ = models.SubfieldBase
+
+    DB_TYPES = {
+        'mysql': 'longblob',
+        'postgresql': 'bytea',
+        'sqlite': 'blob',
+    }
+
+    def db_type(self, connection):
+        return self.DB_TYPES[connection.vendor]
+
+    def to_python(self, value):
+        if value is None:
+            return None
+        # some DB drivers return buffer objects rather than strings
+        return str(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is None:
+            return None
+        return connection.Database.Binary(value)
@@ -21,15 +21,22 @@
 
 from __future__ import absolute_import 
 
+from StringIO import StringIO
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from django.db import IntegrityError
 from django.test import TestCase
+import mock
 
 from babelsubs.storage import SubtitleSet
 
 from apps.auth.models import CustomUser as User
 from apps.subtitles import pipeline
-from apps.subtitles.models import SubtitleLanguage, SubtitleVersion
+from apps.subtitles import storage
+from apps.subtitles.models import (SubtitleLanguage, SubtitleLanguageTip,
+                                   SubtitleVersion)
 from apps.subtitles.tests.utils import (
     make_video, make_video_2, make_video_3, make_sl, refresh, ids, parent_ids,
     ancestor_ids
@@ -494,6 +501,33 @@ class TestSubtitleVersion(TestCase):
         self.assertAlmostEqual(1/3.0, sv3.get_changes()[0])
         self.assertEquals(1.0, sv3.get_changes()[1])
 
+    def test_load_version_changes(self):
+        sv1 = pipeline.add_subtitles(self.video, 'fr', [
+            (0, 1000, 'Hello there'),
+        ])
+        sv2 = pipeline.add_subtitles(self.video, 'fr', [
+            (0, 1000, 'Hello there.'),
+        ])
+        sv3 = pipeline.add_subtitles(self.video, 'fr', [
+            (0, 2000, 'Hello there.'),
+        ])
+        language = refresh(sv1.subtitle_language)
+        versions = language.get_versions(newest_first=True,
+                                          load_changes=True)
+        self.assertEquals([v.get_changes() for v in versions],
+                          [(1.0, 0.0), (0.0, 1.0), (1.0, 1.0)])
+        # the results should be stored in the DB
+        sv2 = refresh(sv2)
+        self.assertEquals(sv2.computed_time_change, 0.0)
+        self.assertEquals(sv2.computed_text_change, 1.0)
+        # deleting a version should make us recalculate the next one
+        sv2.visibility_override = 'deleted'
+        sv2.save()
+        sv3 = refresh(sv3)
+        self.assertEquals(sv3.computed_time_change, None)
+        language.load_version_changes([sv3])
+        self.assertEquals(sv3.get_changes(), (1.0, 1.0))
+
     def test_subtitle_count(self):
         s0 = (100, 200, "a")
         s1 = (300, 400, "b")
@@ -520,6 +554,58 @@ class TestSubtitleVersion(TestCase):
         sv4 = refresh(sv4)
         self.assertEqual(200, sv4.subtitle_count)
 
+    def test_subtitle_stream(self):
+        sv = self.sl_en.add_version(subtitles=[
+            (100, 200, "a"),
+            (300, 400, "b"),
+            (None, None, "c"),
+        ])
+        sv = refresh(sv)
+        stream = sv.get_subtitle_stream()
+        self.assertEqual(stream.count(), 3)
+        self.assertEqual(stream.timings(),
+                         [(100, 200), (300, 400), (None, None)])
+        self.assertEqual([item.text for item in stream], ["a", "b", "c"])
+        self.assertEqual([item.text for item in stream.excerpt(2)],
+                         ["a", "b"])
+        self.assertEqual(sv.get_subtitle_count(), 3)
+
+    def test_timing_range(self):
+        sv1 = self.sl_en.add_version(subtitles=[])
+        sv2 = self.sl_en.add_version(subtitles=[
+            (100, 200, "a"),
+            (300, 400, "b"),
+            (None, None, "c"),
+        ])
+        sv1 = refresh(sv1)
+        sv2 = refresh(sv2)
+        self.assertEqual(sv1.get_timing_range(), (0, 0))
+        self.assertEqual(sv1.get_duration(), 0)
+        self.assertEqual(sv2.get_timing_range(), (100, 400))
+        self.assertEqual(sv2.get_duration(), 300)
+        # versions created before we stored the timings should calculate them
+        # from the subtitles
+        SubtitleVersion.objects.filter(pk=sv2.pk).update(timing_start=None,
+                                                         timing_end=None)
+        sv2 = refresh(sv2)
+        self.assertEqual(sv2.timing_start, None)
+        self.assertEqual(sv2.get_timing_range(), (100, 400))
+        # ... and store them for next time
+        self.assertEqual(refresh(sv2).timing_start, 100)
+        self.assertEqual(refresh(sv2).timing_end, 400)
+
+    def test_backfill_subtitle_timing(self):
+        sv = self.sl_en.add_version(subtitles=[
+            (100, 200, "a"),
+            (300, 400, "b"),
+        ])
+        SubtitleVersion.objects.filter(pk=sv.pk).update(timing_start=None,
+                                                        timing_end=None)
+        call_command('backfill_subtitle_timing', stdout=StringIO(),
+                     stderr=StringIO())
+        sv = refresh(sv)
+        self.assertEqual((sv.timing_start, sv.timing_end), (100, 400))
+
     def test_sibling_set(self):
         def _assert_siblings(sv, *vns):
             siblings = sv.sibling_set.full().order_by('version_number')
@@ -593,6 +679,86 @@ class TestSubtitleVersion(TestCase):
         self.assertRaises(ValidationError, lambda: crazy.full_clean())
 
 
+class TestCompactStorage(TestCase):
+    def setUp(self):
+        self.video = make_video()
+        self.sl_en = make_sl(self.video, 'en')
+        self.subs = [
+            (100, 200, "a"),
+            (300, 400, "b & c"),
+            (None, None, "d"),
+        ]
+
+    def test_set_subtitles(self):
+        with mock.patch.object(settings, 'COMPACT_SUBTITLE_STORAGE', True):
+            sv = self.sl_en.add_version(subtitles=self.subs)
+        sv = refresh(sv)
+        self.assertEqual(sv.serialized_subtitles, '')
+        self.assertNotEqual(sv.compact_subtitles, None)
+        self.assertEqual(sv.get_subtitles(),
+                         SubtitleSet.from_list('en', self.subs))
+        self.assertEqual(sv.get_subtitle_stream().timings(),
+                         [(100, 200), (300, 400), (None, None)])
+        self.assertEqual([item.text for item in sv.get_subtitle_stream()],
+                         ["a", "b & c", "d"])
+
+    def test_convert_to_compact(self):
+        sv = self.sl_en.add_version(subtitles=self.subs)
+        sv = refresh(sv)
+        self.assertEqual(sv.compact_subtitles, None)
+        data = storage.convert_to_compact(sv.serialized_subtitles, 'en')
+        self.assertEqual(
+            list(storage.decode_compact(data, 'en').subtitle_items()),
+            list(sv.get_subtitles().subtitle_items()))
+
+    def test_invalid_data(self):
+        self.assertRaises(storage.CompactFormatError, list,
+                          storage.iter_compact('XX\x01'))
+
+class TestDeltaStorage(TestCase):
+    def setUp(self):
+        self.video = make_video()
+        self.sl_en = make_sl(self.video, 'en')
+
+    def make_subs(self, version):
+        subs = [(i * 1000, i * 1000 + 500, "Sub %s" % i) for i in xrange(5)]
+        subs[version % 5] = (None, None, "Changed in %s" % version)
+        return subs
+
+    @mock.patch.object(settings, 'DELTA_SUBTITLE_STORAGE', True)
+    @mock.patch.object(settings, 'SUBTITLE_DELTA_KEYFRAME_INTERVAL', 3)
+    def test_delta_chain(self):
+        versions = [self.sl_en.add_version(subtitles=self.make_subs(i))
+                    for i in xrange(7)]
+        self.assertEqual([refresh(v).delta_depth for v in versions],
+                         [0, 1, 2, 0, 1, 2, 0])
+        for i, version in enumerate(versions):
+            version = refresh(version)
+            self.assertEqual(version.get_subtitles(),
+                             SubtitleSet.from_list('en', self.make_subs(i)))
+            self.assertEqual(version.get_subtitle_stream().count(), 5)
+
+    @mock.patch.object(settings, 'DELTA_SUBTITLE_STORAGE', True)
+    def test_materialize_without_cache(self):
+        self.sl_en.add_version(subtitles=self.make_subs(0))
+        self.sl_en.add_version(subtitles=self.make_subs(1))
+        v3 = self.sl_en.add_version(subtitles=self.make_subs(2))
+        v3 = refresh(v3)
+        self.assertEqual(v3.delta_depth, 2)
+        with mock.patch('apps.subtitles.cache.get_version_items') as get:
+            get.return_value = None
+            self.assertEqual(v3.get_subtitles(),
+                             SubtitleSet.from_list('en', self.make_subs(2)))
+
+    def test_encode_delta(self):
+        base = [(0, 100, u'a', True), (100, 200, u'b', False),
+                (200, 300, u'c', False)]
+        items = [(0, 100, u'a', True), (150, 200, u'b', False),
+                 (200, 300, u'c', False), (300, 400, u'd', False)]
+        delta = storage.encode_delta(base, items)
+        self.assertEqual(storage.apply_delta(base, delta), items)
+
+
 class TestHistory(TestCase):
     def setUp(self):
         self.video = make_video()
@@ -1762,6 +1928,35 @@ class TestSubtitleLanguageTipQueries(TestCase):
             self.versions['v2', 'fr', 1],
         ]), ordered=False)
 
+    def test_tips_update_on_visibility_change(self):
+        en_v3 = self.versions['v1', 'en', 3]
+        en_v3.visibility_override = 'deleted'
+        en_v3.save()
+        fr_v2 = self.versions['v1', 'fr', 2]
+        fr_v2.visibility_override = 'public'
+        fr_v2.save()
+
+        public_tips = SubtitleVersion.objects.public_tips()
+        private_tips = SubtitleVersion.objects.private_tips()
+        en = self.langs['v1', 'en']
+        fr = self.langs['v1', 'fr']
+        self.assertEquals(public_tips.get(subtitle_language=en),
+                          self.versions['v1', 'en', 2])
+        self.assertEquals(private_tips.get(subtitle_language=en),
+                          self.versions['v1', 'en', 2])
+        self.assertEquals(public_tips.get(subtitle_language=fr), fr_v2)
+
+    def test_check_subtitle_tips_command(self):
+        # mess up the tips table, then check that the command fixes it
+        en_v1 = self.versions['v1', 'en', 1]
+        SubtitleLanguageTip.objects.filter(
+            language=en_v1.subtitle_language).update(public_version=en_v1)
+        SubtitleLanguageTip.objects.filter(
+            language=self.langs['v1', 'de']).delete()
+        call_command('check_subtitle_tips', repair=True, stdout=StringIO(),
+                     stderr=StringIO())
+        self.test_tip_query()
+
 class TestSubtitleLanguageCaching(TestCase):
     def setUp(self):
         self.video = VideoFactory()
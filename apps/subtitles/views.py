@@ -33,7 +33,7 @@ from django.views.decorators.http import require_POST
 from django.shortcuts import render_to_response, get_object_or_404, redirect
 from django.template.defaultfilters import urlize, linebreaks, force_escape
 
-from subtitles import shims
+from subtitles import downloads, shims
 from subtitles.models import SubtitleLanguage, SubtitleVersion
 from subtitles.templatetags.new_subtitles_tags import visibility
 from teams.models import Task
@@ -322,12 +322,7 @@ def download(request, video_id, language_code, filename, format,
     if not format in babelsubs.get_available_formats():
         raise HttpResponseServerError("Format not found")
 
-    subs_text = babelsubs.to(version.get_subtitles(), format,
-                             language=version.language_code)
-    # since this is a downlaod, we can afford not to escape tags, specially
-    # true since speaker change is denoted by '>>' and that would get entirely
-    # stripped out
-    response = HttpResponse(subs_text, mimetype="text/plain")
+    response = downloads.download_response(request, version, format)
     response['Content-Disposition'] = 'attachment'
     return response
 
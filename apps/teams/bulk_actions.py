@@ -1,7 +1,156 @@
+"""Actions that apply to many team videos or tasks at once.
+
+TeamVideo.move_to() and friends work on one team video at a time: they save
+the TeamVideo and its Video, then update the metadata, Solr indexes and caches
+for it.  That's fine for a few videos, but moving a large project between
+teams queues up hours of celery tasks.
+
+The video functions here make the same changes using UPDATE queries that
+cover a batch of videos at a time.  Once everything is changed, they queue a
+single update_videos_in_bulk task that reindexes and invalidates the caches
+for all of the affected videos.
+"""
+
+import datetime
+
 from django.contrib.contenttypes.models import ContentType
-from subtitles.models import SubtitleLanguage
+from subtitles.models import SubtitleLanguage, SubtitleVersion
+from teams.tasks import update_videos_in_bulk
+from teams.models import (Task, TeamVideo, TeamVideoMigration,
+                          bulk_autocreate_tasks)
+from teams.signals import api_teamvideo_new, video_moved_from_team_to_team
+from videos.models import Video
 
 def complete_approve_tasks(tasks):
     lang_ct = ContentType.objects.get_for_model(SubtitleLanguage)
     for task in tasks:
         task.do_complete_approve(lang_ct=lang_ct)
+
+# Max number of videos to change with a single query
+BATCH_SIZE = 500
+
+def _batches(items):
+    for i in xrange(0, len(items), BATCH_SIZE):
+        yield items[i:i+BATCH_SIZE]
+
+def move_videos(team_videos, new_team, project=None):
+    """Move team videos to a new team and/or project.
+
+    This is the bulk version of TeamVideo.move_to().  Like that method, it
+    expects you to have run the correct permissions checks.
+
+    :param team_videos: TeamVideos to move.  These should have their team,
+        project and video loaded, for example by using select_related().
+    :param new_team: Team to move the videos to
+    :param project: Project to move the videos to.  If this is None, we use
+        the default project for new_team.
+    """
+    if project is None:
+        project = new_team.default_project
+    team_videos = [tv for tv in team_videos
+                   if tv.team_id != new_team.id or tv.project_id != project.id]
+    if not team_videos:
+        return
+    moved_team_videos = []
+    metadata_video_ids = []
+    for batch in _batches(team_videos):
+        old_teams = dict((tv.id, tv.team) for tv in batch)
+        TeamVideo.objects.filter(pk__in=[tv.id for tv in batch]).update(
+            team=new_team, project=project)
+        for tv in batch:
+            tv.team = new_team
+            tv.project = project
+        batch = [tv for tv in batch if old_teams[tv.id] != new_team]
+        if batch:
+            metadata_video_ids.extend(
+                _move_to_team(batch, old_teams, new_team, project))
+            moved_team_videos.extend(batch)
+
+    # fire http notifications that new videos have hit this team
+    for tv in moved_team_videos:
+        api_teamvideo_new.send(tv)
+        video_moved_from_team_to_team.send(sender=tv,
+                                           destination_team=new_team,
+                                           video=tv.video)
+    update_videos_in_bulk.delay([tv.video_id for tv in team_videos],
+                                metadata_video_ids)
+
+def _move_to_team(team_videos, old_teams, new_team, project):
+    """Handle the parts of move_videos() that only apply to videos that
+    changed teams.
+
+    :returns: pks of the videos that need their metadata updated
+    """
+    team_video_ids = [tv.id for tv in team_videos]
+    video_ids = [tv.video_id for tv in team_videos]
+    # For now, we'll just delete any tasks associated with the moved videos.
+    Task.objects.filter(team_video__in=team_video_ids).update(deleted=True)
+
+    # We need to make any as-yet-unmoderated versions public.
+    versions = (SubtitleVersion.objects.extant()
+                .filter(video__in=video_ids)
+                .exclude(visibility='public'))
+    language_ids = set(versions.values_list('subtitle_language_id',
+                                            flat=True))
+    versions.update(visibility='public')
+    metadata_video_ids = set()
+    for language in SubtitleLanguage.objects.filter(pk__in=language_ids):
+        language.update_tips()
+        metadata_video_ids.add(language.video_id)
+
+    Video.objects.filter(pk__in=video_ids).update(
+        is_public=new_team.is_visible,
+        moderated_by=new_team if new_team.moderates_videos() else None,
+        edited=datetime.datetime.now())
+    TeamVideoMigration.objects.bulk_create([
+        TeamVideoMigration(from_team=old_teams[tv.id], to_team=new_team,
+                           to_project=project)
+        for tv in team_videos
+    ])
+    # Create any necessary tasks.
+    bulk_autocreate_tasks(team_videos, update_team_video_index=False)
+    return metadata_video_ids
+
+def add_videos(team, videos, added_by, project=None):
+    """Add videos to a team.
+
+    This is the bulk version of creating a TeamVideo for each video.  The
+    videos must not already belong to a team.
+
+    :param project: Project to add the videos to.  If this is None, we use
+        the team's default project.
+    :returns: list of the new TeamVideos
+    """
+    if project is None:
+        project = team.default_project
+    videos = list(videos)
+    team_videos = []
+    for batch in _batches(videos):
+        now = datetime.datetime.now()
+        TeamVideo.objects.bulk_create([
+            TeamVideo(team=team, project=project, video=video,
+                      added_by=added_by, description=video.description,
+                      created=now)
+            for video in batch
+        ])
+        video_ids = [video.id for video in batch]
+        if team.moderates_videos():
+            Video.objects.filter(pk__in=video_ids).update(moderated_by=team)
+        batch_team_videos = list(TeamVideo.objects.filter(video__in=video_ids)
+                                 .select_related('team', 'project', 'video'))
+        bulk_autocreate_tasks(batch_team_videos, update_team_video_index=False)
+        team_videos.extend(batch_team_videos)
+
+    for tv in team_videos:
+        api_teamvideo_new.send(tv)
+    update_videos_in_bulk.delay([video.id for video in videos])
+    return team_videos
+
+def update_video_public_field(team):
+    """Make the is_public field of a team's videos match the team's visibility.
+    """
+    video_ids = list(Video.objects.filter(teamvideo__team=team)
+                     .values_list('id', flat=True))
+    for batch in _batches(video_ids):
+        Video.objects.filter(pk__in=batch).update(is_public=team.is_visible)
+    update_videos_in_bulk.delay(video_ids)
@@ -18,23 +18,25 @@
 
 from django.core.cache import cache
 
+from utils.cache import KeyNamespace
+
 TIMEOUT = 60 * 60 * 24 * 5 # 5 days
 
+team_namespace = KeyNamespace('team-langs')
+workflow_namespace = KeyNamespace('team-workflows')
 
 def _team_readable_langs_id(team):
-    return u"%s-readable-langs" % team.pk
+    return team_namespace.key(team.pk, 'readable-langs')
 
 def _team_writable_langs_id(team):
-    return u"%s-readable-langs" % team.pk
+    return team_namespace.key(team.pk, 'writable-langs')
 
 def _team_preferred_langs_id(team):
-    return u"%s-preferred-langs" % team.pk
+    return team_namespace.key(team.pk, 'preferred-langs')
 
 
 def invalidate_lang_preferences(team):
-    cache.delete(_team_readable_langs_id(team))
-    cache.delete(_team_writable_langs_id(team))
-    cache.delete(_team_preferred_langs_id(team))
+    team_namespace.invalidate(team.pk)
 
 
 def get_readable_langs(team):
@@ -64,3 +66,16 @@ def get_preferred_langs(team):
         cache.set(cache_key, value, TIMEOUT)
     return value
 
+def invalidate_workflows(team_id):
+    workflow_namespace.invalidate(team_id)
+
+def get_workflows(team):
+    """Get a list of all Workflows for a team."""
+    cache_key = workflow_namespace.key(team.pk, 'workflows')
+    value = cache.get(cache_key)
+    if value is None:
+        from teams.models import Workflow
+        value = list(Workflow.objects.filter(team=team.pk)
+                     .select_related('project'))
+        cache.set(cache_key, value, TIMEOUT)
+    return value
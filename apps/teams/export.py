@@ -0,0 +1,183 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""Export all the public subtitles for a team as a single archive.
+
+Teams can have tens of thousands of subtitle languages, so we never load all
+of them at once.  We work through the languages in chunks, render the public
+tip for each one, and write it to the archive before moving on to the next
+chunk.  Rendering can be spread across a pool of worker processes.
+"""
+
+from cStringIO import StringIO
+from datetime import datetime
+import multiprocessing
+import tarfile
+import time
+import zipfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection
+
+from subtitles import downloads
+from subtitles.models import SubtitleLanguage, SubtitleVersion
+
+CHUNK_SIZE = 200
+ARCHIVE_TYPES = ('zip', 'tar')
+
+class ZipArchive(object):
+    """Write files to a zip archive.
+
+    The zip format needs a seekable file to write to.
+    """
+    extension = 'zip'
+
+    def __init__(self, fileobj):
+        self.zipfile = zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED)
+
+    def add(self, name, content):
+        info = zipfile.ZipInfo(name.encode('utf-8'),
+                               time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        self.zipfile.writestr(info, content)
+
+    def close(self):
+        self.zipfile.close()
+
+class TarArchive(object):
+    """Write files to a gzipped tar archive.
+
+    This works with streams that aren't seekable, like stdout.
+    """
+    extension = 'tar.gz'
+
+    def __init__(self, fileobj):
+        self.tarfile = tarfile.open(fileobj=fileobj, mode='w|gz')
+
+    def add(self, name, content):
+        info = tarfile.TarInfo(name.encode('utf-8'))
+        info.size = len(content)
+        info.mtime = time.time()
+        self.tarfile.addfile(info, StringIO(content))
+
+    def close(self):
+        self.tarfile.close()
+
+def make_archive(archive_type, fileobj):
+    if archive_type == 'zip':
+        return ZipArchive(fileobj)
+    elif archive_type == 'tar':
+        return TarArchive(fileobj)
+    else:
+        raise ValueError("Unknown archive type: %s" % archive_type)
+
+def storage():
+    """Get the storage to save exports to."""
+    if settings.USE_AMAZON_S3:
+        from utils.amazon import default_s3_store
+        return default_s3_store
+    else:
+        return default_storage
+
+def export_filename(team, project, format, archive_type):
+    """Get the storage name to save an export to."""
+    if archive_type == 'zip':
+        extension = ZipArchive.extension
+    else:
+        extension = TarArchive.extension
+    parts = [team.slug]
+    if project is not None:
+        parts.append(project.slug)
+    parts.extend([format, datetime.now().strftime('%Y%m%d%H%M%S')])
+    return 'teams/exports/%s.%s' % ('-'.join(parts), extension)
+
+def iter_public_tip_chunks(team, project=None, chunk_size=CHUNK_SIZE):
+    """Iterate through the public tips for a team's videos.
+
+    :returns: iterator that yields lists of up to chunk_size SubtitleVersions
+    """
+    language_qs = SubtitleLanguage.objects.filter(
+        video__teamvideo__team=team)
+    if project is not None:
+        language_qs = language_qs.filter(video__teamvideo__project=project)
+    last_pk = 0
+    while True:
+        language_ids = list(language_qs.filter(pk__gt=last_pk)
+                            .order_by('pk')
+                            .values_list('pk', flat=True)[:chunk_size])
+        if not language_ids:
+            return
+        last_pk = language_ids[-1]
+        versions = list(SubtitleVersion.objects.public_tips()
+                        .filter(subtitle_language__in=language_ids)
+                        .select_related('video')
+                        .order_by('subtitle_language'))
+        if versions:
+            yield versions
+
+def archive_filename(version, format):
+    video = version.video
+    return u'%s/%s.%s' % (video.video_id,
+                          video.lang_filename(version.language_code), format)
+
+def _render_version(args):
+    version, format = args
+    return downloads.render(version, format)
+
+def export_subtitles(fileobj, team, format, project=None, archive_type='zip',
+                     processes=1, chunk_size=CHUNK_SIZE, progress=None):
+    """Write all public subtitles for a team to an archive.
+
+    :param fileobj: file object to write the archive to
+    :param team: Team to export subtitles for
+    :param format: babelsubs format to render the subtitles in
+    :param project: only export subtitles for videos in this project
+    :param archive_type: "zip" or "tar"
+    :param processes: number of worker processes to render the subtitles
+        with.  If this is 1, we render them in the current process.
+    :param progress: callback function called with the number of files
+        written after each chunk
+    :returns: number of files written
+    """
+    archive = make_archive(archive_type, fileobj)
+    if processes > 1:
+        # Close our DB connection before forking, otherwise the workers
+        # will share it with us.  Django will reconnect when needed.
+        connection.close()
+        pool = multiprocessing.Pool(processes)
+        render_map = lambda args: pool.imap(_render_version, args,
+                                            chunksize=10)
+    else:
+        pool = None
+        render_map = lambda args: map(_render_version, args)
+    count = 0
+    try:
+        for versions in iter_public_tip_chunks(team, project, chunk_size):
+            rendered = render_map([(v, format) for v in versions])
+            for version, content in zip(versions, rendered):
+                archive.add(archive_filename(version, format), content)
+                count += 1
+            if progress:
+                progress(count)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    archive.close()
+    return count
@@ -0,0 +1,91 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from optparse import make_option
+import multiprocessing
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import reset_queries
+
+from teams import export
+from teams.models import Team, Project
+
+class Command(BaseCommand):
+    args = '<team slug>'
+    help = 'Export the public subtitles for a team as a zip or tar archive'
+    option_list = BaseCommand.option_list + (
+        make_option('--format', '-f', dest='format', default='srt',
+                    help='Subtitle format to export (default: srt)'),
+        make_option('--project', '-p', dest='project',
+                    help='Only export videos in the project with this slug'),
+        make_option('--archive', '-a', dest='archive', default='zip',
+                    choices=export.ARCHIVE_TYPES,
+                    help='Archive type: zip or tar (default: zip)'),
+        make_option('--output', '-o', dest='output', default='-',
+                    help='File to write to, "-" for stdout (tar only)'),
+        make_option('--chunk-size', '-c', dest='chunk_size', type="int",
+                    default=export.CHUNK_SIZE,
+                    help='Subtitle languages to fetch per chunk'),
+        make_option('--processes', '-n', dest='processes', type="int",
+                    default=multiprocessing.cpu_count(),
+                    help='Worker processes to render subtitles with'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Usage export_team_subtitles <team-slug>')
+        try:
+            team = Team.objects.get(slug=args[0])
+        except Team.DoesNotExist:
+            raise CommandError('Team with slug %r not found' % (args[0],))
+        if options['project']:
+            try:
+                project = team.project_set.get(slug=options['project'])
+            except Project.DoesNotExist:
+                raise CommandError('Project with slug %r not found' %
+                                   (options['project'],))
+        else:
+            project = None
+
+        if options['output'] == '-':
+            if options['archive'] == 'zip':
+                raise CommandError("Can't write zip archives to stdout, "
+                                   "use --output or --archive=tar")
+            output = sys.stdout
+        else:
+            output = open(options['output'], 'wb')
+
+        start_time = time.time()
+        try:
+            count = export.export_subtitles(
+                output, team, options['format'], project,
+                options['archive'], options['processes'],
+                options['chunk_size'], progress=self.progress)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        # stdout might be the archive, so write our messages to stderr
+        self.stderr.write("done exported %s subtitles in %0.1f seconds\n" %
+                          (count, time.time() - start_time))
+
+    def progress(self, count):
+        reset_queries()
+        self.stderr.write("exported %s subtitles\n" % count)
+        self.stderr.flush()
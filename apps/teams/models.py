@@ -16,11 +16,13 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 from collections import defaultdict
-from itertools import groupby
+from itertools import chain, groupby
 from math import ceil
 import csv
 import datetime
+import heapq
 import logging
+import time
 
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
@@ -54,9 +56,11 @@ from videos.tasks import (
 from teams import tasks
 from utils import DEFAULT_PROTOCOL
 from utils.amazon import S3EnabledImageField, S3EnabledFileField
+from utils.extsort import external_sort
 from utils.panslugify import pan_slugify
 from utils.searching import get_terms
-from videos.models import Video, VideoUrl, SubtitleVersion, SubtitleLanguage
+from videos.models import (Video, VideoUrl, SubtitleVersion, SubtitleLanguage,
+                           bulk_prefetch_languages)
 from subtitles.models import (
     SubtitleVersion as NewSubtitleVersion,
     SubtitleLanguage as NewSubtitleLanguage,
@@ -288,7 +292,7 @@ class Team(models.Model):
         TODO: Refactor this behaviour into something less confusing.
 
         """
-        return Workflow.get_for_target(self.id, 'team')
+        return Workflow.index_for_team(self).for_team()
 
     @property
     def auth_provider(self):
@@ -358,6 +362,10 @@ class Team(models.Model):
             del self._member_cache[user.id]
         except KeyError:
             pass
+        # Also drop the user's teams.permissions.PermissionContext
+        contexts = getattr(user, '_permission_contexts', None)
+        if contexts:
+            contexts.pop(self.id, None)
 
     def _is_role(self, user, role=None):
         """Return whether the given user has the given role in this team.
@@ -859,6 +867,8 @@ class TeamVideo(models.Model):
             video = self.video
 
             video.newsubtitleversion_set.extant().update(visibility='public')
+            for language in video.newsubtitlelanguage_set.all():
+                language.update_tips()
             video.is_public = new_team.is_visible
             video.moderated_by = new_team if new_team.moderates_videos() else None
             video.save()
@@ -903,33 +913,104 @@ def _create_translation_tasks(team_video, subtitle_version=None):
     will probably be translating from.
 
     """
-    preferred_langs = TeamLanguagePreference.objects.get_preferred(team_video.team)
+    bulk_create_translation_tasks([team_video])
 
-    for lang in preferred_langs:
-        # Don't create tasks for languages that are already complete.
-        sl = team_video.video.subtitle_language(lang)
-        if sl and sl.is_complete_and_synced():
-            continue
+# Max number of team videos to handle with a single set of queries in
+# bulk_create_translation_tasks()
+TRANSLATION_TASK_BATCH_SIZE = 500
 
-        # Don't create tasks for languages that already have one.  This includes
-        # review/approve tasks and such.
-        # Doesn't matter if it's complete or not.
-        task_exists = Task.objects.not_deleted().filter(
-            team=team_video.team, team_video=team_video, language=lang
-        ).exists()
-        if task_exists:
-            continue
+def _complete_tips(video_ids, public=False):
+    """Get the tip versions of the complete languages for a list of videos.
+
+    Callers still need to check that the subtitles are fully synced, like
+    SubtitleLanguage.is_complete_and_synced() does.  Parsing the subtitles is
+    the expensive part, so filter the queryset as much as possible first.
+    """
+    if public:
+        tips = NewSubtitleVersion.objects.public_tips()
+    else:
+        tips = NewSubtitleVersion.objects.private_tips()
+    return tips.filter(video__in=video_ids,
+                       subtitle_language__subtitles_complete=True)
+
+def _complete_and_synced_languages(video_ids, language_codes):
+    """Find the languages that are complete and synced for a list of videos.
 
-        # Otherwise, go ahead and create it.
-        task = Task(team=team_video.team, team_video=team_video,
-                    language=lang, type=Task.TYPE_IDS['Translate'])
+    This is the bulk version of SubtitleLanguage.is_complete_and_synced().
+    Only languages in language_codes are checked.
 
-        # we should only update the team video after all tasks for
-        # this video are saved, else we end up with a lot of
-        # wasted tasks
-        task.save(update_team_video_index=False)
+    :returns: set of (video_id, language_code) tuples
+    """
+    tips = _complete_tips(video_ids).filter(
+        language_code__in=list(language_codes))
+    return set((version.video_id, version.language_code)
+               for version in tips
+               if version.get_subtitles().fully_synced)
 
-    tasks.update_one_team_video.delay(team_video.pk)
+def _videos_with_complete_subtitles(video_ids):
+    """Find the videos that have at least one public, complete and synced
+    language.
+
+    :returns: set of video ids
+    """
+    videos_with_subtitles = set()
+    for version in _complete_tips(video_ids, public=True):
+        # we only care whether a video has one of these languages, so don't
+        # parse the subtitles for any others.
+        if (version.video_id not in videos_with_subtitles and
+            version.get_subtitles().fully_synced):
+            videos_with_subtitles.add(version.video_id)
+    return videos_with_subtitles
+
+def bulk_create_translation_tasks(team_videos, update_team_video_index=True):
+    """Create the autocreated translation tasks for a list of team videos.
+
+    This works like calling _create_translation_tasks() for each team video,
+    but instead of checking each preferred language of each video with
+    separate queries, we fetch the complete languages and the existing tasks
+    for a batch of videos at once, then insert the missing tasks with a
+    single bulk_create().  The team videos are then reindexed together,
+    unless update_team_video_index is False.
+
+    """
+    team_videos = list(team_videos)
+    team_videos_by_team = defaultdict(list)
+    for team_video in team_videos:
+        team_videos_by_team[team_video.team_id].append(team_video)
+
+    new_tasks = []
+    for team_team_videos in team_videos_by_team.values():
+        team = team_team_videos[0].team
+        preferred_langs = TeamLanguagePreference.objects.get_preferred(team)
+        if not preferred_langs:
+            continue
+        for i in xrange(0, len(team_team_videos),
+                        TRANSLATION_TASK_BATCH_SIZE):
+            batch = team_team_videos[i:i+TRANSLATION_TASK_BATCH_SIZE]
+            team_video_for_video = dict((tv.video_id, tv.id) for tv in batch)
+            wanted = set((tv.id, lang)
+                         for tv in batch for lang in preferred_langs)
+            # Don't create tasks for languages that are already complete.
+            complete = set(
+                (team_video_for_video[video_id], lang)
+                for video_id, lang in _complete_and_synced_languages(
+                    team_video_for_video.keys(), preferred_langs))
+            # Don't create tasks for languages that already have one.  This
+            # includes review/approve tasks and such.  Doesn't matter if it's
+            # complete or not.
+            existing = set(Task.objects.not_deleted()
+                           .filter(team=team,
+                                   team_video__in=team_video_for_video.values())
+                           .values_list('team_video_id', 'language'))
+            for team_video_id, lang in sorted(wanted - complete - existing):
+                new_tasks.append(Task(team=team, team_video_id=team_video_id,
+                                      language=lang,
+                                      type=Task.TYPE_IDS['Translate']))
+
+    if new_tasks:
+        Task.objects.bulk_create(new_tasks)
+    if update_team_video_index:
+        tasks.queue_team_video_index_updates([tv.id for tv in team_videos])
 
 def autocreate_tasks(team_video):
     workflow = Workflow.get_for_team_video(team_video)
@@ -956,6 +1037,51 @@ def autocreate_tasks(team_video):
     if workflow.autocreate_translate and existing_subtitles:
         _create_translation_tasks(team_video)
 
+def bulk_autocreate_tasks(team_videos, update_team_video_index=True):
+    """Create subtitle/translation tasks for a list of team videos.
+
+    This is the bulk version of autocreate_tasks().  team_videos should have
+    their team and video already loaded, for example by using
+    select_related().
+    """
+    team_videos = list(team_videos)
+    if not team_videos:
+        return
+    videos_with_subtitles = _videos_with_complete_subtitles(
+        [tv.video_id for tv in team_videos])
+    team_videos_with_tasks = set(
+        Task.objects.not_deleted()
+        .filter(team_video__in=[tv.id for tv in team_videos])
+        .values_list('team_video_id', flat=True))
+
+    workflow_indexes = {}
+    subtitle_tasks = []
+    translate_team_videos = []
+    for team_video in team_videos:
+        if team_video.team_id not in workflow_indexes:
+            workflow_indexes[team_video.team_id] = \
+                    Workflow.index_for_team(team_video.team)
+        workflow = workflow_indexes[team_video.team_id].for_team_video(
+            team_video.id, team_video.project_id)
+        if team_video.video_id in videos_with_subtitles:
+            if workflow.autocreate_translate:
+                translate_team_videos.append(team_video)
+        elif (workflow.autocreate_subtitle and
+              team_video.id not in team_videos_with_tasks):
+            original_language = team_video.video.primary_audio_language_code
+            subtitle_tasks.append(Task(team=team_video.team,
+                                       team_video=team_video,
+                                       subtitle_version=None,
+                                       language=original_language or '',
+                                       type=Task.TYPE_IDS['Subtitle']))
+
+    if subtitle_tasks:
+        Task.objects.bulk_create(subtitle_tasks)
+    bulk_create_translation_tasks(translate_team_videos,
+                                  update_team_video_index=False)
+    if update_team_video_index:
+        tasks.queue_team_video_index_updates([tv.id for tv in team_videos])
+
 
 def team_video_save(sender, instance, created, **kwargs):
     """Update the Solr index for this team video.
@@ -963,7 +1089,7 @@ def team_video_save(sender, instance, created, **kwargs):
     TODO: Rename this to something more specific.
 
     """
-    tasks.update_one_team_video.delay(instance.id)
+    tasks.queue_team_video_index_update(instance.id)
 
 def team_video_delete(sender, instance, **kwargs):
     """Perform necessary actions for when a TeamVideo is deleted.
@@ -983,6 +1109,8 @@ def team_video_delete(sender, instance, **kwargs):
         # we need to publish all unpublished subs for this video:
         NewSubtitleVersion.objects.filter(video=video,
                 visibility='private').update(visibility='public')
+        for language in video.newsubtitlelanguage_set.all():
+            language.update_tips()
 
         video.is_public = True
         video.moderated_by = None
@@ -1432,6 +1560,27 @@ class Workflow(models.Model):
         else:
             return Team.objects.get(pk=id)
 
+    @classmethod
+    def index_for_team(cls, team):
+        """Get a WorkflowIndex for a team.
+
+        The team's workflows are stored in the cache, so this usually doesn't
+        need to query the DB.  The cache is invalidated when a Workflow or
+        Project is saved or deleted.
+        """
+        from teams.cache import get_workflows
+        workflows = get_workflows(team)
+        for w in workflows:
+            w.team = team
+        return WorkflowIndex(team, workflows)
+
+    @classmethod
+    def _get_index(cls, team, workflows=None):
+        if workflows:
+            return WorkflowIndex(team, workflows)
+        else:
+            return cls.index_for_team(team)
+
     @classmethod
     def get_for_target(cls, id, type, workflows=None):
         '''Return the most specific Workflow for the given target.
@@ -1442,49 +1591,24 @@ class Workflow(models.Model):
         the TeamVideo's team.  This will let you look it up yourself once and
         use it in many of these calls to avoid hitting the DB each time.
 
-        If workflows is not given it will be looked up with one DB query.
+        If workflows is not given, we use the cached WorkflowIndex for the
+        team.
 
         '''
-        if not workflows:
-            team = Workflow._get_target_team(id, type)
-            workflows = list(Workflow.objects.filter(team=team.id)
-                                             .select_related('project', 'team',
-                                                             'team_video'))
-        else:
-            team = workflows[0].team
-
-        default_workflow = Workflow(team=team)
-
-        if not workflows:
-            return default_workflow
-
         if type == 'team_video':
-            try:
-                return [w for w in workflows
-                        if w.team_video and w.team_video.id == id][0]
-            except IndexError:
-                # If there's no video-specific workflow for this video, there
-                # might be a workflow for its project, so we'll start looking
-                # for that instead.
-                team_video = TeamVideo.objects.get(pk=id)
-                id, type = team_video.project_id, 'project'
-
-        if type == 'project':
-            try:
-                return [w for w in workflows
-                        if w.project and w.project.workflow_enabled
-                        and w.project.id == id and not w.team_video][0]
-            except IndexError:
-                # If there's no project-specific workflow for this project,
-                # there might be one for its team, so we'll fall through.
-                pass
+            team_video = TeamVideo.objects.select_related('team').get(pk=id)
+            return Workflow.get_for_team_video(team_video, workflows)
 
-        if not team.workflow_enabled:
-            return default_workflow
-
-        return [w for w in workflows
-                if (not w.project) and (not w.team_video)][0]
+        if workflows:
+            team = workflows[0].team
+        else:
+            team = Workflow._get_target_team(id, type)
+        index = Workflow._get_index(team, workflows)
 
+        if type == 'project':
+            return index.for_project(id)
+        else:
+            return index.for_team()
 
     @classmethod
     def get_for_team_video(cls, team_video, workflows=None):
@@ -1494,7 +1618,8 @@ class Workflow(models.Model):
         for the TeamVideo's team.  This will let you look it up yourself once
         and use it in many of these calls to avoid hitting the DB each time.
 
-        If workflows is not given it will be looked up with one DB query.
+        If workflows is not given, we use the cached WorkflowIndex for the
+        team.
 
         NOTE: This function caches the workflow for performance reasons.  If the
         workflow changes within the space of a single request that
@@ -1502,8 +1627,9 @@ class Workflow(models.Model):
 
         '''
         if not hasattr(team_video, '_cached_workflow'):
-            team_video._cached_workflow = Workflow.get_for_target(
-                    team_video.id, 'team_video', workflows)
+            index = Workflow._get_index(team_video.team, workflows)
+            team_video._cached_workflow = index.for_team_video(
+                team_video.id, team_video.project_id)
         return team_video._cached_workflow
 
     @classmethod
@@ -1514,10 +1640,12 @@ class Workflow(models.Model):
         for the Project's team.  This will let you look it up yourself once
         and use it in many of these calls to avoid hitting the DB each time.
 
-        If workflows is not given it will be looked up with one DB query.
+        If workflows is not given, we use the cached WorkflowIndex for the
+        team.
 
         '''
-        return Workflow.get_for_target(project.id, 'project', workflows)
+        index = Workflow._get_index(project.team, workflows)
+        return index.for_project(project.id)
 
     @classmethod
     def add_to_team_videos(cls, team_videos):
@@ -1532,10 +1660,10 @@ class Workflow(models.Model):
         if not team_videos:
             return []
 
-        workflows = list(Workflow.objects.filter(team=team_videos[0].team))
+        index = Workflow.index_for_team(team_videos[0].team)
 
         for tv in team_videos:
-            tv.workflow = Workflow.get_for_team_video(tv, workflows)
+            tv.workflow = index.for_team_video(tv.id, tv.project_id)
 
 
     def get_specific_target(self):
@@ -1571,6 +1699,59 @@ class Workflow(models.Model):
         return (self.requires_review_or_approval or self.autocreate_subtitle
                 or self.autocreate_translate)
 
+class WorkflowIndex(object):
+    """Find the most specific Workflow for a target with dict lookups.
+
+    Use Workflow.index_for_team() to get an index built from the cached
+    workflows for a team.
+    """
+    def __init__(self, team, workflows):
+        self.team = team
+        self.has_workflows = bool(workflows)
+        self.team_video_workflows = {}
+        self.project_workflows = {}
+        self.team_workflow = None
+        for w in workflows:
+            if w.team_video_id:
+                self.team_video_workflows.setdefault(w.team_video_id, w)
+            elif w.project_id:
+                if w.project.workflow_enabled:
+                    self.project_workflows.setdefault(w.project_id, w)
+            elif self.team_workflow is None:
+                self.team_workflow = w
+
+    def for_team(self):
+        if (not self.has_workflows or not self.team.workflow_enabled or
+                self.team_workflow is None):
+            return Workflow(team=self.team)
+        return self.team_workflow
+
+    def for_project(self, project_id):
+        workflow = self.project_workflows.get(project_id)
+        if workflow is not None:
+            return workflow
+        return self.for_team()
+
+    def for_team_video(self, team_video_id, project_id):
+        workflow = self.team_video_workflows.get(team_video_id)
+        if workflow is not None:
+            return workflow
+        return self.for_project(project_id)
+
+def invalidate_workflow_cache(sender, instance, **kwargs):
+    from teams.cache import invalidate_workflows
+    invalidate_workflows(instance.team_id)
+
+post_save.connect(invalidate_workflow_cache, Workflow,
+                  dispatch_uid='teams.workflow.invalidate_cache')
+post_delete.connect(invalidate_workflow_cache, Workflow,
+                    dispatch_uid='teams.workflow.invalidate_cache')
+# The project workflow_enabled flag is part of the index too
+post_save.connect(invalidate_workflow_cache, Project,
+                  dispatch_uid='teams.project.invalidate_workflow_cache')
+post_delete.connect(invalidate_workflow_cache, Project,
+                    dispatch_uid='teams.project.invalidate_workflow_cache')
+
 
 # Tasks
 class TaskManager(models.Manager):
@@ -2292,7 +2473,7 @@ class Task(models.Model):
         result = super(Task, self).save(*args, **kwargs)
 
         if update_team_video_index:
-            tasks.update_one_team_video.delay(self.team_video.pk)
+            tasks.queue_team_video_index_update(self.team_video.pk)
 
         return result
 
@@ -2635,6 +2816,11 @@ class BillingReport(models.Model):
     type = models.IntegerField(choices=TYPE_CHOICES,
                                default=TYPE_BILLING_RECORD)
 
+    # number of approve tasks to fetch at once
+    BATCH_SIZE = 500
+    # log our progress every time we write this many rows
+    PROGRESS_INTERVAL = 10000
+
     def __unicode__(self):
         if hasattr(self, 'id') and self.id is not None:
             team_count = self.teams.all().count()
@@ -2644,163 +2830,357 @@ class BillingReport(models.Model):
                 self.start_date.strftime('%Y-%m-%d'),
                 self.end_date.strftime('%Y-%m-%d'))
 
-    def _get_approved_tasks(self):
-        return Task.objects.complete_approve().filter(
-            approved=Task.APPROVED_IDS['Approved'],
-            team__in=self.teams.all(),
-            completed__range=(self.start_date, self.end_date))
+    def _get_approved_tasks(self, shard=None):
+        qs = Task.objects.complete_approve().filter(
+            approved=Task.APPROVED_IDS['Approved'])
+        if shard is None:
+            return qs.filter(team__in=self.teams.all(),
+                             completed__range=(self.start_date,
+                                               self.end_date))
+        qs = qs.filter(team=shard.team, completed__gte=shard.start_date)
+        # shards don't overlap, so only the last one includes its end date
+        if shard.end_date == self.end_date:
+            return qs.filter(completed__lte=shard.end_date)
+        else:
+            return qs.filter(completed__lt=shard.end_date)
+
+    def _iter_approved_task_batches(self, shard=None):
+        """Iterate through the approved tasks for this report in batches.
+
+        The tasks come with their team, video, assignee, version and language
+        already loaded.  Languages/tips for the videos are also prefetched, so
+        that video.title_display() doesn't need to hit the DB.
+        """
+        qs = (self._get_approved_tasks(shard)
+              .select_related('team', 'team_video__video', 'assignee',
+                              'new_subtitle_version__subtitle_language__video')
+              .order_by('pk'))
+        last_pk = 0
+        while True:
+            batch = list(qs.filter(pk__gt=last_pk)[:self.BATCH_SIZE])
+            if not batch:
+                return
+            bulk_prefetch_languages([t.team_video.video for t in batch],
+                                    with_public_tips=True)
+            yield batch
+            last_pk = batch[-1].pk
+
+    def _latest_tasks(self, task_qs, approve_tasks):
+        """Find the latest tasks for a batch of approve tasks.
+
+        :param task_qs: Task queryset to look in
+        :param approve_tasks: list of approve tasks
+        :returns: dict mapping (team_video_id, language) to the most recently
+            completed task from task_qs for that team video/language.
+        """
+        qs = task_qs.filter(
+            team_video__in=set(t.team_video_id for t in approve_tasks),
+            language__in=set(t.language for t in approve_tasks))
+        latest = {}
+        for task in qs.select_related('assignee'):
+            key = (task.team_video_id, task.language)
+            if key not in latest or task.completed > latest[key].completed:
+                latest[key] = task
+        return latest
 
     def _report_date(self, datetime):
         return datetime.strftime('%Y-%m-%d %H:%M:%S')
 
-    def generate_rows_type_approval(self):
-        header = (
-            'Team',
-            'Video Title',
-            'Video ID',
-            'Language',
-            'Minutes',
-            'Original',
-            'Translation?',
-            'Approver',
-            'Date',
-        )
-        rows = [header]
-        for approve_task in self._get_approved_tasks():
-            video = approve_task.team_video.video
-            version = approve_task.new_subtitle_version
-            language = version.subtitle_language
-            subtitle_task = (Task.objects.complete_subtitle_or_translate()
-                             .filter(team_video=approve_task.team_video,
-                                     language=approve_task.language)
-                             .order_by('-completed'))[0]
-            rows.append((
-                approve_task.team.name,
-                video.title_display(),
-                video.video_id,
-                approve_task.language,
-                get_minutes_for_version(version, False),
-                language.is_primary_audio_language(),
-                subtitle_task.type==Task.TYPE_IDS['Translate'],
-                unicode(approve_task.assignee),
-                self._report_date(approve_task.completed),
-            ))
-
-        return rows
-
-    def generate_rows_type_approval_for_users(self):
-        header = (
-            'User',
-            'Task Type',
-            'Team',
-            'Video Title',
-            'Video ID',
-            'Language',
-            'Minutes',
-            'Original',
-            'Approver',
-            'Note',
-            'Date',
-            'Pay Rate',
-        )
-        data_rows = []
-        for approve_task in self._get_approved_tasks():
-            video = approve_task.team_video.video
-            version = approve_task.get_subtitle_version()
-            language = version.subtitle_language
-
-            all_tasks = [approve_task]
-            try:
-                all_tasks.append((Task.objects.complete_subtitle_or_translate()
-                                  .filter(team_video=approve_task.team_video,
-                                          language=approve_task.language)
-                                  .order_by('-completed'))[0])
-            except IndexError:
-                # no subtitling task, probably the review task was manually
-                # created.
-                pass
-            try:
-                all_tasks.append((Task.objects.complete_review()
-                                  .filter(team_video=approve_task.team_video,
-                                          language=approve_task.language)
-                                  .order_by('-completed'))[0])
-            except IndexError:
-                # review not enabled
-                pass
-
-            for task in all_tasks:
-                data_rows.append((
-                    unicode(task.assignee),
-                    task.get_type_display(),
+    APPROVAL_HEADER = (
+        'Team',
+        'Video Title',
+        'Video ID',
+        'Language',
+        'Minutes',
+        'Original',
+        'Translation?',
+        'Approver',
+        'Date',
+    )
+
+    APPROVAL_FOR_USERS_HEADER = (
+        'User',
+        'Task Type',
+        'Team',
+        'Video Title',
+        'Video ID',
+        'Language',
+        'Minutes',
+        'Original',
+        'Approver',
+        'Note',
+        'Date',
+        'Pay Rate',
+    )
+
+    def iter_rows_type_approval(self, shard=None):
+        for batch in self._iter_approved_task_batches(shard):
+            subtitle_tasks = self._latest_tasks(
+                Task.objects.complete_subtitle_or_translate(), batch)
+            for approve_task in batch:
+                video = approve_task.team_video.video
+                version = approve_task.new_subtitle_version
+                language = version.subtitle_language
+                subtitle_task = subtitle_tasks[approve_task.team_video_id,
+                                               approve_task.language]
+                yield (
                     approve_task.team.name,
                     video.title_display(),
                     video.video_id,
-                    language.language_code,
+                    approve_task.language,
                     get_minutes_for_version(version, False),
                     language.is_primary_audio_language(),
+                    subtitle_task.type==Task.TYPE_IDS['Translate'],
                     unicode(approve_task.assignee),
-                    unicode(task.body),
-                    self._report_date(task.completed),
-                    task.assignee.pay_rate_code,
-                ))
+                    self._report_date(approve_task.completed),
+                )
+
+    def iter_rows_type_approval_for_users(self, shard=None):
+        # The rows are sorted by user, which means we can't write them out
+        # as we generate them.  Use external_sort() to avoid keeping them all
+        # in memory.
+        return external_sort(self._iter_data_rows_for_users(shard),
+                             key=lambda row: row[0])
+
+    def _iter_data_rows_for_users(self, shard=None):
+        for batch in self._iter_approved_task_batches(shard):
+            # no subtitling task probably means the review task was manually
+            # created.  No review task means that review is not enabled.
+            subtitle_tasks = self._latest_tasks(
+                Task.objects.complete_subtitle_or_translate(), batch)
+            review_tasks = self._latest_tasks(Task.objects.complete_review(),
+                                              batch)
+            for approve_task in batch:
+                video = approve_task.team_video.video
+                version = approve_task.get_subtitle_version()
+                language = version.subtitle_language
+                minutes = get_minutes_for_version(version, False)
+
+                key = (approve_task.team_video_id, approve_task.language)
+                all_tasks = [approve_task]
+                if key in subtitle_tasks:
+                    all_tasks.append(subtitle_tasks[key])
+                if key in review_tasks:
+                    all_tasks.append(review_tasks[key])
+
+                for task in all_tasks:
+                    yield (
+                        unicode(task.assignee),
+                        task.get_type_display(),
+                        approve_task.team.name,
+                        video.title_display(),
+                        video.video_id,
+                        language.language_code,
+                        minutes,
+                        language.is_primary_audio_language(),
+                        unicode(approve_task.assignee),
+                        unicode(task.body),
+                        self._report_date(task.completed),
+                        task.assignee.pay_rate_code,
+                    )
+
+    def iter_rows_type_billing_record(self, shard=None):
+        if shard is None:
+            teams = self.teams.all()
+        else:
+            teams = [shard.team]
+        for team in teams:
+            for row in BillingRecord.objects.iter_csv_report_for_team(
+                team, self.start_date, self.end_date, add_header=False):
+                yield row
 
-        data_rows.sort(key=lambda row: row[0])
-        return [header] + data_rows
+    def get_header(self):
+        if self.type == BillingReport.TYPE_BILLING_RECORD:
+            return BillingReportGenerator.HEADER
+        elif self.type == BillingReport.TYPE_APPROVAL:
+            return BillingReport.APPROVAL_HEADER
+        elif self.type == BillingReport.TYPE_APPROVAL_FOR_USERS:
+            return BillingReport.APPROVAL_FOR_USERS_HEADER
+        else:
+            raise ValueError("Unknown type: %s" % self.type)
 
-    def generate_rows_type_billing_record(self):
-        rows = []
-        for i,team in enumerate(self.teams.all()):
-            rows = rows + BillingRecord.objects.csv_report_for_team(team,
-                self.start_date, self.end_date, add_header=i == 0)
-        return rows
+    def iter_data_rows(self, shard=None):
+        """Iterate through the rows for this report, without the header.
 
-    def generate_rows(self):
+        :param shard: if given, only generate the rows for that
+            BillingReportShard
+        """
         if self.type == BillingReport.TYPE_BILLING_RECORD:
-            rows = self.generate_rows_type_billing_record()
+            return self.iter_rows_type_billing_record(shard)
         elif self.type == BillingReport.TYPE_APPROVAL:
-            rows = self.generate_rows_type_approval()
+            return self.iter_rows_type_approval(shard)
         elif self.type == BillingReport.TYPE_APPROVAL_FOR_USERS:
-            rows = self.generate_rows_type_approval_for_users()
+            return self.iter_rows_type_approval_for_users(shard)
         else:
             raise ValueError("Unknown type: %s" % self.type)
-        return rows
 
-    def convert_unicode_to_utf8(self, rows):
+    def iter_rows(self):
+        """Iterate through the rows for this report (including headers).
+
+        Rows are generated as they're needed, so that we don't have to hold
+        the entire report in memory.
+        """
+        return chain([self.get_header()], self.iter_data_rows())
+
+    def generate_rows(self):
+        return list(self.iter_rows())
+
+    def convert_row_to_utf8(self, row):
         def _convert(value):
             if isinstance(value, unicode):
                 return value.encode("utf-8")
             else:
                 return value
-        return [tuple(_convert(v) for v in row) for row in rows]
+        return tuple(_convert(v) for v in row)
 
     def process(self):
         """
         Generate the correct rows (including headers), saves it to a tempo file,
         then set's that file to the csv_file property, which if , using the S3
         storage will take care of exporting it to s3.
+
+        Rows are written to the file as they are generated.
         """
         try:
-            rows = self.generate_rows()
+            self.csv_file = self.make_csv_file(self.iter_rows())
         except StandardError:
             logger.error("Error generating billing report: (id: %s)", self.id)
             self.csv_file = None
-        else:
-            self.csv_file = self.make_csv_file(rows)
         self.processed = datetime.datetime.utcnow()
         self.save()
 
-    def make_csv_file(self, rows):
-        rows = self.convert_unicode_to_utf8(rows)
+    def make_csv_file(self, rows, shard=None):
         fn = '/tmp/bill-%s-teams-%s-%s-%s-%s.csv' % (
             self.teams.all().count(),
             self.start_str, self.end_str,
             self.get_type_display(), self.pk)
+        if shard is not None:
+            fn = fn.replace('.csv', '-shard-%s.csv' % shard.index)
+        start_time = time.time()
         with open(fn, 'w') as f:
             writer = csv.writer(f)
-            writer.writerows(rows)
+            for i, row in enumerate(rows):
+                writer.writerow(self.convert_row_to_utf8(row))
+                if i and i % self.PROGRESS_INTERVAL == 0:
+                    logger.info("Billing report %s: %s rows written "
+                                "(%0.1f seconds)", self.id, i,
+                                time.time() - start_time)
 
         return File(open(fn, 'r'))
 
+    # Sharding.  Reports can be split into shards, which are processed in
+    # parallel by the process_billing_report_shard task.  Once the last
+    # shard is done, merge_billing_report_shards() puts their CSV data
+    # together into the final csv_file.
+
+    def _month_ranges(self):
+        """Split the report's date range into months.
+
+        :returns: list of (start_date, end_date) tuples.  The end dates are
+            the start of the next month, except for the last one which is
+            the report's end date.
+        """
+        ranges = []
+        start = self.start_date
+        while True:
+            if start.month == 12:
+                next_month = datetime.date(start.year + 1, 1, 1)
+            else:
+                next_month = datetime.date(start.year, start.month + 1, 1)
+            if next_month >= self.end_date:
+                ranges.append((start, self.end_date))
+                return ranges
+            ranges.append((start, next_month))
+            start = next_month
+
+    def make_shards(self):
+        """Split this report into shards
+
+        Approval reports are split by team and month.  Billing record
+        reports are only split by team, since rows for languages without
+        billing records depend on the records for the whole date range.
+
+        :returns: list of BillingReportShard objects.  If the report only
+            covers 1 team and month, we don't split it and return an empty
+            list.
+        """
+        self.shards.all().delete()
+        if self.type == BillingReport.TYPE_BILLING_RECORD:
+            date_ranges = [(self.start_date, self.end_date)]
+        else:
+            date_ranges = self._month_ranges()
+        teams = list(self.teams.all().order_by('pk'))
+        if len(teams) * len(date_ranges) < 2:
+            return []
+        shards = []
+        for team in teams:
+            for start_date, end_date in date_ranges:
+                shards.append(BillingReportShard.objects.create(
+                    report=self, index=len(shards), team=team,
+                    start_date=start_date, end_date=end_date))
+        return shards
+
+    def process_shard(self, shard):
+        """Generate the CSV data for a shard."""
+        try:
+            shard.csv_file = self.make_csv_file(self.iter_data_rows(shard),
+                                                shard)
+        except StandardError:
+            logger.error("Error generating billing report shard: "
+                         "(id: %s, shard: %s)", self.id, shard.index)
+            shard.csv_file = None
+            shard.failed = True
+        shard.processed = datetime.datetime.utcnow()
+        shard.save()
+
+    def all_shards_processed(self):
+        return not self.shards.filter(processed__isnull=True).exists()
+
+    def _iter_shard_rows(self, shards):
+        readers = []
+        for shard in shards:
+            shard.csv_file.open()
+            readers.append(csv.reader(shard.csv_file))
+        if self.type == BillingReport.TYPE_APPROVAL_FOR_USERS:
+            # each shard is sorted by user, merge them so that the whole
+            # report is.  The shard index keeps the merge stable.
+            def decorate(reader, index):
+                for i, row in enumerate(reader):
+                    yield (row[0], index, i), row
+            merged = heapq.merge(*[decorate(reader, index)
+                                   for index, reader in enumerate(readers)])
+            return (row for key, row in merged)
+        else:
+            return chain.from_iterable(readers)
+
+    def merge_shards(self):
+        """Put the CSV data from our shards together into csv_file.
+
+        If any shard failed, the report fails like it would in process().
+        This can be called more than once, but only the first call will do
+        anything.
+        """
+        claimed = (BillingReport.objects
+                   .filter(pk=self.pk, processed__isnull=True)
+                   .update(processed=datetime.datetime.utcnow()))
+        if not claimed:
+            return
+        shards = list(self.shards.all().order_by('index'))
+        try:
+            if any(shard.failed for shard in shards):
+                raise ValueError("shard failed")
+            self.csv_file = self.make_csv_file(
+                chain([self.get_header()], self._iter_shard_rows(shards)))
+        except StandardError:
+            logger.error("Error merging billing report: (id: %s)", self.id)
+            self.csv_file = None
+        self.processed = datetime.datetime.utcnow()
+        self.save()
+        for shard in shards:
+            if shard.csv_file:
+                shard.csv_file.delete(save=False)
+            shard.delete()
+
     @property
     def start_str(self):
         return self.start_date.strftime("%Y%m%d")
@@ -2809,39 +3189,94 @@ class BillingReport(models.Model):
     def end_str(self):
         return self.end_date.strftime("%Y%m%d")
 
+class BillingReportShard(models.Model):
+    """Part of a BillingReport that gets processed separately.
+
+    See BillingReport.make_shards().  Shards only exist while a report is
+    being processed.
+    """
+    report = models.ForeignKey(BillingReport, related_name='shards')
+    # order of this shard's rows in the final report
+    index = models.PositiveIntegerField()
+    team = models.ForeignKey(Team)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    csv_file = S3EnabledFileField(blank=True, null=True,
+            upload_to='teams/billing/shards/')
+    processed = models.DateTimeField(blank=True, null=True)
+    failed = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('report', 'index')
+
+    def __unicode__(self):
+        return "%s shard %s (%s %s - %s)" % (self.report_id, self.index,
+                self.team_id, self.start_date.strftime('%Y-%m-%d'),
+                self.end_date.strftime('%Y-%m-%d'))
+
 class BillingReportGenerator(object):
-    def __init__(self, all_records, add_header=True):
-        if add_header:
-            self.rows = [self.header()]
-        else:
-            self.rows = []
+    """Generate the rows for a TYPE_BILLING_RECORD report.
 
-        all_records = list(all_records)
+    Records are handled in batches of videos, so iterating through the
+    generator only keeps one batch in memory at a time.  Use the rows
+    attribute if you want them all in a list.
+    """
+    # number of videos to fetch records for at once
+    VIDEO_BATCH_SIZE = 200
 
-        self.make_language_number_map(all_records)
-        self.make_languages_without_records(all_records)
+    def __init__(self, all_records, add_header=True):
+        self.all_records = all_records
+        self.add_header = add_header
 
-        for video, records in groupby(all_records, lambda r: r.video):
-            records = list(records)
-            for lang in self.languages_without_records.get(video.id, []):
-                self.rows.append(
-                    self.make_row_for_lang_without_record(video, lang))
+    @property
+    def rows(self):
+        return list(self)
+
+    def __iter__(self):
+        if self.add_header:
+            yield self.header()
+
+        video_ids = sorted(set(self.all_records.order_by()
+                               .values_list('video', flat=True)))
+        for i in xrange(0, len(video_ids), self.VIDEO_BATCH_SIZE):
+            batch_ids = video_ids[i:i+self.VIDEO_BATCH_SIZE]
+            records = list(self.all_records
+                           .filter(video__in=batch_ids)
+                           .select_related('video', 'team', 'user',
+                                           'new_subtitle_language')
+                           .order_by('video', 'id'))
+            # make all records for a video share the same object, so that
+            # the prefetched languages are used for all of them
+            videos = dict((r.video_id, r.video) for r in records)
             for r in records:
-                self.rows.append(self.make_row(video, r))
+                r.video = videos[r.video_id]
+            bulk_prefetch_languages(videos.values(), with_public_tips=True)
+            self.make_language_number_map(records)
+            self.make_languages_without_records(records)
+
+            for video_id, video_records in groupby(records,
+                                                   lambda r: r.video_id):
+                video = videos[video_id]
+                for lang in self.languages_without_records.get(video_id, []):
+                    yield self.make_row_for_lang_without_record(video, lang)
+                for r in video_records:
+                    yield self.make_row(video, r)
+
+    HEADER = [
+        'Video Title',
+        'Video ID',
+        'Language',
+        'Minutes',
+        'Original',
+        'Language number',
+        'Team',
+        'Created',
+        'Source',
+        'User',
+    ]
 
     def header(self):
-        return [
-            'Video Title',
-            'Video ID',
-            'Language',
-            'Minutes',
-            'Original',
-            'Language number',
-            'Team',
-            'Created',
-            'Source',
-            'User',
-        ]
+        return list(self.HEADER)
 
     def make_row(self, video, record):
         return [
@@ -2859,19 +3294,19 @@ class BillingReportGenerator(object):
 
     def make_language_number_map(self, records):
         self.language_number_map = {}
-        videos = set(r.video for r in records)
-        video_counts = dict((v.id, 0) for v in videos)
+        video_ids = set(r.video_id for r in records)
+        video_counts = dict((vid, 0) for vid in video_ids)
         qs = (BillingRecord.objects
-              .filter(video__in=videos)
-              .order_by('created'))
-        for record in qs:
-            vid = record.video.id
+              .filter(video__in=video_ids)
+              .order_by('created')
+              .values_list('id', 'video'))
+        for record_id, vid in qs:
             video_counts[vid] += 1
-            self.language_number_map[record.id] = video_counts[vid]
+            self.language_number_map[record_id] = video_counts[vid]
 
     def make_languages_without_records(self, records):
         self.languages_without_records = {}
-        videos = [r.video for r in records]
+        videos = dict((r.video_id, r.video) for r in records)
         language_ids = [r.new_subtitle_language_id for r in records]
         no_billing_record_where = """\
 NOT EXISTS (
@@ -2880,11 +3315,12 @@ NOT EXISTS (
     WHERE br.new_subtitle_language_id = subtitles_subtitlelanguage.id
 )"""
         qs = (NewSubtitleLanguage.objects
-              .filter(video__in=videos, subtitles_complete=True)
+              .filter(video__in=videos.keys(), subtitles_complete=True)
               .exclude(id__in=language_ids).
               extra(where=[no_billing_record_where]))
         for lang in qs:
             vid = lang.video_id
+            lang.video = videos[vid]
             if vid not in self.languages_without_records:
                 self.languages_without_records[vid] = [lang]
             else:
@@ -2910,9 +3346,12 @@ class BillingRecordManager(models.Manager):
         return self.filter(team=team, created__gte=start, created__lte=end)
 
     def csv_report_for_team(self, team, start, end, add_header=True):
+        return list(self.iter_csv_report_for_team(team, start, end,
+                                                  add_header))
+
+    def iter_csv_report_for_team(self, team, start, end, add_header=True):
         all_records = self.data_for_team(team, start, end)
-        generator = BillingReportGenerator(all_records, add_header)
-        return generator.rows
+        return iter(BillingReportGenerator(all_records, add_header))
 
     def insert_records_for_translations(self, billing_record):
         """
@@ -2995,37 +3434,11 @@ class BillingRecordManager(models.Manager):
 def get_minutes_for_version(version, round_up_to_integer):
     """
     Return the number of minutes the subtitles specified in version
-    """
-    subs = version.get_subtitles()
-
-    if len(subs) == 0:
-        return 0
-
-    for sub in subs:
-        if sub.start_time is not None:
-            start_time = sub.start_time
-            break
-        # we shouldn't have an end time set without a start time, but handle
-        # it just in case
-        if sub.end_time is not None:
-            start_time = sub.end_time
-            break
-    else:
-        return 0
-
-    for sub in reversed(subs):
-        if sub.end_time is not None:
-            end_time = sub.end_time
-            break
-        # we shouldn't have an end time not set, but check for that just in
-        # case
-        if sub.start_time is not None:
-            end_time = sub.start_time
-            break
-    else:
-        return 0
 
-    duration_seconds =  (end_time - start_time) / 1000.0
+    This uses the timing summary stored on the version, so it doesn't need to
+    parse the subtitles.
+    """
+    duration_seconds = version.get_duration() / 1000.0
     minutes = duration_seconds/60.0
     if round_up_to_integer:
         minutes = int(ceil(minutes))
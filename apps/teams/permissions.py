@@ -16,6 +16,9 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+import operator
+
+from django.db.models import Q
 from django.utils.translation import ugettext as _
 from teams.models import Team, MembershipNarrowing, Workflow, TeamMember, Task
 
@@ -94,29 +97,259 @@ def get_role_for_target(user, team, project=None, lang=None):
     `lang` should be a string (the language code).
 
     """
-    member = get_member(user, team)
-    role = get_role(member)
-    narrowings = get_narrowings(member)
+    return PermissionContext(user, team).role_for_target(project, lang)
 
-    # If the user has no narrowings, just return their overall role.
-    if not narrowings:
-        return role
 
-    # Otherwise the narrowings must match the target.
-    project_narrowings = [n.project for n in narrowings if n.project]
-    lang_narrowings = [n.language for n in narrowings if n.language]
+# Permission contexts
+class PermissionContext(object):
+    """Answer permission checks for one user in one team.
 
-    # The default project is the same as "no project".
-    if project and project.is_default_project:
-        project = None
+    The user's membership and narrowings are loaded when the context is
+    created and the team's WorkflowIndex is fetched the first time it's
+    needed.  After that, checks are answered from memory, so pages that check
+    permissions for each row of a list don't query the database for each row.
+
+    Use get_permission_context() to share a context for the length of a
+    request.  A context won't see role or workflow changes made after it was
+    created.
+    """
+    def __init__(self, user, team):
+        self.user = user
+        self.team = team
+        self.member = get_member(user, team)
+        self.role = get_role(self.member)
+        self.narrowings = get_narrowings(self.member)
+        self.project_narrowings = [n.project for n in self.narrowings
+                                   if n.project]
+        self.lang_narrowings = [n.language for n in self.narrowings
+                                if n.language]
+        self._workflow_index = None
+        self._can_review_own_cache = {}
+
+    @property
+    def workflow_index(self):
+        if self._workflow_index is None:
+            self._workflow_index = Workflow.index_for_team(self.team)
+        return self._workflow_index
+
+    def workflow_for_team_video(self, team_video):
+        # Use the same cache as Workflow.get_for_team_video()
+        if not hasattr(team_video, '_cached_workflow'):
+            team_video._cached_workflow = self.workflow_index.for_team_video(
+                team_video.id, team_video.project_id)
+        return team_video._cached_workflow
+
+    def role_for_target(self, project=None, lang=None):
+        """Get the role the user effectively has for a target.
+
+        `lang` should be a string (the language code).
+        """
+        # If the user has no narrowings, just return their overall role.
+        if not self.narrowings:
+            return self.role
+
+        # Otherwise the narrowings must match the target.
+
+        # The default project is the same as "no project".
+        if project and project.is_default_project:
+            project = None
+
+        if self.project_narrowings and project not in self.project_narrowings:
+            return ROLE_CONTRIBUTOR
+
+        if self.lang_narrowings and lang not in self.lang_narrowings:
+            return ROLE_CONTRIBUTOR
+
+        return self.role
+
+    def _can_review_own_subtitles(self, role):
+        if role not in self._can_review_own_cache:
+            self._can_review_own_cache[role] = (
+                _can_review_own_subtitles_in_team(role, self.team))
+        return self._can_review_own_cache[role]
+
+    def can_create_and_edit_subtitles(self, team_video, lang=None):
+        role = self.role_for_target(team_video.project, lang)
+
+        role_req = {
+            10: ROLE_OUTSIDER,
+            20: ROLE_CONTRIBUTOR,
+            30: ROLE_MANAGER,
+            40: ROLE_ADMIN,
+        }[team_video.team.subtitle_policy]
+
+        return role in _perms_equal_or_greater(role_req,
+                                               include_outsiders=True)
+
+    def can_create_and_edit_translations(self, team_video, lang=None):
+        role = self.role_for_target(team_video.project, lang)
+
+        role_req = {
+            10: ROLE_OUTSIDER,
+            20: ROLE_CONTRIBUTOR,
+            30: ROLE_MANAGER,
+            40: ROLE_ADMIN,
+        }[team_video.team.translate_policy]
+
+        return role in _perms_equal_or_greater(role_req,
+                                               include_outsiders=True)
+
+    def can_review(self, team_video, lang=None, allow_own=False):
+        workflow = self.workflow_for_team_video(team_video)
+        role = self.role_for_target(team_video.project, lang)
+
+        if not workflow.review_allowed:
+            return False
+
+        role_req = {
+            10: ROLE_CONTRIBUTOR,
+            20: ROLE_MANAGER,
+            30: ROLE_ADMIN,
+        }[workflow.review_allowed]
+
+        # Check that the user has the correct role.
+        if role not in _perms_equal_or_greater(role_req):
+            return False
+
+        # Users cannot review their own subtitles, unless we're specifically
+        # overriding that restriction in the arguments.
+        if allow_own:
+            return True
+
+        # Users usually cannot review their own subtitles.
+        if not hasattr(team_video, '_cached_version_for_review'):
+            team_video._cached_version_for_review = (
+                team_video.video.latest_version(language_code=lang,
+                                                public_only=False))
+
+        subtitle_version = team_video._cached_version_for_review
+
+        if (lang and subtitle_version and
+                subtitle_version.author_id == self.user.id):
+            return self._can_review_own_subtitles(role)
+
+        return True
+
+    def can_approve(self, team_video, lang=None):
+        workflow = self.workflow_for_team_video(team_video)
+        role = self.role_for_target(team_video.project, lang)
+
+        if not workflow.approve_allowed:
+            return False
+
+        role_req = {
+            10: ROLE_MANAGER,
+            20: ROLE_ADMIN,
+        }[workflow.approve_allowed]
+
+        return role in _perms_equal_or_greater(role_req)
+
+    def can_perform_task_for(self, type, team_video, language):
+        """Can the user perform the given type of task?"""
+        if type:
+            type = int(type)
+
+        if type == Task.TYPE_IDS['Subtitle']:
+            return self.can_create_and_edit_subtitles(team_video)
+        elif type == Task.TYPE_IDS['Translate']:
+            return self.can_create_and_edit_translations(team_video,
+                                                         language)
+        elif type == Task.TYPE_IDS['Review']:
+            return self.can_review(team_video, language)
+        elif type == Task.TYPE_IDS['Approve']:
+            return self.can_approve(team_video, language)
+
+    def can_perform_task(self, task):
+        """Can the user perform the given task?"""
+        # Hacky check to account for the following case:
+        #
+        # * Reviewer A is reviewing v1 of subs by user B.
+        # * A makes some changes and saves for later, resulting in v2 by A.
+        # * The review task now points at v2, which is authored by A, which
+        #   means that A is now trying to review their own subs, which is not
+        #   allowed.
+        #
+        # For now we're just special-casing this and saying that someone can
+        # perform a review of their own subs if they're already assigned to
+        # the task.
+        #
+        # This doesn't handle all the possible edge cases, but it's good
+        # enough for right now.
+        #
+        # TODO: Remove this hack once we get the "origin" of versions in place.
+        if task.get_type_display() in ['Review', 'Approve']:
+            if (task.assignee_id is not None and
+                    task.assignee_id == self.user.id):
+                return True
+
+        return self.can_perform_task_for(task.type, task.team_video,
+                                         task.language)
+
+    def can_assign_tasks(self, project=None, lang=None):
+        role = self.role_for_target(project, lang)
+
+        role_required = {
+            10: ROLE_CONTRIBUTOR,
+            20: ROLE_MANAGER,
+            30: ROLE_ADMIN,
+        }[self.team.task_assign_policy]
+        return role in _perms_equal_or_greater(role_required)
+
+    def can_delete_tasks(self, project=None, lang=None):
+        if self.role_for_target(project, lang) == ROLE_CONTRIBUTOR:
+            return False
+        return self.can_assign_tasks(project, lang)
+
+    def can_assign_task(self, task):
+        project, lang = task.team_video.project, task.language
+        return (self.can_assign_tasks(project, lang) and
+                self.can_perform_task(task))
+
+    def can_delete_task(self, task):
+        project, lang = task.team_video.project, task.language
+
+        can_delete = self.can_delete_tasks(project, lang)
+
+        # Allow stray review tasks to be deleted.
+        if task.type == Task.TYPE_IDS['Review']:
+            workflow = self.workflow_for_team_video(task.team_video)
+            if not workflow.review_allowed:
+                return can_delete
+
+        # Allow stray approve tasks to be deleted.
+        if task.type == Task.TYPE_IDS['Approve']:
+            workflow = self.workflow_for_team_video(task.team_video)
+            if not workflow.approve_allowed:
+                return can_delete
+
+        return can_delete and self.can_perform_task(task)
+
+    def can_create_tasks_for_video(self, team_video):
+        """Can the user create subtitle/translate tasks for a video?"""
+        role = self.role_for_target(team_video.project, None)
 
-    if project_narrowings and project not in project_narrowings:
-        return ROLE_CONTRIBUTOR
+        role_req = {
+            10: ROLE_CONTRIBUTOR,
+            20: ROLE_MANAGER,
+            30: ROLE_ADMIN,
+        }[team_video.team.task_assign_policy]
 
-    if lang_narrowings and lang not in lang_narrowings:
-        return ROLE_CONTRIBUTOR
+        return role in _perms_equal_or_greater(role_req)
 
-    return role
+def get_permission_context(user, team):
+    """Get a PermissionContext to share for the rest of the request.
+
+    Contexts are stored on the user object, so for request.user they last as
+    long as the request does.  Team.uncache_member() drops the context for a
+    user.
+    """
+    contexts = getattr(user, '_permission_contexts', None)
+    if contexts is None:
+        contexts = {}
+        user._permission_contexts = contexts
+    if team.id not in contexts:
+        contexts[team.id] = PermissionContext(user, team)
+    return contexts[team.id]
 
 
 def roles_user_can_assign(team, user, to_user=None):
@@ -496,11 +729,14 @@ def can_review_own_subtitles(role, team_video):
 
     '''
 
+    return _can_review_own_subtitles_in_team(role, team_video.team)
+
+def _can_review_own_subtitles_in_team(role, team):
     if role == ROLE_OWNER:
         return True
 
     if role == ROLE_ADMIN:
-        admin_owner_count = team_video.team.members.filter(
+        admin_owner_count = team.members.filter(
             user__is_active=True, role__in=(ROLE_ADMIN, ROLE_OWNER)
         ).count()
 
@@ -510,55 +746,12 @@ def can_review_own_subtitles(role, team_video):
     return False
 
 def can_review(team_video, user, lang=None, allow_own=False):
-    workflow = Workflow.get_for_team_video(team_video)
-    role = get_role_for_target(user, team_video.team, team_video.project, lang)
-
-    if not workflow.review_allowed:
-        return False
-
-    role_req = {
-        10: ROLE_CONTRIBUTOR,
-        20: ROLE_MANAGER,
-        30: ROLE_ADMIN,
-    }[workflow.review_allowed]
-
-    # Check that the user has the correct role.
-    if role not in _perms_equal_or_greater(role_req):
-        return False
-
-    # Users cannot review their own subtitles, unless we're specifically
-    # overriding that restriction in the arguments.
-    if allow_own:
-        return True
-
-    # Users usually cannot review their own subtitles.
-    if not hasattr(team_video, '_cached_version_for_review'):
-        team_video._cached_version_for_review = team_video.video.latest_version(
-            language_code=lang, public_only=False)
-
-    subtitle_version = team_video._cached_version_for_review
-
-    if lang and subtitle_version and subtitle_version.author_id == user.id:
-        if can_review_own_subtitles(role, team_video):
-            return True
-        else:
-            return False
-
-    return True
+    context = PermissionContext(user, team_video.team)
+    return context.can_review(team_video, lang, allow_own)
 
 def can_approve(team_video, user, lang=None):
-    workflow = Workflow.get_for_team_video(team_video)
-    role = get_role_for_target(user, team_video.team, team_video.project, lang)
-
-    if not workflow.approve_allowed:
-        return False
-
-    role_req = {
-        10: ROLE_MANAGER,
-        20: ROLE_ADMIN,
-    }[workflow.approve_allowed]
-
-    return role in _perms_equal_or_greater(role_req)
+    context = PermissionContext(user, team_video.team)
+    return context.can_approve(team_video, lang)
 
 def can_message_all_members(team, user):
     """Return whether the user has permission to message all members of the given team."""
@@ -576,28 +769,12 @@ def can_edit_project(team, user, project):
     return role in [ROLE_ADMIN, ROLE_OWNER]
 
 def can_create_and_edit_subtitles(user, team_video, lang=None):
-    role = get_role_for_target(user, team_video.team, team_video.project, lang)
-
-    role_req = {
-        10: ROLE_OUTSIDER,
-        20: ROLE_CONTRIBUTOR,
-        30: ROLE_MANAGER,
-        40: ROLE_ADMIN,
-    }[team_video.team.subtitle_policy]
-
-    return role in _perms_equal_or_greater(role_req, include_outsiders=True)
+    context = PermissionContext(user, team_video.team)
+    return context.can_create_and_edit_subtitles(team_video, lang)
 
 def can_create_and_edit_translations(user, team_video, lang=None):
-    role = get_role_for_target(user, team_video.team, team_video.project, lang)
-
-    role_req = {
-        10: ROLE_OUTSIDER,
-        20: ROLE_CONTRIBUTOR,
-        30: ROLE_MANAGER,
-        40: ROLE_ADMIN,
-    }[team_video.team.translate_policy]
-
-    return role in _perms_equal_or_greater(role_req, include_outsiders=True)
+    context = PermissionContext(user, team_video.team)
+    return context.can_create_and_edit_translations(team_video, lang)
 
 
 def can_publish_edits_immediately(team_video, user, lang):
@@ -739,62 +916,212 @@ def can_create_tasks(team, user, project=None):
 
 def can_delete_tasks(team, user, project=None, lang=None):
     """Return whether the given user has permission to delete tasks at all."""
-
-    role = get_role_for_target(user, team, project, lang)
-    if role == ROLE_CONTRIBUTOR:
-        return False
-    return can_assign_tasks(team, user, project, lang)
+    return PermissionContext(user, team).can_delete_tasks(project, lang)
 
 def can_assign_tasks(team, user, project=None, lang=None):
     """Return whether the given user has permission to assign tasks at all."""
-
-    role = get_role_for_target(user, team, project, lang)
-
-    role_required = {
-        10: ROLE_CONTRIBUTOR,
-        20: ROLE_MANAGER,
-        30: ROLE_ADMIN,
-    }[team.task_assign_policy]
-    return role in _perms_equal_or_greater(role_required)
+    return PermissionContext(user, team).can_assign_tasks(project, lang)
 
 
 def can_perform_task_for(user, type, team_video, language):
     """Return whether the given user can perform the given type of task."""
-
-    if type:
-        type = int(type)
-
-    if type == Task.TYPE_IDS['Subtitle']:
-        return can_create_and_edit_subtitles(user, team_video)
-    elif type == Task.TYPE_IDS['Translate']:
-        return can_create_and_edit_translations(user, team_video, language)
-    elif type == Task.TYPE_IDS['Review']:
-        return can_review(team_video, user, language)
-    elif type == Task.TYPE_IDS['Approve']:
-        return can_approve(team_video, user, language)
+    context = PermissionContext(user, team_video.team)
+    return context.can_perform_task_for(type, team_video, language)
 
 def can_perform_task(user, task):
     """Return whether the given user can perform the given task."""
+    return PermissionContext(user, task.team_video.team).can_perform_task(task)
 
-    # Hacky check to account for the following case:
-    #
-    # * Reviewer A is reviewing v1 of subs by user B.
-    # * A makes some changes and saves for later, resulting in v2 by A.
-    # * The review task now points at v2, which is authored by A, which means
-    #   that A is now trying to review their own subs, which is not allowed.
-    #
-    # For now we're just special-casing this and saying that someone can perform
-    # a review of their own subs if they're already assigned to the task.
-    #
-    # This doesn't handle all the possible edge cases, but it's good enough for
-    # right now.
-    #
-    # TODO: Remove this hack once we get the "origin" of versions in place.
-    if task.get_type_display() in ['Review', 'Approve']:
-        if task.assignee == user:
-            return True
+# Task querysets
+#
+# These functions build Q objects that match the tasks a user can perform,
+# following the same rules as can_perform_task(), so that we can filter tasks
+# in the database rather than checking them one by one.  A user's role and
+# narrowings are the same for every task in a team, so they get evaluated in
+# Python and only the per-task parts (project, language, workflow) end up in
+# the query.
+#
+# The helpers work with "conditions" that are either a Q object, True (matches
+# every task) or False (matches no tasks).  We avoid building Q objects for
+# the trivial cases, since empty Q objects and empty __in lookups don't
+# combine well.
+
+def _cond_and(*conds):
+    if any(c is False for c in conds):
+        return False
+    qs = [c for c in conds if c is not True]
+    return reduce(operator.and_, qs) if qs else True
+
+def _cond_or(*conds):
+    if any(c is True for c in conds):
+        return True
+    qs = [c for c in conds if c is not False]
+    return reduce(operator.or_, qs) if qs else False
+
+def _cond_not(cond):
+    if cond is True or cond is False:
+        return not cond
+    return ~cond
+
+def _cond_in(field, values):
+    if not values:
+        return False
+    return Q(**{'%s__in' % field: values})
+
+def _role_at_least(role, role_req):
+    return role in _perms_equal_or_greater(role_req, include_outsiders=True)
+
+def _narrowing_cond(narrowings, match_language):
+    """Condition for tasks where a member's narrowings give them their role.
+
+    This mirrors get_role_for_target().  Tasks that don't match get the
+    contributor role.  Subtitle tasks are checked without a language, so they
+    never match language narrowings.
+    """
+    cond = True
+    if any(n.project for n in narrowings):
+        cond = _cond_in('team_video__project', [
+            n.project_id for n in narrowings
+            if n.project and not n.project.is_default_project])
+    languages = [n.language for n in narrowings if n.language]
+    if languages:
+        if match_language:
+            cond = _cond_and(cond, _cond_in('language', languages))
+        else:
+            cond = False
+    return cond
+
+def _role_cond(role, narrowed_role, narrowing_cond, role_req):
+    """Condition for tasks where the user has at least role_req."""
+    if _role_at_least(narrowed_role, role_req):
+        return True
+    elif _role_at_least(role, role_req):
+        return narrowing_cond
+    else:
+        return False
+
+def _workflow_cond(workflow_index, check):
+    """Condition for tasks whose workflow passes check().
+
+    This mirrors WorkflowIndex.for_team_video(): a workflow for the team video
+    takes precedence over one for its project, which takes precedence over the
+    team's workflow.
+    """
+    video_workflows = workflow_index.team_video_workflows.values()
+    project_workflows = workflow_index.project_workflows.values()
+    team_workflow = workflow_index.for_team()
+
+    not_video_specific = _cond_not(_cond_in(
+        'team_video', [w.team_video_id for w in video_workflows]))
+    not_project_specific = _cond_not(_cond_in(
+        'team_video__project', [w.project_id for w in project_workflows]))
+    return _cond_or(
+        _cond_in('team_video', [w.team_video_id for w in video_workflows
+                                if check(w)]),
+        _cond_and(not_video_specific, _cond_in(
+            'team_video__project', [w.project_id for w in project_workflows
+                                    if check(w)])),
+        _cond_and(not_video_specific, not_project_specific,
+                  bool(check(team_workflow))))
+
+def _own_review_task_ids(user, team):
+    """Get the ids of review tasks where user wrote the latest version."""
+    return list(Task.objects.filter(
+        team=team, type=Task.TYPE_IDS['Review'], deleted=False,
+        completed=None).extra(where=["""
+        EXISTS (
+            SELECT 1
+              FROM teams_teamvideo tv
+              JOIN subtitles_subtitlelanguage sl ON sl.video_id = tv.video_id
+              JOIN subtitles_subtitlelanguagetip tip ON tip.language_id = sl.id
+              JOIN subtitles_subtitleversion sv
+                   ON sv.id = tip.private_version_id
+             WHERE tv.id = teams_task.team_video_id
+               AND sl.language_code = teams_task.language
+               AND sv.author_id = %s
+        )
+        """], params=[user.id]).values_list('id', flat=True))
+
+def tasks_user_can_perform(user, team, tasks):
+    """Filter a task queryset to the tasks a user can perform.
+
+    This gives the same results as calling can_perform_task() for each task,
+    but does the work in the database.
+
+    :param tasks: Task queryset for team
+    """
+    if user is not None and not user.is_authenticated():
+        user = None
+    member = get_member(user, team) if user is not None else None
+    role = get_role(member)
+    narrowings = get_narrowings(member)
+    narrowed_role = ROLE_CONTRIBUTOR if narrowings else role
+    narrowing_cond = _narrowing_cond(narrowings, match_language=True)
+    workflow_index = Workflow.index_for_team(team)
 
-    return can_perform_task_for(user, task.type, task.team_video, task.language)
+    subtitle_cond = _role_cond(role, narrowed_role,
+                               _narrowing_cond(narrowings, False), {
+        10: ROLE_OUTSIDER,
+        20: ROLE_CONTRIBUTOR,
+        30: ROLE_MANAGER,
+        40: ROLE_ADMIN,
+    }[team.subtitle_policy])
+
+    translate_cond = _role_cond(role, narrowed_role, narrowing_cond, {
+        10: ROLE_OUTSIDER,
+        20: ROLE_CONTRIBUTOR,
+        30: ROLE_MANAGER,
+        40: ROLE_ADMIN,
+    }[team.translate_policy])
+
+    def review_req(workflow):
+        return {
+            10: ROLE_CONTRIBUTOR,
+            20: ROLE_MANAGER,
+            30: ROLE_ADMIN,
+        }[workflow.review_allowed]
+    review_cond = _cond_or(
+        _workflow_cond(workflow_index, lambda w: (
+            w.review_allowed and
+            _role_at_least(narrowed_role, review_req(w)))),
+        _cond_and(narrowing_cond, _workflow_cond(workflow_index, lambda w: (
+            w.review_allowed and _role_at_least(role, review_req(w))))))
+    if review_cond is not False and user is not None:
+        # Users usually can't review their own subtitles
+        if _can_review_own_subtitles_in_team(role, team):
+            can_review_own = narrowing_cond
+        else:
+            can_review_own = False
+        own_review = _cond_in('pk', _own_review_task_ids(user, team))
+        review_cond = _cond_and(review_cond, _cond_not(
+            _cond_and(own_review, _cond_not(can_review_own))))
+
+    def approve_req(workflow):
+        return {
+            10: ROLE_MANAGER,
+            20: ROLE_ADMIN,
+        }[workflow.approve_allowed]
+    approve_cond = _cond_or(
+        _workflow_cond(workflow_index, lambda w: (
+            w.approve_allowed and
+            _role_at_least(narrowed_role, approve_req(w)))),
+        _cond_and(narrowing_cond, _workflow_cond(workflow_index, lambda w: (
+            w.approve_allowed and _role_at_least(role, approve_req(w))))))
+
+    # Users can always perform review/approve tasks assigned to them (see
+    # can_perform_task())
+    if user is not None:
+        review_cond = _cond_or(review_cond, Q(assignee=user))
+        approve_cond = _cond_or(approve_cond, Q(assignee=user))
+
+    cond = _cond_or(
+        _cond_and(Q(type=Task.TYPE_IDS['Subtitle']), subtitle_cond),
+        _cond_and(Q(type=Task.TYPE_IDS['Translate']), translate_cond),
+        _cond_and(Q(type=Task.TYPE_IDS['Review']), review_cond),
+        _cond_and(Q(type=Task.TYPE_IDS['Approve']), approve_cond))
+    if cond is False:
+        return tasks.none()
+    return tasks.filter(cond)
 
 def can_assign_task(task, user):
     """Return whether the given user can assign the given task.
@@ -805,9 +1132,7 @@ def can_assign_task(task, user):
     * They can perform the task themselves.
 
     """
-    team, project, lang = task.team, task.team_video.project, task.language
-
-    return can_assign_tasks(team, user, project, lang) and can_perform_task(user, task)
+    return PermissionContext(user, task.team_video.team).can_assign_task(task)
 
 def can_decline_task(task, user):
     """Return whether the given user can decline the given task.
@@ -821,48 +1146,17 @@ def can_decline_task(task, user):
 
 def can_delete_task(task, user):
     """Return whether the given user can delete the given task."""
-
-    team, project, lang = task.team, task.team_video.project, task.language
-
-    can_delete = can_delete_tasks(team, user, project, lang)
-
-    # Allow stray review tasks to be deleted.
-    if task.type == Task.TYPE_IDS['Review']:
-        workflow = Workflow.get_for_team_video(task.team_video)
-        if not workflow.review_allowed:
-            return can_delete
-
-    # Allow stray approve tasks to be deleted.
-    if task.type == Task.TYPE_IDS['Approve']:
-        workflow = Workflow.get_for_team_video(task.team_video)
-        if not workflow.approve_allowed:
-            return can_delete
-
-    return can_delete and can_perform_task(user, task)
+    return PermissionContext(user, task.team_video.team).can_delete_task(task)
 
 
 def _user_can_create_task_subtitle(user, team_video):
-    role = get_role_for_target(user, team_video.team, team_video.project, None)
-
-    role_req = {
-        10: ROLE_CONTRIBUTOR,
-        20: ROLE_MANAGER,
-        30: ROLE_ADMIN,
-    }[team_video.team.task_assign_policy]
-
-    return role in _perms_equal_or_greater(role_req)
+    context = PermissionContext(user, team_video.team)
+    return context.can_create_tasks_for_video(team_video)
 
 def _user_can_create_task_translate(user, team_video):
     # TODO: Take language into account here
-    role = get_role_for_target(user, team_video.team, team_video.project, None)
-
-    role_req = {
-        10: ROLE_CONTRIBUTOR,
-        20: ROLE_MANAGER,
-        30: ROLE_ADMIN,
-    }[team_video.team.task_assign_policy]
-
-    return role in _perms_equal_or_greater(role_req)
+    context = PermissionContext(user, team_video.team)
+    return context.can_create_tasks_for_video(team_video)
 
 
 def can_create_task_subtitle(team_video, user=None, workflows=None):
@@ -35,6 +35,9 @@ LANGUAGES_DICT = dict(settings.ALL_LANGUAGES)
 
 
 class TeamVideoLanguagesIndex(SearchIndex):
+    # How many team videos to send to Solr in a single update request
+    BATCH_SIZE = 200
+
     text = CharField(
         document=True, use_template=True,
         template_name="teams/teamvideo_languages_for_search.txt")
@@ -87,15 +90,18 @@ class TeamVideoLanguagesIndex(SearchIndex):
     num_completed_langs = IntegerField()
 
     def prepare(self, obj):
+        if not hasattr(obj, '_index_prefetch'):
+            self.prefetch([obj])
+        video = obj.video
         self.prepared_data = super(TeamVideoLanguagesIndex, self).prepare(obj)
         self.prepared_data['team_id'] = obj.team.id
         self.prepared_data['team_video_pk'] = obj.id
-        self.prepared_data['video_pk'] = obj.video.id
-        self.prepared_data['video_id'] = obj.video.video_id
-        self.prepared_data['video_title'] = obj.video.title.strip()
-        self.prepared_data['video_url'] = obj.video.get_video_url()
+        self.prepared_data['video_pk'] = video.id
+        self.prepared_data['video_id'] = video.video_id
+        self.prepared_data['video_title'] = video.title.strip()
+        self.prepared_data['video_url'] = obj._index_prefetch['video_url']
 
-        original_sl = obj.video.subtitle_language()
+        original_sl = video.subtitle_language()
 
         if original_sl:
             self.prepared_data['original_language_display'] = original_sl.get_language_code_display
@@ -106,19 +112,25 @@ class TeamVideoLanguagesIndex(SearchIndex):
 
         self.prepared_data['absolute_url'] = obj.get_absolute_url()
         self.prepared_data['thumbnail'] = obj.get_thumbnail()
-        self.prepared_data['title'] = obj.video.title_display()
+        self.prepared_data['title'] = video.title_display()
         self.prepared_data['description'] = obj.description
-        self.prepared_data['is_complete'] = obj.video.complete_date is not None
-        self.prepared_data['video_complete_date'] = obj.video.complete_date
+        self.prepared_data['is_complete'] = video.complete_date is not None
+        self.prepared_data['video_complete_date'] = video.complete_date
         self.prepared_data['project_pk'] = obj.project.pk
         self.prepared_data['project_name'] = obj.project.name
         self.prepared_data['project_slug'] = obj.project.slug
         self.prepared_data['team_video_create_date'] = obj.created
 
-        completed_sls = list(obj.video.completed_subtitle_languages())
-        all_sls = obj.video.newsubtitlelanguage_set.having_nonempty_tip()
+        # Use the prefetched languages and tips rather than
+        # completed_subtitle_languages() and having_nonempty_tip(), which
+        # both need extra queries.
+        all_sls = video.all_subtitle_languages()
+        completed_sls = [sl for sl in all_sls
+                         if sl.is_complete_and_synced(public=True)]
+        nonempty_sls = [sl for sl in all_sls
+                        if sl.get_tip() and sl.get_tip().subtitle_count > 0]
 
-        self.prepared_data['num_total_langs'] = all_sls.count()
+        self.prepared_data['num_total_langs'] = len(nonempty_sls)
         self.prepared_data['num_completed_langs'] = len(completed_sls)
 
         self.prepared_data['video_completed_langs'] = \
@@ -126,15 +138,69 @@ class TeamVideoLanguagesIndex(SearchIndex):
         self.prepared_data['video_completed_lang_urls'] = \
             [sl.get_absolute_url() for sl in completed_sls]
 
-        self.prepared_data['task_count'] = models.Task.objects.incomplete().filter(team_video=obj).count()
-
-        team_video = obj.video.get_team_video()
+        self.prepared_data['task_count'] = obj._index_prefetch['task_count']
 
-        self.prepared_data['is_public'] =  team_video.team.is_visible 
-        self.prepared_data["owned_by_team_id"] = team_video.team.id if team_video else None
+        self.prepared_data['is_public'] = obj.team.is_visible
+        self.prepared_data["owned_by_team_id"] = obj.team.id
 
         return self.prepared_data
 
+    def prefetch(self, team_videos):
+        """Fetch the data needed to prepare a list of team videos.
+
+        prepare() needs the subtitle languages, tips, task counts and
+        primary URL for each team video.  Fetching them one team video at a
+        time takes around 10 queries each, this fetches them for the whole
+        list with a constant number of queries.
+
+        team_videos should have their team, project and video already
+        loaded, for example by using select_related().
+        """
+        from videos.models import VideoUrl, bulk_prefetch_languages
+
+        team_videos = list(team_videos)
+        if not team_videos:
+            return
+        videos = [tv.video for tv in team_videos]
+        video_ids = [v.id for v in videos]
+        bulk_prefetch_languages(videos, with_public_tips=True,
+                                with_private_tips=True)
+        task_counts = dict(
+            models.Task.objects.incomplete()
+            .filter(team_video__in=[tv.id for tv in team_videos])
+            .order_by().values_list('team_video')
+            .annotate(count=Count('id')))
+        video_urls = {}
+        for vurl in VideoUrl.objects.filter(video__in=video_ids,
+                                            primary=True):
+            video_urls.setdefault(vurl.video_id, vurl.effective_url)
+        for tv in team_videos:
+            tv.video._cached_teamvideo = tv
+            tv._index_prefetch = {
+                'task_count': task_counts.get(tv.id, 0),
+                'video_url': video_urls.get(tv.video_id),
+            }
+
+    def index_queryset(self):
+        return models.TeamVideo.objects.select_related('team', 'project',
+                                                       'video')
+
+    def update(self):
+        qs = self.index_queryset().order_by('pk')
+        last_pk = 0
+        while True:
+            team_videos = list(qs.filter(pk__gt=last_pk)[:self.BATCH_SIZE])
+            if not team_videos:
+                break
+            self.update_batch(team_videos)
+            last_pk = team_videos[-1].pk
+
+    def update_batch(self, team_videos):
+        """Index a list of team videos using a single Solr request."""
+        team_videos = list(team_videos)
+        self.prefetch(team_videos)
+        self.backend.update(self, team_videos)
+
     @classmethod
     def results_for_members(self, team):
         base_qs = SearchQuerySet().models(models.TeamVideo)
@@ -18,16 +18,11 @@
 
 from django.dispatch import receiver
 
-from teams.models import TeamVideo
-from teams.signals import api_teamvideo_new
+from teams import bulk_actions
 from videos.signals import feed_imported
 
 @receiver(feed_imported)
 def on_feed_imported(signal, sender, new_videos, **kwargs):
     if sender.team is None:
         return
-    for video in new_videos:
-        tv = TeamVideo.objects.create(
-            video=video, team=sender.team, added_by=sender.user,
-            description=video.description)
-        api_teamvideo_new.send(tv)
+    bulk_actions.add_videos(sender.team, new_videos, sender.user)
@@ -1,5 +1,6 @@
 from datetime import datetime
 import logging
+import tempfile
 
 logger = logging.getLogger('teams.tasks')
 
@@ -7,6 +8,7 @@ from celery.schedules import crontab, timedelta
 from celery.task import task
 from django.conf import settings
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.db.models import F
 from django.utils.translation import ugettext_lazy as _
 from haystack import site
@@ -15,13 +17,13 @@ from utils import send_templated_email
 from utils.metrics import Gauge, Meter
 from widget.video_cache import (
     invalidate_cache as invalidate_video_cache,
+    invalidate_cache_for_videos,
     invalidate_video_moderation,
     invalidate_video_visibility
 )
 
 from utils.metrics import Timer
 from utils.text import fmt
-from apps.videos.tasks import video_changed_tasks
 
 @task()
 def invalidate_video_caches(team_id):
@@ -55,13 +57,8 @@ def update_video_public_field(team_id):
     from apps.teams.models import Team
 
     with Timer("update-video-public-field-time"):
-        team = Team.objects.get(pk=team_id)
-
-        for team_video in team.teamvideo_set.all():
-            video = team_video.video
-            video.is_public = team.is_visible
-            video.save()
-            video_changed_tasks(video.id)
+        from teams import bulk_actions
+        bulk_actions.update_video_public_field(Team.objects.get(pk=team_id))
 
 @task
 def expire_tasks():
@@ -138,19 +135,102 @@ def _notify_teams_of_new_videos(team_qs):
                                  context, fail_silently=not settings.DEBUG)
 
 
+# How long to wait before running a queued index update.  Any other updates
+# for the same team video that get queued in that time are coalesced into it.
+TEAM_VIDEO_INDEX_DELAY = 10
+
+def _index_pending_key(team_video_id):
+    return 'team-video-index-pending-%s' % team_video_id
+
+def queue_team_video_index_update(team_video_id):
+    """Schedule a Solr update for the given team video.
+
+    We often change a team video several times in a row (for example, by
+    saving all of its tasks).  Rather than reindexing it for each change, we
+    schedule a single update TEAM_VIDEO_INDEX_DELAY seconds in the future and
+    skip any requests that come in before it runs.
+    """
+    # the timeout is a fallback in case the task gets lost somehow
+    if cache.add(_index_pending_key(team_video_id), True,
+                 TEAM_VIDEO_INDEX_DELAY * 6):
+        update_one_team_video.apply_async(args=(team_video_id,),
+                                          countdown=TEAM_VIDEO_INDEX_DELAY)
+
+def queue_team_video_index_updates(team_video_ids):
+    """Schedule a single Solr update for a list of team videos.
+
+    This works like queue_team_video_index_update(), but all of the team
+    videos that don't already have an update pending get indexed by one
+    update_team_video_index task.
+    """
+    pending_ids = [pk for pk in team_video_ids
+                   if cache.add(_index_pending_key(pk), True,
+                                TEAM_VIDEO_INDEX_DELAY * 6)]
+    if pending_ids:
+        update_team_video_index.apply_async(args=(pending_ids,),
+                                            countdown=TEAM_VIDEO_INDEX_DELAY)
+
 @task()
 def update_one_team_video(team_video_id):
     """Update the Solr index for the given team video."""
+    update_team_video_index([team_video_id])
+
+@task()
+def update_team_video_index(team_video_ids):
+    """Update the Solr index for a list of team videos.
+
+    The team videos are prepared using bulk queries and sent to Solr in
+    batches of TeamVideoLanguagesIndex.BATCH_SIZE.
+    """
     from teams.models import TeamVideo
-    try:
-        team_video = TeamVideo.objects.get(id=team_video_id)
-    except TeamVideo.DoesNotExist:
-        return
 
+    # clear the pending keys first, so that any changes made while we're
+    # indexing will queue another update.
+    cache.delete_many([_index_pending_key(pk) for pk in team_video_ids])
     tv_search_index = site.get_index(TeamVideo)
-    tv_search_index.backend.update(
-        tv_search_index, [team_video])
+    batch_size = tv_search_index.BATCH_SIZE
+    for i in xrange(0, len(team_video_ids), batch_size):
+        batch_ids = team_video_ids[i:i+batch_size]
+        team_videos = (TeamVideo.objects.filter(pk__in=batch_ids)
+                       .select_related('team', 'project', 'video'))
+        tv_search_index.update_batch(team_videos)
+
+@task()
+def update_videos_in_bulk(video_ids, metadata_video_ids=()):
+    """Update the search indexes and caches for a list of changed videos.
 
+    teams.bulk_actions queues this after changing many videos with UPDATE
+    queries, instead of running video_changed_tasks for each video.  We work
+    through the videos in batches, invalidating their caches and sending each
+    batch to Solr in a single request.
+
+    :param video_ids: pks of the videos that changed
+    :param metadata_video_ids: pks of videos that also need their metadata
+        updated, because their subtitles changed
+    """
+    from teams.models import TeamVideo
+    from videos import metadata_manager
+    from videos.models import Video
+
+    for video_pk in metadata_video_ids:
+        metadata_manager.update_metadata(video_pk)
+
+    video_index = site.get_index(Video)
+    team_video_ids = []
+    batch_size = site.get_index(TeamVideo).BATCH_SIZE
+    for i in xrange(0, len(video_ids), batch_size):
+        videos = list(Video.objects.filter(pk__in=video_ids[i:i+batch_size]))
+        if not videos:
+            continue
+        cache_video_ids = [video.video_id for video in videos]
+        invalidate_cache_for_videos(cache_video_ids)
+        for video_id in cache_video_ids:
+            invalidate_video_moderation(video_id)
+            invalidate_video_visibility(video_id)
+        video_index.backend.update(video_index, videos)
+        team_video_ids.extend(TeamVideo.objects.filter(video__in=videos)
+                              .values_list('id', flat=True))
+    update_team_video_index(team_video_ids)
 
 @task()
 def api_notify_on_subtitles_activity(team_pk, event_name, version_pk):
@@ -191,7 +271,85 @@ def gauge_teams():
 
 @task()
 def process_billing_report(billing_report_pk):
+    """Process a billing report.
+
+    Reports that cover multiple teams/months get split into shards that are
+    processed in parallel by process_billing_report_shard.
+    """
+    from teams.models import BillingReport
+    report = BillingReport.objects.get(pk=billing_report_pk)
+    shards = report.make_shards()
+    if shards:
+        for shard in shards:
+            process_billing_report_shard.delay(shard.pk)
+    else:
+        with Timer('billing-csv-time'):
+            report.process()
+
+@task()
+def process_billing_report_shard(shard_pk):
+    from teams.models import BillingReportShard
+    shard = BillingReportShard.objects.select_related('report').get(
+        pk=shard_pk)
+    report = shard.report
+    with Timer('billing-csv-shard-time'):
+        report.process_shard(shard)
+    if report.all_shards_processed():
+        merge_billing_report_shards.delay(report.pk)
+
+@task()
+def merge_billing_report_shards(billing_report_pk):
     from teams.models import BillingReport
     report = BillingReport.objects.get(pk=billing_report_pk)
-    with Timer('billing-csv-time'):
-        report.process()
+    with Timer('billing-csv-merge-time'):
+        report.merge_shards()
+
+@task()
+def export_team_subtitles(team_id, format, project_id=None,
+                          archive_type='zip', user_id=None):
+    """Export a team's public subtitles and save the archive to storage.
+
+    If user_id is given, we email that user a link to the archive.
+
+    This renders the subtitles in the task process.  Celery's worker
+    processes are daemonic, so they can't start a process pool.  Use the
+    export_team_subtitles management command for that.
+    """
+    from django.core.files import File
+    from auth.models import CustomUser as User
+    from teams import export
+    from teams.models import Team, Project
+
+    team = Team.objects.get(pk=team_id)
+    if project_id is not None:
+        project = Project.objects.get(pk=project_id, team=team)
+    else:
+        project = None
+    with tempfile.TemporaryFile() as f:
+        with Timer('team-subtitle-export-time'):
+            count = export.export_subtitles(f, team, format, project,
+                                            archive_type)
+        f.seek(0)
+        name = export.storage().save(
+            export.export_filename(team, project, format, archive_type),
+            File(f))
+    logger.info("exported %s subtitles for %s to %s", count, team.slug, name)
+
+    if user_id is not None:
+        user = User.objects.get(pk=user_id)
+        url = export.storage().url(name)
+        if url.startswith('/'):
+            url = 'http://%s%s' % (Site.objects.get_current().domain, url)
+        context = {
+            'user': user,
+            'team': team,
+            'project': project,
+            'count': count,
+            'url': url,
+        }
+        subject = fmt(_(u'Your %(team)s subtitle export is ready'),
+                      team=team)
+        send_templated_email(user, subject,
+                             'teams/email_subtitle_export.html',
+                             context, fail_silently=not settings.DEBUG)
+    return name
@@ -41,10 +41,7 @@ from apps.teams.permissions import (
     can_view_approve_tab as _can_view_approve_tab,
     can_edit_video as _can_edit_video,
     can_rename_team as _can_rename_team,
-    can_perform_task as _can_perform_task,
-    can_assign_task as _can_assign_task,
     can_decline_task as _can_decline_task,
-    can_delete_task as _can_delete_task,
     can_remove_video as _can_remove_video,
     can_delete_video as _can_delete_video,
     can_delete_video_in_team as _can_delete_video_in_team,
@@ -54,7 +51,7 @@ from apps.teams.permissions import (
 from apps.teams.permissions import (
     can_invite, can_add_video_somewhere,
     can_create_tasks, can_create_task_subtitle, can_create_task_translate,
-    can_create_and_edit_subtitles, can_create_and_edit_translations
+    get_permission_context
 )
 
 from haystack import site
@@ -460,9 +457,14 @@ def can_leave_team(team, user):
 def can_create_any_task_for_teamvideo(context, team_video, user):
     workflows = context.get('team_workflows')
 
-    if can_create_task_subtitle(team_video, user, workflows):
+    # The user checks for subtitle and translate tasks are the same, so do it
+    # once here rather than in can_create_task_subtitle/translate
+    if user and not get_permission_context(
+            user, team_video.team).can_create_tasks_for_video(team_video):
+        result = False
+    elif can_create_task_subtitle(team_video, None, workflows):
         result = True
-    elif can_create_task_translate(team_video, user, workflows):
+    elif can_create_task_translate(team_video, None, workflows):
         result = True
     else:
         result = False
@@ -474,42 +476,40 @@ def can_create_any_task_for_teamvideo(context, team_video, user):
 
 @register.filter
 def review_enabled(team):
-    w = Workflow.get_for_target(team.id, 'team')
+    index = Workflow.index_for_team(team)
 
-    if w.review_enabled:
+    if index.for_team().review_enabled:
         return True
 
-    for p in team.project_set.all():
-        if p.workflow_enabled:
-            w = Workflow.get_for_project(p)
-            if w.review_enabled:
-                return True
+    for w in index.project_workflows.values():
+        if w.review_enabled:
+            return True
 
     return False
 
 
 @register.filter
 def approve_enabled(team):
-    w = Workflow.get_for_target(team.id, 'team')
+    index = Workflow.index_for_team(team)
 
-    if w.approve_enabled:
+    if index.for_team().approve_enabled:
         return True
 
-    for p in team.project_set.all():
-        if p.workflow_enabled:
-            w = Workflow.get_for_project(p)
-            if w.approve_enabled:
-                return True
+    for w in index.project_workflows.values():
+        if w.approve_enabled:
+            return True
 
     return False
 
 @register.filter
 def can_perform_task(task, user):
-    return _can_perform_task(user, task)
+    context = get_permission_context(user, task.team_video.team)
+    return context.can_perform_task(task)
 
 @register.filter
 def can_assign_task(task, user):
-    return _can_assign_task(task, user)
+    context = get_permission_context(user, task.team_video.team)
+    return context.can_assign_task(task)
 
 @register.filter
 def can_decline_task(task, user):
@@ -517,7 +517,8 @@ def can_decline_task(task, user):
 
 @register.filter
 def can_delete_task(task, user):
-    return _can_delete_task(task, user)
+    context = get_permission_context(user, task.team_video.team)
+    return context.can_delete_task(task)
 
 
 @register.filter
@@ -538,7 +539,8 @@ def can_create_subtitles_for(user, video):
     if not team_video:
         return True
     else:
-        return can_create_and_edit_subtitles(user, team_video)
+        context = get_permission_context(user, team_video.team)
+        return context.can_create_and_edit_subtitles(team_video)
 @register.filter
 def can_create_translations_for(user, video):
     """Return True if the user can create translations for this video.
@@ -557,7 +559,8 @@ def can_create_translations_for(user, video):
     if not team_video:
         return True
     else:
-        return can_create_and_edit_translations(user, team_video)
+        context = get_permission_context(user, team_video.team)
+        return context.can_create_and_edit_translations(team_video)
 
 @register.filter
 def can_delete_language(user, language):
@@ -8,3 +8,4 @@ from apps.teams.tests.billing import *
 from apps.teams.tests.search import *
 from apps.teams.tests.teamvideos import *
 from apps.teams.tests.videoimport import *
+from apps.teams.tests.export import *
@@ -1,12 +1,18 @@
 from __future__ import absolute_import
+from StringIO import StringIO
 import collections
-from datetime import datetime, timedelta
+import csv
+from datetime import date, datetime, timedelta
 import itertools
 
 from django.test import TestCase
+import mock
 
-from teams.models import BillingRecord, BillingReport, Task
+from teams.models import (BillingRecord, BillingReport, Task,
+                          get_minutes_for_version)
+from subtitles.models import SubtitleVersion
 from subtitles.pipeline import add_subtitles
+from teams.tasks import process_billing_report
 from teams.permissions_const import (ROLE_CONTRIBUTOR, ROLE_MANAGER,
                                      ROLE_ADMIN)
 from utils.factories import *
@@ -185,6 +191,18 @@ class BillingRecordTest(TestCase):
         self.assertEquals(data[video.video_id, 'en']['Minutes'], 2)
         self.assertEquals(data[video.video_id, 'fr']['Minutes'], 2)
 
+class GetMinutesForVersionTest(TestCase):
+    def test_uses_stored_timing(self):
+        version = add_subtitles(VideoFactory(), 'en',
+                                make_subtitle_lines(4, seconds=90))
+        version = SubtitleVersion.objects.get(pk=version.pk)
+        # we should be able to calculate the minutes without parsing the
+        # subtitles
+        with mock.patch.object(SubtitleVersion, 'get_subtitles') as mock_get:
+            self.assertEquals(get_minutes_for_version(version, False), 1.5)
+            self.assertEquals(get_minutes_for_version(version, True), 2)
+        self.assertEquals(mock_get.call_count, 0)
+
 class ProcessReportTest(TestCase):
     def setUp(self):
         self.team = TeamFactory()
@@ -194,19 +212,33 @@ class ProcessReportTest(TestCase):
             type=BillingReport.TYPE_APPROVAL)
         self.report.teams.add(self.team)
 
-    @test_utils.patch_for_test("teams.models.BillingReport.generate_rows")
-    def test_success(self, mock_generate_rows):
-        mock_generate_rows.return_value = [
+    @test_utils.patch_for_test("teams.models.BillingReport.iter_rows")
+    def test_success(self, mock_iter_rows):
+        mock_iter_rows.return_value = iter([
             ('Foo', 'Bar'),
-            ('foo value', 'bar value'),
-        ]
+            ('foo value', u'bar value \u2713'),
+        ])
         self.report.process()
         self.assertNotEquals(self.report.processed, None)
         self.assertNotEquals(self.report.csv_file, None)
+        self.report.csv_file.open()
+        self.assertEquals(self.report.csv_file.read(),
+                          'Foo,Bar\r\nfoo value,bar value \xe2\x9c\x93\r\n')
 
-    @test_utils.patch_for_test("teams.models.BillingReport.generate_rows")
-    def test_error(self, mock_generate_rows):
-        mock_generate_rows.side_effect = ValueError()
+    @test_utils.patch_for_test("teams.models.BillingReport.iter_rows")
+    def test_error(self, mock_iter_rows):
+        mock_iter_rows.side_effect = ValueError()
+        self.report.process()
+        self.assertNotEquals(self.report.processed, None)
+        self.assertEquals(self.report.csv_file, None)
+
+    @test_utils.patch_for_test("teams.models.BillingReport.iter_rows")
+    def test_error_while_streaming(self, mock_iter_rows):
+        # errors can happen after we start writing rows out
+        def iter_rows():
+            yield ('Foo', 'Bar')
+            raise ValueError()
+        mock_iter_rows.return_value = iter_rows()
         self.report.process()
         self.assertNotEquals(self.report.processed, None)
         self.assertEquals(self.report.csv_file, None)
@@ -465,6 +497,52 @@ class ApprovalForUsersTest(ApprovalTestBase):
         self.check_minutes(report_data)
         self.check_pay_rates(report_data)
 
+class ShardedReportTest(ApprovalTestBase):
+    # Test splitting reports into shards with the process_billing_report task
+    def csv_rows(self, rows):
+        output = StringIO()
+        writer = csv.writer(output)
+        for row in rows:
+            writer.writerow([v.encode('utf-8') if isinstance(v, unicode)
+                             else v for v in row])
+        return list(csv.reader(StringIO(output.getvalue())))
+
+    def check_sharded_report(self, report_type):
+        report = BillingReport.objects.create(
+            start_date=self.date_maker.start_date() - timedelta(days=45),
+            end_date=self.date_maker.end_date(),
+            type=report_type)
+        report.teams.add(self.team)
+        correct_rows = self.csv_rows(report.generate_rows())
+
+        process_billing_report(report.pk)
+        report = BillingReport.objects.get(pk=report.pk)
+        self.assertNotEquals(report.processed, None)
+        report.csv_file.open()
+        self.assertEquals(list(csv.reader(report.csv_file)), correct_rows)
+        # shards should be cleaned up after the merge
+        self.assertEquals(report.shards.count(), 0)
+
+    def test_make_shards(self):
+        report = BillingReport.objects.create(
+            start_date=date(2012, 11, 15), end_date=date(2013, 2, 1),
+            type=BillingReport.TYPE_APPROVAL)
+        report.teams.add(self.team)
+        self.assertEquals(
+            [(s.index, s.start_date, s.end_date)
+             for s in report.make_shards()],
+            [
+                (0, date(2012, 11, 15), date(2012, 12, 1)),
+                (1, date(2012, 12, 1), date(2013, 1, 1)),
+                (2, date(2013, 1, 1), date(2013, 2, 1)),
+            ])
+
+    def test_approval(self):
+        self.check_sharded_report(BillingReport.TYPE_APPROVAL)
+
+    def test_approval_for_users(self):
+        self.check_sharded_report(BillingReport.TYPE_APPROVAL_FOR_USERS)
+
 class SimpleApprovalTestCase(TestCase):
     @test_utils.patch_for_test('teams.models.Task.now')
     def setUp(self, mock_now):
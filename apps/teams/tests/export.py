@@ -0,0 +1,90 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+
+from cStringIO import StringIO
+import tarfile
+import zipfile
+
+from django.test import TestCase
+
+from subtitles import downloads, pipeline
+from teams import export
+from utils.factories import *
+
+class TeamSubtitleExportTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory()
+        self.project = ProjectFactory(team=self.team)
+        self.team_videos = [TeamVideoFactory(team=self.team)
+                            for i in xrange(3)]
+        self.team_videos[2].project = self.project
+        self.team_videos[2].save()
+        subs = [
+            (0, 1000, 'Hello',),
+            (1000, 5000, 'world',),
+        ]
+        self.versions = [
+            pipeline.add_subtitles(self.team_videos[0].video, 'en', subs),
+            pipeline.add_subtitles(self.team_videos[0].video, 'fr', subs),
+            pipeline.add_subtitles(self.team_videos[1].video, 'es', subs),
+            pipeline.add_subtitles(self.team_videos[2].video, 'de', subs),
+        ]
+        # private tips shouldn't be exported
+        pipeline.add_subtitles(self.team_videos[1].video, 'es', subs,
+                               visibility='private')
+        # neither should videos from other teams
+        pipeline.add_subtitles(VideoFactory(), 'en', subs)
+
+    def correct_contents(self, versions):
+        return dict((export.archive_filename(v, 'srt'),
+                     downloads.render(v, 'srt'))
+                    for v in versions)
+
+    def test_zip(self):
+        output = StringIO()
+        # use a small chunk size to test iterating over multiple chunks
+        count = export.export_subtitles(output, self.team, 'srt',
+                                        chunk_size=3)
+        self.assertEquals(count, 4)
+        archive = zipfile.ZipFile(StringIO(output.getvalue()))
+        self.assertEquals(
+            dict((name.decode('utf-8'), archive.read(name))
+                 for name in archive.namelist()),
+            self.correct_contents(self.versions))
+
+    def test_tar(self):
+        output = StringIO()
+        export.export_subtitles(output, self.team, 'srt', archive_type='tar',
+                                chunk_size=3)
+        archive = tarfile.open(fileobj=StringIO(output.getvalue()))
+        self.assertEquals(
+            dict((member.name.decode('utf-8'),
+                  archive.extractfile(member).read())
+                 for member in archive.getmembers()),
+            self.correct_contents(self.versions))
+
+    def test_project(self):
+        output = StringIO()
+        count = export.export_subtitles(output, self.team, 'srt',
+                                        project=self.project)
+        self.assertEquals(count, 1)
+        archive = zipfile.ZipFile(StringIO(output.getvalue()))
+        self.assertEquals(archive.namelist(),
+                          self.correct_contents(self.versions[3:]).keys())
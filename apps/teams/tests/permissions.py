@@ -36,8 +36,11 @@ from apps.teams.permissions import (
     can_create_task_translate, can_join_team, can_edit_video, can_approve,
     roles_user_can_invite, can_add_video_somewhere, can_assign_tasks,
     can_create_and_edit_translations, save_role, can_remove_video,
-    can_delete_team, can_delete_video, can_post_edit_subtitles
+    can_delete_team, can_delete_video, can_post_edit_subtitles,
+    can_perform_task, tasks_user_can_perform, PermissionContext,
+    get_permission_context
 )
+from subtitles import pipeline
 
 
 TOTAL_LANGS = len(SUPPORTED_LANGUAGE_CODES)
@@ -1173,3 +1176,120 @@ class TestViews(BaseTestPermission):
         save_role(self.team, member, role, [], [], owner.user)
         self.team.uncache_member(member.user)
         self.assertEquals(self.team.get_member(member.user).role, role)
+
+class TasksUserCanPerformTest(BaseTestPermission):
+    """Check that tasks_user_can_perform() agrees with can_perform_task()."""
+
+    def setUp(self):
+        BaseTestPermission.setUp(self)
+        self.update_team(workflow_enabled=True)
+        for team_video in (self.project_video, self.nonproject_video):
+            for task_type in Task.TYPE_IDS.values():
+                for language in ('en', 'fr', ''):
+                    Task.objects.create(team=self.team,
+                                        team_video=team_video,
+                                        type=task_type, language=language)
+        # the user wrote the latest english version for one of the videos
+        pipeline.add_subtitles(self.nonproject_video.video, 'en', None,
+                               author=self.user)
+
+    def check_tasks(self, user):
+        tasks = Task.objects.filter(team=self.team)
+        correct_ids = set(task.id for task in tasks.select_related(
+            'team_video', 'team_video__team', 'team_video__project',
+            'team_video__video')
+            if can_perform_task(user, task))
+        self.assertEquals(
+            set(t.id for t in tasks_user_can_perform(user, self.team, tasks)),
+            correct_ids)
+
+    def check_all_roles(self):
+        self.check_tasks(self.outsider)
+        for role in (ROLE_CONTRIBUTOR, ROLE_MANAGER, ROLE_ADMIN, ROLE_OWNER):
+            with self.role(role):
+                self.check_tasks(self.user)
+            with self.role(role, project=self.test_project):
+                self.check_tasks(self.user)
+            with self.role(role, lang='en'):
+                self.check_tasks(self.user)
+
+    def test_policies(self):
+        for policy in (10, 20, 30, 40):
+            self.update_team(subtitle_policy=policy, translate_policy=policy)
+            self.check_all_roles()
+
+    def test_workflows(self):
+        for review, approve in ((0, 0), (10, 10), (20, 20), (30, 20)):
+            self.update_workflow(review_allowed=review,
+                                 approve_allowed=approve)
+            self.check_all_roles()
+
+    def test_project_workflow(self):
+        self.update_workflow(review_allowed=30, approve_allowed=20)
+        self.test_project.workflow_enabled = True
+        self.test_project.save()
+        Workflow.objects.create(team=self.team, project=self.test_project,
+                                review_allowed=10, approve_allowed=10)
+        self.check_all_roles()
+
+    def test_video_workflow(self):
+        self.update_workflow(review_allowed=30, approve_allowed=20)
+        Workflow.objects.create(team=self.team,
+                                team_video=self.nonproject_video,
+                                review_allowed=10, approve_allowed=0)
+        self.check_all_roles()
+
+    def test_assigned_tasks(self):
+        self.update_workflow(review_allowed=30, approve_allowed=20)
+        Task.objects.filter(team_video=self.project_video).update(
+            assignee=self.user)
+        self.check_all_roles()
+
+class PermissionContextTest(BaseTestPermission):
+    def setUp(self):
+        BaseTestPermission.setUp(self)
+        self.update_team(workflow_enabled=True)
+        self.update_workflow(review_allowed=10, approve_allowed=10)
+        self.tasks = []
+        for team_video in (self.project_video, self.nonproject_video):
+            for task_type in Task.TYPE_IDS.values():
+                self.tasks.append(Task.objects.create(
+                    team=self.team, team_video=team_video, type=task_type,
+                    language='en'))
+
+    def fetch_tasks(self):
+        return list(Task.objects.filter(team=self.team).select_related(
+            'team_video', 'team_video__team', 'team_video__project',
+            'team_video__video'))
+
+    def test_matches_functions(self):
+        for role in (ROLE_CONTRIBUTOR, ROLE_MANAGER, ROLE_OWNER):
+            with self.role(role, project=self.test_project):
+                context = PermissionContext(self.user, self.team)
+                for task in self.fetch_tasks():
+                    self.assertEquals(context.can_perform_task(task),
+                                      can_perform_task(self.user, task))
+
+    def test_no_queries_after_first_check(self):
+        with self.role(ROLE_MANAGER):
+            context = PermissionContext(self.user, self.team)
+            context.workflow_index
+            tasks = self.fetch_tasks()
+            for task in tasks:
+                # can_review() still needs to look up the latest version.
+                # Pretend we did that already.
+                task.team_video._cached_version_for_review = None
+            with self.assertNumQueries(0):
+                for task in tasks:
+                    context.can_perform_task(task)
+
+    def test_get_permission_context(self):
+        with self.role(ROLE_MANAGER):
+            context = get_permission_context(self.user, self.team)
+            self.assertEquals(context.role, ROLE_MANAGER)
+            self.assert_(get_permission_context(self.user, self.team)
+                         is context)
+        # remove_role() + uncache_member() should drop the context
+        self.assertEquals(
+            get_permission_context(self.user, self.team).role,
+            ROLE_OUTSIDER)
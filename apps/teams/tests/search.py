@@ -25,8 +25,10 @@ from haystack import site
 import mock
 
 from subtitles import pipeline
-from teams.models import TeamVideo
+from teams import tasks
+from teams.models import Task, TeamVideo
 from utils.factories import *
+from videos.models import Video
 
 class TeamVideoSearchIndexTestCase(TestCase):
     def setUp(self):
@@ -63,3 +65,105 @@ class TeamVideoSearchIndexTestCase(TestCase):
         self.reindex_team_videos()
         self.check_search_results(language='fr', correct=[tv3, tv4])
         self.check_search_results(exclude_language='fr', correct=[tv1, tv2])
+
+class TeamVideoBatchIndexTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory()
+        self.team_videos = [TeamVideoFactory(team=self.team)
+                            for i in xrange(3)]
+        subs = [
+            (0, 1000, 'Hello',),
+            (1000, 5000, 'world',),
+        ]
+        pipeline.add_subtitles(self.team_videos[0].video, 'en', subs,
+                               complete=True)
+        pipeline.add_subtitles(self.team_videos[0].video, 'fr', None)
+        pipeline.add_subtitles(self.team_videos[1].video, 'es', subs)
+        self.index = site.get_index(TeamVideo)
+
+    def fetch_team_videos(self):
+        return list(TeamVideo.objects
+                    .filter(pk__in=[tv.pk for tv in self.team_videos])
+                    .select_related('team', 'project', 'video')
+                    .order_by('pk'))
+
+    def check_prefetched_fields(self, team_video_pk, data):
+        # Calculate the fields that prefetch() handles using the per-object
+        # queries, with a fresh TeamVideo so that nothing is prefetched.
+        team_video = TeamVideo.objects.get(pk=team_video_pk)
+        video = team_video.video
+        completed_sls = list(video.completed_subtitle_languages())
+        self.assertEquals(data['video_url'], video.get_video_url())
+        self.assertEquals(data['num_total_langs'],
+                          video.newsubtitlelanguage_set
+                          .having_nonempty_tip().count())
+        self.assertEquals(data['num_completed_langs'], len(completed_sls))
+        self.assertEquals(data['video_completed_langs'],
+                          [sl.language_code for sl in completed_sls])
+        self.assertEquals(data['video_completed_lang_urls'],
+                          [sl.get_absolute_url() for sl in completed_sls])
+        self.assertEquals(data['task_count'],
+                          Task.objects.incomplete()
+                          .filter(team_video=team_video).count())
+
+    def test_prefetched_data_matches(self):
+        TaskFactory(team=self.team, team_video=self.team_videos[1],
+                    language='fr')
+        team_videos = self.fetch_team_videos()
+        self.index.prefetch(team_videos)
+        prepared = [dict(self.index.prepare(tv)) for tv in team_videos]
+        for tv, data in zip(team_videos, prepared):
+            self.check_prefetched_fields(tv.pk, data)
+        # check the fixture data too, in case both ways of calculating the
+        # fields are wrong
+        self.assertEquals([data['num_total_langs'] for data in prepared],
+                          [1, 1, 0])
+        self.assertEquals([data['video_completed_langs'] for data in prepared],
+                          [['en'], [], []])
+        self.assertEquals([data['task_count'] for data in prepared],
+                          [0, 1, 0])
+
+    def test_update_batch_uses_one_request(self):
+        with mock.patch.object(self.index.backend, 'update') as mock_update:
+            tasks.update_team_video_index([tv.pk for tv in self.team_videos])
+        self.assertEquals(mock_update.call_count, 1)
+        self.assertEquals(set(tv.pk for tv in mock_update.call_args[0][1]),
+                          set(tv.pk for tv in self.team_videos))
+
+    def test_update_videos_in_bulk(self):
+        video_index = site.get_index(Video)
+        video_ids = [tv.video_id for tv in self.team_videos]
+        with mock.patch.object(video_index.backend, 'update') as \
+                mock_video_update:
+            with mock.patch.object(self.index.backend, 'update') as \
+                    mock_team_video_update:
+                tasks.update_videos_in_bulk(video_ids)
+        self.assertEquals(mock_video_update.call_count, 1)
+        self.assertEquals(set(v.pk for v in mock_video_update.call_args[0][1]),
+                          set(video_ids))
+        self.assertEquals(mock_team_video_update.call_count, 1)
+        self.assertEquals(
+            set(tv.pk for tv in mock_team_video_update.call_args[0][1]),
+            set(tv.pk for tv in self.team_videos))
+
+    @mock.patch('teams.tasks.update_one_team_video.apply_async')
+    def test_queued_updates_are_coalesced(self, mock_apply_async):
+        team_video = self.team_videos[0]
+        tasks.queue_team_video_index_update(team_video.pk)
+        tasks.queue_team_video_index_update(team_video.pk)
+        self.assertEquals(mock_apply_async.call_count, 1)
+        self.assertEquals(mock_apply_async.call_args[1]['args'],
+                          (team_video.pk,))
+        # once the update runs, new requests should queue another one
+        tasks.update_team_video_index([team_video.pk])
+        tasks.queue_team_video_index_update(team_video.pk)
+        self.assertEquals(mock_apply_async.call_count, 2)
+
+    @mock.patch('teams.tasks.update_team_video_index.apply_async')
+    def test_queued_batch_updates(self, mock_apply_async):
+        team_video_ids = [tv.pk for tv in self.team_videos]
+        tasks.queue_team_video_index_updates(team_video_ids)
+        tasks.queue_team_video_index_updates(team_video_ids)
+        self.assertEquals(mock_apply_async.call_count, 1)
+        self.assertEquals(mock_apply_async.call_args[1]['args'],
+                          (team_video_ids,))
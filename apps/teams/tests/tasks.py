@@ -8,7 +8,10 @@ import mock
 
 from auth.models import CustomUser as User
 from apps.teams.forms import TaskCreateForm, TaskAssignForm
-from apps.teams.models import Task, Team, TeamVideo, TeamMember
+from apps.teams.models import (Task, Team, TeamVideo, TeamMember,
+                               TeamLanguagePreference,
+                               bulk_create_translation_tasks)
+from subtitles import pipeline
 from apps.videos.models import Video
 from utils.testeditor import TestEditor
 from utils.factories import *
@@ -56,6 +59,61 @@ class AutoCreateTest(TestCase):
         transcribe_task = tasks.filter(type=10, language='en')
         self.assertEqual(transcribe_task.count(), 1)
 
+class BulkCreateTranslationTasksTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory(workflow_enabled=True)
+        WorkflowFactory(team=self.team)
+        for language_code in ('de', 'fr'):
+            TeamLanguagePreference.objects.create(team=self.team,
+                                                  language_code=language_code,
+                                                  preferred=True)
+        self.team_videos = [
+            TeamVideoFactory(team=self.team, added_by=UserFactory(),
+                             video=VideoFactory(primary_audio_language_code='en'))
+            for i in xrange(3)
+        ]
+
+    def add_subtitles(self, team_video, language_code, complete):
+        lines = [(i * 1000, i * 1000 + 900, 'line %s' % i) for i in xrange(4)]
+        pipeline.add_subtitles(team_video.video, language_code, lines,
+                               complete=complete)
+
+    def task_languages(self, team_video):
+        return set(team_video.task_set.not_deleted()
+                   .filter(type=TYPE_TRANSLATE)
+                   .values_list('language', flat=True))
+
+    @mock.patch('teams.tasks.update_team_video_index.apply_async')
+    def test_bulk_create(self, mock_apply_async):
+        tv1, tv2, tv3 = self.team_videos
+        # complete languages shouldn't get tasks
+        self.add_subtitles(tv1, 'de', complete=True)
+        # neither should languages that already have a task
+        TaskFactory(team=self.team, team_video=tv2, language='fr',
+                    type=Task.TYPE_IDS['Review'])
+        mock_apply_async.reset_mock()
+
+        bulk_create_translation_tasks(self.team_videos)
+        self.assertEquals(self.task_languages(tv1), set(['fr']))
+        self.assertEquals(self.task_languages(tv2), set(['de']))
+        self.assertEquals(self.task_languages(tv3), set(['de', 'fr']))
+        # all the team videos should be reindexed with a single task
+        self.assertEquals(mock_apply_async.call_count, 1)
+        self.assertEquals(sorted(mock_apply_async.call_args[1]['args'][0]),
+                          sorted(tv.pk for tv in self.team_videos))
+
+    def test_incomplete_languages_get_tasks(self):
+        tv = self.team_videos[0]
+        self.add_subtitles(tv, 'de', complete=False)
+        bulk_create_translation_tasks([tv])
+        self.assertEquals(self.task_languages(tv), set(['de', 'fr']))
+
+    def test_no_duplicates(self):
+        bulk_create_translation_tasks(self.team_videos)
+        bulk_create_translation_tasks(self.team_videos)
+        for tv in self.team_videos:
+            self.assertEquals(tv.task_set.not_deleted().count(), 2)
+
 class TranslateTranscribeTestBase(TestCase):
     """Base class for TranscriptionTaskTest and TranslationTaskTest."""
     def setUp(self):
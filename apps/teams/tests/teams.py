@@ -25,7 +25,7 @@ from teams import tasks
 from teams.models import (
     Team, Invite, TeamVideo, Application, TeamMember,
     TeamLanguagePreference, Partner, TeamNotificationSetting,
-    InviteExpiredException
+    InviteExpiredException, Workflow
 )
 from teams.permissions import add_role
 from teams.rpc import TeamsApiClass
@@ -172,6 +172,66 @@ class NeedsNewVideoNotificationTest(TestCase):
     def test_daily(self):
         self.check_needs_new_video_notification(Team.NOTIFY_DAILY, self.t3)
 
+class WorkflowIndexTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory(workflow_enabled=True)
+        self.project = ProjectFactory(team=self.team, workflow_enabled=True)
+        self.project_video = TeamVideoFactory(team=self.team,
+                                              project=self.project)
+        self.team_video = TeamVideoFactory(team=self.team)
+        self.team_workflow = WorkflowFactory(team=self.team)
+        self.project_workflow = WorkflowFactory(team=self.team,
+                                                project=self.project)
+
+    def get_for_team_video(self, team_video):
+        if hasattr(team_video, '_cached_workflow'):
+            del team_video._cached_workflow
+        return Workflow.get_for_team_video(team_video)
+
+    def test_lookup(self):
+        self.assertEquals(self.get_for_team_video(self.team_video),
+                          self.team_workflow)
+        self.assertEquals(self.get_for_team_video(self.project_video),
+                          self.project_workflow)
+        self.assertEquals(Workflow.get_for_project(self.project),
+                          self.project_workflow)
+        self.assertEquals(self.team.get_workflow(), self.team_workflow)
+        video_workflow = WorkflowFactory(team=self.team,
+                                         team_video=self.project_video)
+        self.assertEquals(self.get_for_team_video(self.project_video),
+                          video_workflow)
+
+    def test_cached(self):
+        self.get_for_team_video(self.team_video)
+        with self.assertNumQueries(0):
+            self.get_for_team_video(self.team_video)
+            self.get_for_team_video(self.project_video)
+            self.team.get_workflow()
+
+    def test_project_workflow_disabled(self):
+        self.project.workflow_enabled = False
+        self.project.save()
+        self.assertEquals(self.get_for_team_video(self.project_video),
+                          self.team_workflow)
+
+    def test_team_workflow_disabled(self):
+        self.team.workflow_enabled = False
+        self.assertEquals(self.team.get_workflow().pk, None)
+        self.assertEquals(self.get_for_team_video(self.team_video).pk, None)
+
+    def test_invalidate_on_save(self):
+        self.get_for_team_video(self.team_video)
+        self.team_workflow.review_allowed = 10
+        self.team_workflow.save()
+        self.assertEquals(
+            self.get_for_team_video(self.team_video).review_allowed, 10)
+
+    def test_invalidate_on_delete(self):
+        self.get_for_team_video(self.project_video)
+        self.project_workflow.delete()
+        self.assertEquals(self.get_for_team_video(self.project_video),
+                          self.team_workflow)
+
 class TeamVideoTest(TestCase):
 
     def setUp(self):
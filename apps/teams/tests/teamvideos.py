@@ -23,7 +23,9 @@ from datetime import datetime
 from django.test import TestCase
 import mock
 
-from teams.models import Project, TeamVideoMigration
+from subtitles import pipeline
+from teams import bulk_actions
+from teams.models import Project, Task, TeamVideo, TeamVideoMigration
 from utils import test_utils
 from utils.factories import *
 
@@ -63,3 +65,75 @@ class TeamMoveTest(TestCase):
         self.check_migration(migrations[2], datetime(2013, 01, 03),
                              self.team, self.team2, self.project2)
 
+
+class BulkMoveTest(TestCase):
+    def setUp(self):
+        TestCase.setUp(self)
+        self.team = TeamFactory()
+        self.project = Project.objects.create(team=self.team, name='project1')
+        self.team2 = TeamFactory(is_visible=False)
+        self.project2 = Project.objects.create(team=self.team2,
+                                               name='project2')
+        self.team_videos = [TeamVideoFactory(team=self.team)
+                            for i in xrange(3)]
+        patcher = mock.patch('teams.bulk_actions.update_videos_in_bulk')
+        self.mock_update_videos = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch_team_videos(self):
+        return list(TeamVideo.objects
+                    .filter(pk__in=[tv.pk for tv in self.team_videos])
+                    .select_related('team', 'project', 'video')
+                    .order_by('pk'))
+
+    def check_update_videos_call(self, team_videos):
+        self.assertEquals(self.mock_update_videos.delay.call_count, 1)
+        video_ids = self.mock_update_videos.delay.call_args[0][0]
+        self.assertEquals(sorted(video_ids),
+                          sorted(tv.video_id for tv in team_videos))
+
+    def test_move_to_other_team(self):
+        team_video = self.team_videos[0]
+        task = TaskFactory(team=self.team, team_video=team_video,
+                           language='en')
+        pipeline.add_subtitles(team_video.video, 'en', None,
+                               visibility='private')
+        bulk_actions.move_videos(self.fetch_team_videos(), self.team2,
+                                 self.project2)
+
+        for tv in self.fetch_team_videos():
+            self.assertEquals(tv.team, self.team2)
+            self.assertEquals(tv.project, self.project2)
+            self.assertEquals(tv.video.is_public, False)
+        self.assertEquals(Task.objects.get(pk=task.pk).deleted, True)
+        language = team_video.video.subtitle_language('en')
+        self.assertEquals(language.get_tip(public=True).version_number, 1)
+        self.assertEquals(TeamVideoMigration.objects.filter(
+            from_team=self.team, to_team=self.team2,
+            to_project=self.project2).count(), 3)
+        self.check_update_videos_call(self.team_videos)
+        # the language's video needs its metadata updated, since it has
+        # newly public subtitles
+        self.assertEquals(self.mock_update_videos.delay.call_args[0][1],
+                          [team_video.video_id])
+
+    def test_move_within_team(self):
+        bulk_actions.move_videos(self.fetch_team_videos(), self.team,
+                                 self.project)
+        for tv in self.fetch_team_videos():
+            self.assertEquals(tv.team, self.team)
+            self.assertEquals(tv.project, self.project)
+        self.assertEquals(TeamVideoMigration.objects.count(), 0)
+        self.check_update_videos_call(self.team_videos)
+
+    def test_skip_videos_already_in_place(self):
+        bulk_actions.move_videos(self.fetch_team_videos(), self.team)
+        self.assertEquals(self.mock_update_videos.delay.call_count, 0)
+
+    def test_update_video_public_field(self):
+        self.team.is_visible = False
+        self.team.save()
+        bulk_actions.update_video_public_field(self.team)
+        for tv in self.fetch_team_videos():
+            self.assertEquals(tv.video.is_public, False)
+        self.check_update_videos_call(self.team_videos)
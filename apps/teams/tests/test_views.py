@@ -15,13 +15,16 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
+from datetime import datetime
 from os import path
 
 from django.conf import settings
 from django.core.urlresolvers import reverse
 from django.test import TestCase
+from django.test.client import RequestFactory
 
-from apps.teams.models import Team, TeamMember, TeamVideo, Project
+from apps.teams.models import Team, TeamMember, TeamVideo, Project, Task
+from apps.teams.views import _task_video_page
 from apps.videos.models import Video, VideoUrl
 from apps.auth.models import CustomUser as User
 from utils.factories import *
@@ -337,3 +340,38 @@ class ViewsTests(TestCase):
             user.save()
         return TeamMember.objects.create(user=user, role=role, team=team)
 
+class TaskVideoPageTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory()
+        self.tv1 = TeamVideoFactory(team=self.team)
+        self.tv2 = TeamVideoFactory(team=self.team)
+
+    def make_task(self, team_video, priority, created):
+        task = TaskFactory(team=self.team, team_video=team_video,
+                           priority=priority)
+        Task.objects.filter(pk=task.pk).update(created=created)
+
+    def get_page(self, sort, count=10):
+        request = RequestFactory().get('/', {'sort': sort})
+        return _task_video_page(request, Task.objects.filter(team=self.team),
+                                count)
+
+    def test_order_uses_highest_priority_tasks(self):
+        # tv1 has the newest task, but it's low priority.  Videos should be
+        # sorted using only their highest priority tasks.
+        self.make_task(self.tv1, 0, datetime(2013, 1, 5))
+        self.make_task(self.tv1, 10, datetime(2013, 1, 1))
+        self.make_task(self.tv2, 10, datetime(2013, 1, 3))
+        self.assertEquals(self.get_page('-created'),
+                          [self.tv2.pk, self.tv1.pk])
+        self.assertEquals(self.get_page('created'),
+                          [self.tv1.pk, self.tv2.pk])
+        self.assertEquals(self.get_page('-created', count=1), [self.tv2.pk])
+
+    def test_priority_first(self):
+        self.make_task(self.tv1, 0, datetime(2013, 1, 5))
+        self.make_task(self.tv2, 10, datetime(2013, 1, 1))
+        self.assertEquals(self.get_page('-created'),
+                          [self.tv2.pk, self.tv1.pk])
+        self.assertEquals(self.get_page('created'),
+                          [self.tv2.pk, self.tv1.pk])
@@ -28,7 +28,7 @@ from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.views import redirect_to_login
 from django.contrib.sites.models import Site
 from django.core.urlresolvers import reverse
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Max, Min
 from django.http import (
     Http404, HttpResponseForbidden, HttpResponseRedirect, HttpResponse,
     HttpResponseBadRequest, HttpResponseServerError
@@ -62,10 +62,11 @@ from teams.models import (
 from teams.permissions import (
     can_add_video, can_assign_role, can_assign_tasks, can_create_task_subtitle,
     can_create_task_translate, can_view_tasks_tab, can_invite,
-    roles_user_can_assign, can_join_team, can_edit_video, can_delete_tasks,
+    roles_user_can_assign, can_join_team, can_edit_video,
     can_perform_task, can_rename_team, can_change_team_settings,
     can_perform_task_for, can_delete_team, can_delete_video, can_remove_video,
-    can_delete_language, can_move_videos, can_sort_by_primary_language
+    can_delete_language, can_move_videos, can_sort_by_primary_language,
+    tasks_user_can_perform, get_permission_context
 )
 from teams.signals import api_teamvideo_new
 from teams.tasks import (
@@ -83,18 +84,19 @@ from utils.text import fmt
 from utils.translation import (
     get_language_choices, get_language_choices_as_dicts, languages_with_labels, get_user_languages_from_request
 )
-from utils.chunkediter import chunkediter
 from videos.types import UPDATE_VERSION_ACTION
 from videos import metadata_manager
 from videos.tasks import (
     upload_subtitles_to_original_service, delete_captions_in_original_service,
     delete_captions_in_original_service_by_code
 )
-from videos.models import Action, VideoUrl, Video, VideoFeed
+from videos.models import (Action, VideoUrl, Video, VideoFeed,
+                           bulk_prefetch_languages)
 from subtitles.models import SubtitleLanguage, SubtitleVersion
 from widget.rpc import add_general_settings
 from widget.views import base_widget_params
 
+from teams import bulk_actions
 from teams.bulk_actions import complete_approve_tasks
 
 logger = logging.getLogger("teams.views")
@@ -596,16 +598,16 @@ def move_videos(request, slug, project_slug=None, languages=None):
                 except MultipleObjectsReturned:
                     return  HttpResponseServerError("Internal Error")
             selected_videos = request.POST.getlist('selected_videos[]')
-            for video_id in selected_videos:
-                try:
-                    team_video = TeamVideo.objects.get(id=video_id)
-                    if team_video.team not in managed_teams:
-                        return  HttpResponseForbidden("Not allowed")
-                    team_video.move_to(target_team, project=target_project)
-                except Entry.DoesNotExist:
-                    return  HttpResponseBadRequest("Illegal Request")
-                except MultipleObjectsReturned:
-                    return  HttpResponseServerError("Internal Error")
+            team_videos = list(TeamVideo.objects
+                               .filter(id__in=selected_videos)
+                               .select_related('team', 'project', 'video'))
+            if len(team_videos) != len(set(selected_videos)):
+                return  HttpResponseBadRequest("Illegal Request")
+            for team_video in team_videos:
+                if team_video.team not in managed_teams:
+                    return  HttpResponseForbidden("Not allowed")
+            bulk_actions.move_videos(team_videos, target_team,
+                                     project=target_project)
     else:
         form = MoveVideosForm(request.user)
      
@@ -1455,6 +1457,51 @@ def _order_tasks(request, tasks):
     tasks = tasks.order_by(*order_clause)
     return tasks
 
+def _task_video_page(request, tasks, count):
+    """Get the team videos for a page of tasks.
+
+    Videos are ordered by their first task in the order that _order_tasks()
+    uses.  That means by their highest task priority, then by the sort key of
+    their tasks with that priority.  The grouping happens in the database, so
+    we don't need to fetch every task to find the videos for the page.
+
+    :returns: list of TeamVideo ids
+    """
+    sort = request.GET.get('sort', '-created')
+    annotations = {}
+    order_clause = ['-priority']
+    if sort == 'created':
+        annotations['sort_key'] = Min('created')
+        order_clause.append('sort_key')
+    elif sort == '-created':
+        annotations['sort_key'] = Max('created')
+        order_clause.append('-sort_key')
+    elif sort == 'expires':
+        annotations['sort_key'] = Min('expiration_date')
+        order_clause.append('sort_key')
+    elif sort == '-expires':
+        annotations['sort_key'] = Max('expiration_date')
+        order_clause.append('-sort_key')
+    order_clause.append('team_video')
+    # Group by (team video, priority).  A video's first row is for its
+    # highest priority, with the sort key computed over those tasks only.
+    qs = tasks.order_by().values('team_video', 'priority')
+    if annotations:
+        qs = qs.annotate(**annotations)
+    else:
+        qs = qs.distinct()
+    qs = qs.order_by(*order_clause)
+    team_video_ids = []
+    seen = set()
+    for row in qs.iterator():
+        if row['team_video'] in seen:
+            continue
+        seen.add(row['team_video'])
+        team_video_ids.append(row['team_video'])
+        if len(team_video_ids) >= count:
+            break
+    return team_video_ids
+
 def _get_task_filters(request):
     return { 'language': request.GET.get('lang'),
              'type': request.GET.get('type'),
@@ -1509,28 +1556,24 @@ def dashboard(request, slug):
             filters['language'] = user_languages[0]
 
         tasks = _order_tasks(request,
-                             _tasks_list(request, team,
-                                         project, filters,
-                                         user))
-
-        tasks = tasks.select_related('team_video', 'team_video__team',
-                                     'team_video__project', 'team_video__video')
+                             tasks_user_can_perform(
+                                 user, team, _tasks_list(request, team,
+                                                         project, filters,
+                                                         user)))
 
-        for task in chunkediter(tasks, 100):
-            if not can_perform_task(user, task):
-                continue
+        team_video_ids = _task_video_page(request, tasks, VIDEOS_ON_PAGE)
+        tasks = (tasks.filter(team_video__in=team_video_ids)
+                 .select_related('team_video', 'team_video__team',
+                                 'team_video__project', 'team_video__video'))
 
-            task_vid = task.team_video
-
-            if not task_vid in videos:
-                task_vid.tasks = []
-                videos.append(task_vid)
-
-            vid_index = videos.index(task_vid)
-            videos[vid_index].tasks.append(task)
-
-            if len(videos) >= VIDEOS_ON_PAGE:
-                break
+        videos_by_id = {}
+        for task in tasks:
+            if task.team_video_id not in videos_by_id:
+                task.team_video.tasks = []
+                videos_by_id[task.team_video_id] = task.team_video
+            videos_by_id[task.team_video_id].tasks.append(task)
+        videos = [videos_by_id[tv_id] for tv_id in team_video_ids
+                  if tv_id in videos_by_id]
 
         for video in videos:
             Task.add_cached_video_urls(video.tasks)
@@ -1549,12 +1592,15 @@ def dashboard(request, slug):
                 videos.append(tv.teamvideo)
         else:
             lang_list = [l.language for l in user_languages]
-
-            for video in team_videos.all():
-                subtitled_languages = (video.newsubtitlelanguage_set
-                                                 .filter(language_code__in=lang_list)
-                                                 .filter(subtitles_complete=True)
-                                                 .values_list("language_code", flat=True))
+            team_videos = list(team_videos)
+            bulk_prefetch_languages(team_videos, languages=lang_list)
+
+            for video in team_videos:
+                subtitled_languages = []
+                for language_code in lang_list:
+                    lang = video.subtitle_language(language_code)
+                    if lang is not None and lang.subtitles_complete:
+                        subtitled_languages.append(language_code)
                 if len(subtitled_languages) != len(user_languages):
                     tv = video.teamvideo
                     tv.languages = [l for l in user_languages if l.language not in subtitled_languages]
@@ -1670,11 +1716,16 @@ def team_tasks(request, slug, project_slug=None):
 
     Task.add_cached_video_urls(tasks)
 
+    # The template checks permissions for each task.  This context gets shared
+    # with the template filters, so we only load the user's roles and the
+    # team's workflows once.
+    permission_context = get_permission_context(request.user, team)
+
     context = {
         'team': team,
         'project': project, # TODO: Review
-        'user_can_delete_tasks': can_delete_tasks(team, request.user),
-        'user_can_assign_tasks': can_assign_tasks(team, request.user),
+        'user_can_delete_tasks': permission_context.can_delete_tasks(),
+        'user_can_assign_tasks': permission_context.can_assign_tasks(),
         'assign_form': TaskAssignForm(team, member),
         'languages': languages,
         'tasks': tasks,
@@ -16,37 +16,89 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
-"""videos.feed_parser.import -- Import videos from a feed."""
+"""videos.feed_parser.import -- Import videos from a feed.
 
-from .parser import FeedParser
+Most of the time spent importing goes to network requests: fetching the feed
+pages and fetching the metadata for each entry when we create its VideoType.
+VideoImporter runs these in a thread pool.  Entries for a page are parsed
+concurrently and, for youtube feeds, the next page is fetched while we create
+the videos for the current one.  Videos are still created in the importing
+thread, in feed order.
+"""
+
+from multiprocessing.pool import ThreadPool
+
+from .parser import FeedParser, entry_id
+
+# Number of threads to fetch feed pages and entry metadata with
+IMPORT_WORKERS = 8
 
 class VideoImporter(object):
     """Import videos from a feed URL."""
-    def __init__(self, url, user):
+    def __init__(self, url, user, workers=IMPORT_WORKERS, etag=None,
+                 modified=None, last_entry_id=None):
         """Create a VideoImporter
 
+        etag, modified, and last_entry_id should be the values from the last
+        import.  After import_videos() runs, they are updated to the values
+        to use for the next one.
+
         :param url: feed url
         :param user: User that creates videos for
+        :param workers: number of threads to fetch data with
+        :param etag: ETag header from the last import
+        :param modified: Last-Modified header from the last import
+        :param last_entry_id: id of the newest entry from the last import
         """
         self.url = url
         self.user = user
+        self.workers = workers
+        self.etag = etag
+        self.modified = modified
+        self.last_entry_id = last_entry_id
         self.checked_entries = 0
         self.last_link = ''
 
     def import_videos(self, import_next=False):
         self._created_videos = []
-        feed_parser = FeedParser(self.url)
+        # Note: the pool threads shouldn't touch the database.  Django opens a
+        # connection per thread and nothing would close them.
+        self._pool = ThreadPool(self.workers)
+        try:
+            feed_parser = FeedParser(self.url, etag=self.etag,
+                                     modified=self.modified)
+            if not feed_parser.not_modified():
+                self._import_feed(feed_parser, import_next)
+        finally:
+            self._pool.terminate()
+            self._pool.join()
+            del self._pool
+        rv = self._created_videos
+        del self._created_videos
+        return rv
+
+    def _import_feed(self, feed_parser, import_next):
+        self._update_cache_headers(feed_parser)
+        # entries from this one on were checked by the last import
+        self._stop_at_entry = self.last_entry_id
         # the link at the top of the feed should be the latest link
         try:
             self.last_link = feed_parser.feed.entries[0]['link']
         except (IndexError, KeyError):
             pass
-        self._create_videos(feed_parser)
+        if feed_parser.feed.entries:
+            self.last_entry_id = entry_id(feed_parser.feed.entries[0])
         if import_next and 'youtube' in self.url:
             self._import_extra_links_from_youtube(feed_parser)
-        rv = self._created_videos
-        del self._created_videos
-        return rv
+        else:
+            self._create_videos(feed_parser)
+
+    def _update_cache_headers(self, feed_parser):
+        etag = feed_parser.feed.get('etag')
+        modified = feed_parser.feed.get('modified')
+        # older feedparser versions return modified as a time tuple
+        self.etag = etag if isinstance(etag, basestring) else None
+        self.modified = modified if isinstance(modified, basestring) else None
 
     def _next_urls(self, feed_parser):
         return [
@@ -54,20 +106,26 @@ class VideoImporter(object):
             if link.get('rel') == 'next'
         ]
 
-    def _import_extra_links_from_youtube(self, main_feed_parser):
-        next_urls = self._next_urls(main_feed_parser)
-
-        while next_urls:
-            url = next_urls[0]['href']
-            feed_parser = FeedParser(url)
-            last_created_video_count = len(self._created_videos)
-            self._create_videos(feed_parser)
+    def _import_extra_links_from_youtube(self, feed_parser):
+        while feed_parser is not None:
             next_urls = self._next_urls(feed_parser)
+            if next_urls:
+                # fetch the next page while we import this one
+                next_page = self._pool.apply_async(FeedParser,
+                                                   (next_urls[0]['href'],))
+            else:
+                next_page = None
+            self._create_videos(feed_parser)
+            if next_page is not None:
+                feed_parser = next_page.get()
+            else:
+                feed_parser = None
 
     def _create_videos(self, feed_parser):
         from videos.models import VideoUrl
 
-        items = list(feed_parser.items(ignore_error=True))
+        items = list(feed_parser.items(ignore_error=True, pool=self._pool,
+                                       stop_at_entry=self._stop_at_entry))
 
         urls = [
             vt.convert_to_video_url()
@@ -35,27 +35,53 @@ class VideoTypeParseError(FeedParserError, VideoTypeError):
     """
     pass
 
+def entry_id(entry):
+    """Get a string that identifies a feed entry."""
+    return entry.get('id') or entry.get('link') or ''
+
 class FeedParser(object):
     """
     This class allow get videos fron feed entries.
     See videos.tests.TestFeedParser for details.
     """
 
-    def __init__(self, feed_url):
+    def __init__(self, feed_url, etag=None, modified=None):
+        """Fetch and parse a feed
+
+        Pass in etag and/or modified from a previous fetch to make a
+        conditional request.  If the feed hasn't changed, not_modified() will
+        return True and the feed will have no entries.
+        """
         self.feed_url = feed_url
-        self.feed = feedparser.parse(feed_url)
+        self.feed = feedparser.parse(feed_url, etag=etag or None,
+                                     modified=modified or None)
         self.parser = None
 
-    def items(self, reverse=False, until=False, since=False, ignore_error=False):
+    def not_modified(self):
+        return self.feed.get('status') == 304
+
+    def items(self, reverse=False, until=False, since=False, ignore_error=False,
+              pool=None, stop_at_entry=None):
         """
         Iterator witch parse every entry and return VideoType instance if possible and
         additional info. Iterate entries from the most old to the newest
+
+        Creating the VideoType instances often means fetching data from the
+        video site.  If pool is given, entries are parsed concurrently using
+        pool.imap(), but they are still returned in order.
+
+        If stop_at_entry is given, only the entries newer than the entry with
+        that id get parsed (see entry_id()).
         """
 
-        if reverse:
-            entries = self.feed['entries']
-        else:
-            entries = self.feed['entries'][::-1]
+        entries = self.feed['entries']
+        if stop_at_entry:
+            for i, entry in enumerate(entries):
+                if entry_id(entry) == stop_at_entry:
+                    entries = entries[:i]
+                    break
+        if not reverse:
+            entries = entries[::-1]
 
         if since or until:
             links = [entry.link for entry in entries]
@@ -65,36 +91,47 @@ class FeedParser(object):
 
             entries = entries[since_index+1:last_index]
 
-        for entry in entries:
-            vt, info, entry = None, {}, entry
+        if pool is not None:
+            parse_entry = lambda entry: self._parse_entry(entry, ignore_error)
+            for rv in pool.imap(parse_entry, entries):
+                yield rv
+        else:
+            for entry in entries:
+                yield self._parse_entry(entry, ignore_error)
+
+    def _parse_entry(self, entry, ignore_error):
+        vt, info = None, {}
+
+        # self.parser might be updated by another thread while we are
+        # running, but that's okay since it's only used as a hint
+        last_parser = self.parser
+        if last_parser:
+            #little optimization. we save last success parser, so should not
+            #check all again. As feed can contain a lot of entries, this
+            #can be useful
+            try:
+                vt, info = self._parse(entry, last_parser)
+            except FeedParserError, e:
+                if not ignore_error:
+                    raise e
+
+        if vt is None:
+            for parser in feed_parsers:
+                if parser == last_parser:
+                    #we have parsed with this parser
+                    continue
 
-            if self.parser:
-                #little optimization. we save last success parser, so should not
-                #check all again. As feed can contain a lot of entries, this
-                #can be useful
                 try:
-                    vt, info = self._parse(entry, self.parser)
+                    vt, info = self._parse(entry, parser)
                 except FeedParserError, e:
                     if not ignore_error:
                         raise e
 
-            if vt is None:
-                for parser in feed_parsers:
-                    if parser == self.parser:
-                        #we have parsed with this parser
-                        continue
-
-                    try:
-                        vt, info = self._parse(entry, parser)
-                    except FeedParserError, e:
-                        if not ignore_error:
-                            raise e
-
-                    if vt:
-                        self.parser = parser
-                        break
+                if vt:
+                    self.parser = parser
+                    break
 
-            yield vt, info, entry
+        return vt, info, entry
 
     def _parse(self, entry, parser):
         """
@@ -0,0 +1,94 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from videos.models import VideoUrl
+from videos.types import video_type_registrar
+from videos.types.dailymotion import DailymotionVideoType
+
+class Command(BaseCommand):
+    args = '[url file]'
+    help = ('Time video_type_class_for_url() against a linear scan of the '
+            'video types.  URLs are read from the file, one per line, or '
+            'from the most recent VideoUrls.')
+    option_list = BaseCommand.option_list + (
+        make_option('--limit', '-l', dest='limit', type="int",
+                    default=10000, help='Number of VideoUrls to use'),
+        make_option('--repeat', '-r', dest='repeat', type="int",
+                    default=3, help='Number of passes over the URLs'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) > 1:
+            raise CommandError('Usage benchmark_video_types [url file]')
+        if args:
+            with open(args[0]) as f:
+                urls = [line.strip().decode('utf-8') for line in f
+                        if line.strip()]
+        else:
+            urls = list(VideoUrl.objects.order_by('-pk')
+                        .values_list('url', flat=True)[:options['limit']])
+        # DailymotionVideoType.matches_video_url() fetches the video metadata,
+        # which would swamp the timings
+        dailymotion_domains = DailymotionVideoType.url_domains
+        urls = [url for url in urls
+                if not any(domain in url for domain in dailymotion_domains)]
+        if not urls:
+            raise CommandError('No URLs to benchmark')
+
+        self.check_results(urls)
+        linear_time = self.time_func(self.linear_scan, urls,
+                                     options['repeat'])
+        indexed_time = self.time_func(
+            video_type_registrar.video_type_class_for_url, urls,
+            options['repeat'])
+        self.stdout.write("%s urls, %s passes\n" % (len(urls),
+                                                    options['repeat']))
+        self.stdout.write("linear scan: %0.3f seconds (%0.1f us/url)\n" %
+                          (linear_time, self.per_url(linear_time, urls,
+                                                     options['repeat'])))
+        self.stdout.write("host index: %0.3f seconds (%0.1f us/url)\n" %
+                          (indexed_time, self.per_url(indexed_time, urls,
+                                                      options['repeat'])))
+
+    def linear_scan(self, url):
+        for video_type in video_type_registrar.type_list:
+            if video_type.matches_video_url(url):
+                return video_type
+
+    def check_results(self, urls):
+        for url in urls:
+            linear = self.linear_scan(url)
+            indexed = video_type_registrar.video_type_class_for_url(url)
+            if linear != indexed:
+                self.stderr.write("results differ for %s: %s %s\n" %
+                                  (url, linear, indexed))
+
+    def time_func(self, func, urls, repeat):
+        start_time = time.time()
+        for i in xrange(repeat):
+            for url in urls:
+                func(url)
+        return time.time() - start_time
+
+    def per_url(self, total_time, urls, repeat):
+        return total_time * 1000000 / (len(urls) * repeat)
@@ -21,10 +21,11 @@ logger = logging.getLogger("videos-models")
 
 import string
 import random
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 import time
 import re
 import urlparse
+from collections import defaultdict
 
 from django.utils.safestring import mark_safe
 from django.core.cache import cache
@@ -142,6 +143,8 @@ class SubtitleLanguageFetcher(object):
     def fetch_one_language(self, video, language_code):
         if language_code in self.cache:
             return self.cache[language_code]
+        if self.all_languages_fetched:
+            return None
         try:
             lang = (video.newsubtitlelanguage_set
                     .get(language_code=language_code))
@@ -171,15 +174,64 @@ class SubtitleLanguageFetcher(object):
         fetched_languages = language_qs.fetch_and_join(
             video=video, public_tips=with_public_tips,
             private_tips=with_private_tips)
+        self.set_languages(fetched_languages, languages)
+
+    def set_languages(self, fetched_languages, languages):
+        """Store languages that were fetched from the DB
+
+        :param fetched_languages: list of SubtitleLanguages
+        :param languages: language codes that were fetched, or None if all
+        languages were fetched.
+        """
         for lang in fetched_languages:
             self.cache[lang.language_code] = lang
         if languages is None:
             self.all_languages_fetched = True
+        else:
+            # remember the languages that don't exist, so that
+            # fetch_one_language() doesn't need to look for them
+            for language_code in languages:
+                self.cache.setdefault(language_code, None)
 
     def clear_cache(self):
         self.cache = {}
         self.all_languages_fetched = False
 
+def bulk_prefetch_languages(videos, languages=None, with_public_tips=False,
+                            with_private_tips=False):
+    """Prefetch and cache languages/versions for a list of videos
+
+    This works like Video.prefetch_languages(), but it fetches the data for
+    all the videos at once, using at most 3 queries no matter how many videos
+    there are.  Use it for pages that list lots of videos.
+
+    :param videos: list of Video objects
+    :param lanuages: list of languages to fetch, or None to fetch all
+    languages.
+    :param with_public_tips: fetch the public tips for all the languages and
+    cache them
+    :param with_private_tips: fetch the private tips for all the languages and
+    cache them
+    """
+    from subtitles.models import SubtitleLanguage
+
+    videos = [v for v in videos if v is not None]
+    if not videos:
+        return
+    language_qs = SubtitleLanguage.objects.filter(
+        video__in=set(v.id for v in videos))
+    if languages is not None:
+        language_qs = language_qs.filter(language_code__in=languages)
+    fetched_languages = language_qs.fetch_and_join(
+        videos=videos, public_tips=with_public_tips,
+        private_tips=with_private_tips)
+    languages_by_video = defaultdict(list)
+    for lang in fetched_languages:
+        languages_by_video[lang.video_id].append(lang)
+    for video in videos:
+        video._language_fetcher.set_languages(languages_by_video[video.id],
+                                              languages)
+
 class Video(models.Model):
     """Central object in the system"""
 
@@ -1910,8 +1962,22 @@ class VideoFeed(models.Model):
     user = models.ForeignKey(User, blank=True, null=True)
     team = models.ForeignKey("teams.Team", blank=True, null=True)
     last_update = models.DateTimeField(null=True)
+    # ETag and Last-Modified headers from the last fetch, used to make
+    # conditional requests
+    etag = models.CharField(max_length=255, blank=True, default='')
+    last_modified = models.CharField(max_length=255, blank=True, default='')
+    # id of the newest entry we've seen.  We stop parsing the feed when we
+    # get to it.
+    last_entry_id = models.CharField(max_length=255, blank=True, default='')
+    # Feeds get checked more often if they change often and less often if
+    # they don't.  update_interval is the current time between checks in
+    # seconds.
+    update_interval = models.PositiveIntegerField(default=60 * 60)
+    next_update = models.DateTimeField(null=True, blank=True, db_index=True)
 
     YOUTUBE_PAGE_SIZE = 25
+    MIN_UPDATE_INTERVAL = 60 * 15
+    MAX_UPDATE_INTERVAL = 60 * 60 * 24
 
     def __unicode__(self):
         return self.url
@@ -1920,15 +1986,27 @@ class VideoFeed(models.Model):
     def now():
         return datetime.now()
 
+    @classmethod
+    def feeds_to_update(cls):
+        """Get the feeds that are due to be checked for new videos."""
+        return cls.objects.filter(Q(next_update__isnull=True) |
+                                  Q(next_update__lte=cls.now()))
+
     def domain(self):
         return urlparse.urlparse(self.url).netloc
 
     def update(self):
-        importer = VideoImporter(self.url, self.user)
+        importer = VideoImporter(self.url, self.user, etag=self.etag,
+                                 modified=self.last_modified,
+                                 last_entry_id=self.last_entry_id)
         new_videos = importer.import_videos(
             import_next=self.last_update is None)
 
         self.last_update = VideoFeed.now()
+        self.etag = importer.etag or ''
+        self.last_modified = importer.modified or ''
+        self.last_entry_id = importer.last_entry_id or ''
+        self.schedule_next_update(changed=importer.checked_entries > 0)
         self.save()
         # create videos last-to-first so that the latest video is at the top
         # of the list when viewing the imported videos
@@ -1937,6 +2015,23 @@ class VideoFeed(models.Model):
         signals.feed_imported.send(sender=self, new_videos=new_videos)
         return new_videos
 
+    def schedule_next_update(self, changed):
+        """Set next_update after checking the feed.
+
+        We halve the update interval each time the feed has new entries and
+        double it each time it doesn't.
+
+        :param changed: did the feed have new entries?
+        """
+        if changed:
+            self.update_interval = max(self.update_interval // 2,
+                                       self.MIN_UPDATE_INTERVAL)
+        else:
+            self.update_interval = min(self.update_interval * 2,
+                                       self.MAX_UPDATE_INTERVAL)
+        self.next_update = (self.last_update +
+                            timedelta(seconds=self.update_interval))
+
 class ImportedVideo(models.Model):
     feed = models.ForeignKey(VideoFeed)
     video = models.OneToOneField(Video)
@@ -24,7 +24,6 @@ from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.files.base import ContentFile
 from django.db.models import ObjectDoesNotExist
-from haystack import site
 from raven.contrib.django.models import client
 import requests
 
@@ -32,6 +31,7 @@ from babelsubs.storage import diff as diff_subtitles
 from messages.models import Message
 from messages import tasks
 from utils import send_templated_email, DEFAULT_PROTOCOL
+from utils.coalesce import CoalescingQueue
 from utils.metrics import Gauge, Meter
 from videos.models import VideoFeed, Video, VIDEO_TYPE_YOUTUBE, VideoUrl
 from subtitles.models import (
@@ -44,6 +44,12 @@ from apps.videos.types import VideoTypeError
 
 celery_logger = logging.getLogger('celery.task')
 
+# Pushing subtitles to the original video service is slow and the editor can
+# save many versions in a row.  Only push the latest version once the saves
+# settle down.
+original_service_queue = CoalescingQueue('original-service-upload',
+                                         quiet_period=60, max_wait=60 * 10)
+
 def process_failure_signal(exception, traceback, sender, task_id,
                            signal, args, kwargs, einfo, **kw):
     exc_info = (type(exception), exception, traceback)
@@ -95,15 +101,25 @@ def save_thumbnail_in_s3(video_id):
 
 @task
 def update_from_feed(*args, **kwargs):
-    for feed in VideoFeed.objects.all():
-        update_video_feed.delay(feed.pk)
+    feeds_to_update = VideoFeed.feeds_to_update()
+    feed_ids = list(feeds_to_update.values_list('pk', flat=True))
+    if not feed_ids:
+        return
+    # Push next_update forward so that we don't queue these feeds again if
+    # the celery queue is backed up.  update() sets the real value when it
+    # runs.
+    next_update = VideoFeed.now() + timedelta(
+        seconds=VideoFeed.MIN_UPDATE_INTERVAL)
+    feeds_to_update.filter(pk__in=feed_ids).update(next_update=next_update)
+    for feed_id in feed_ids:
+        update_video_feed.delay(feed_id)
 
 @task
 def update_video_feed(video_feed_id):
     try:
         video_feed = VideoFeed.objects.get(pk=video_feed_id)
         video_feed.update()
-    except VideoFeed:
+    except VideoFeed.DoesNotExist:
         msg = '**update_video_feed**. VideoFeed does not exist. ID: %s' % video_feed_id
         client.captureMessage(msg)
 
@@ -134,12 +150,13 @@ def video_changed_tasks(video_pk, new_version_id=None, skip_third_party_sync=Fal
     from videos import metadata_manager
     from videos.models import Video
 
-    from teams.models import TeamVideo, BillingRecord
+    from teams.models import BillingRecord
+    from teams.tasks import queue_team_video_index_update
     metadata_manager.update_metadata(video_pk)
     if new_version_id is not None:
         send_new_version_notification(new_version_id)
         if not skip_third_party_sync:
-            _update_captions_in_original_service(new_version_id)
+            queue_upload_to_original_service(new_version_id)
         try:
             BillingRecord.objects.insert_record(
                 SubtitleVersion.objects.get(pk=new_version_id))
@@ -153,8 +170,7 @@ def video_changed_tasks(video_pk, new_version_id=None, skip_third_party_sync=Fal
     tv = video.get_team_video()
 
     if tv:
-        tv_search_index = site.get_index(TeamVideo)
-        tv_search_index.backend.update(tv_search_index, [tv])
+        queue_team_video_index_update(tv.pk)
 
     video.update_search_index()
 
@@ -169,7 +185,7 @@ def subtitles_complete_changed(language_pk):
     from teams.models import TeamVideo, BillingRecord
     language = SubtitleLanguage.objects.get(pk=language_pk)
     version = language.get_tip()
-    _update_captions_in_original_service(version.pk)
+    queue_upload_to_original_service(version.pk, language.pk)
     try:
         BillingRecord.objects.insert_record(version)
     except Exception, e:
@@ -219,6 +235,32 @@ def import_videos_from_feed(feed_id):
 def upload_subtitles_to_original_service(version_pk):
     _update_captions_in_original_service(version_pk)
 
+def queue_upload_to_original_service(version_pk, language_pk=None):
+    """Schedule a version to be pushed to the original video service.
+
+    Versions for the same language get coalesced, so that only the latest one
+    is pushed.
+    """
+    if language_pk is None:
+        try:
+            language_pk = (SubtitleVersion.objects.filter(pk=version_pk)
+                           .values_list('subtitle_language_id', flat=True)[0])
+        except IndexError:
+            return
+    original_service_queue.add(language_pk,
+                               upload_latest_subtitles_to_original_service,
+                               args=(language_pk,), value=version_pk)
+
+@task()
+def upload_latest_subtitles_to_original_service(language_pk):
+    task = upload_latest_subtitles_to_original_service
+    if original_service_queue.reschedule(language_pk, task,
+                                         args=(language_pk,)):
+        return
+    version_pk = original_service_queue.pop(language_pk)
+    if version_pk is not None:
+        _update_captions_in_original_service(version_pk)
+
 def send_new_version_notification(version_id):
     try:
         version = SubtitleVersion.objects.get(id=version_id)
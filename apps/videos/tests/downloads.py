@@ -17,13 +17,19 @@
 # along with this program. If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+import shutil
+import tempfile
 import urllib
 import urlparse
 
 from babelsubs.parsers.dfxp import DFXPParser
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
 from django.core.urlresolvers import reverse
 from django.test import TestCase
+import mock
 
+from subtitles import downloads
 from subtitles.templatetags import new_subtitles_tags
 from videos.models import Video
 from videos.tests.data import (
@@ -92,3 +98,61 @@ class DFXPTest(TestCase):
         self.assertEqual(end, 200)
         self.assertEqual(content, 'Here we go!')
 
+
+class RenderedDownloadTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.storage_dir = tempfile.mkdtemp()
+        storage = FileSystemStorage(location=self.storage_dir)
+        patcher = mock.patch('subtitles.downloads._storage',
+                             return_value=storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.storage_dir)
+
+        video = get_video()
+        video.primary_audio_language_code = 'en'
+        video.save()
+        self.sl_en = make_subtitle_language(video, 'en')
+        make_subtitle_version(self.sl_en, [(100, 200, 'Here we go!')],
+                              title='title')
+        self.url = new_subtitles_tags.subtitle_download_url(
+            self.sl_en.get_tip(), 'srt')
+
+    def test_render_once(self):
+        with mock.patch('subtitles.downloads.render',
+                        wraps=downloads.render) as mock_render:
+            res = self.client.get(self.url)
+            res2 = self.client.get(self.url)
+        self.assertEquals(mock_render.call_count, 1)
+        self.assertEquals(res.status_code, 200)
+        self.assertEquals(res2.status_code, 200)
+        self.assertEquals(res.content, res2.content)
+        self.assertEquals(res['ETag'], res2['ETag'])
+        self.assertTrue('Here we go!' in res.content)
+
+    def test_if_none_match(self):
+        etag = self.client.get(self.url)['ETag']
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(res.status_code, 304)
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH='"other-etag"')
+        self.assertEquals(res.status_code, 200)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        res = self.client.get(self.url,
+                              HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEquals(res.status_code, 304)
+        res = self.client.get(self.url,
+                              HTTP_IF_MODIFIED_SINCE='Sat, 01 Jan 2000 '
+                              '00:00:00 GMT')
+        self.assertEquals(res.status_code, 200)
+
+    def test_missing_file(self):
+        # if the rendered file is missing from storage, we should render it
+        # again
+        content = self.client.get(self.url).content
+        shutil.rmtree(self.storage_dir)
+        res = self.client.get(self.url)
+        self.assertEquals(res.status_code, 200)
+        self.assertEquals(res.content, content)
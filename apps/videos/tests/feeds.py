@@ -17,15 +17,18 @@
 # along with this program. If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
-import feedparser
+from multiprocessing.pool import ThreadPool
 from StringIO import StringIO
 
+import feedparser
+
 from django.core.urlresolvers import reverse
 from django.test import TestCase
 import mock
 
 from utils import test_utils
 from videos.feed_parser import FeedParser
+from videos.feed_parser.parser import entry_id
 from videos.models import Video, VideoFeed
 from videos.types.vimeo import VimeoVideoType
 from videos.types.dailymotion import DailymotionVideoType
@@ -108,6 +111,28 @@ class TestFeedParser(FeedImportTest):
         self.check_video_types('http://vimeo.com/blakewhitman/videos/rss',
                                VimeoVideoType)
 
+    def test_items_with_pool(self):
+        self.set_feed_data(VIMEO_FEED_XML)
+        feed_parser = FeedParser('http://vimeo.com/blakewhitman/videos/rss')
+        correct = [(vt.convert_to_video_url(), info)
+                   for vt, info, entry in feed_parser.items()]
+        pool = ThreadPool(4)
+        self.addCleanup(pool.terminate)
+        self.assertEquals([(vt.convert_to_video_url(), info)
+                           for vt, info, entry in feed_parser.items(pool=pool)],
+                          correct)
+
+    def test_stop_at_entry(self):
+        self.set_feed_data(VIMEO_FEED_XML)
+        feed_parser = FeedParser('http://vimeo.com/blakewhitman/videos/rss')
+        entries = feed_parser.feed.entries
+        self.assertTrue(len(entries) > 2)
+        items = list(feed_parser.items(stop_at_entry=entry_id(entries[2])))
+        # we should only get the 2 entries above the one we stopped at, in
+        # order from oldest to newest
+        self.assertEquals([entry for vt, info, entry in items],
+                          [entries[1], entries[0]])
+
     def test_youtube_feed_parsing(self):
         self.set_feed_data(YOUTUBE_USER_FEED_XML)
         feed_url = ('https://gdata.youtube.com'
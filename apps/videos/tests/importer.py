@@ -61,6 +61,7 @@ class VideoImporterTestCase(TestCase):
         self.feed_parser.feed.entries = [self.entry(name)
                                     for (name, extra) in item_info]
         self.feed_parser.feed.feed = {}
+        self.feed_parser.not_modified.return_value = False
         self.feed_parser.items.return_value = [
             (self.video_type(name), info, self.entry(name))
             for (name, info) in item_info
@@ -92,9 +93,8 @@ class VideoImporterTestCase(TestCase):
             ('item-3', {}),
         ])
         self.run_import_videos()
-        self.feed_parser.items.assert_called_with(
-            ignore_error=True,
-        )
+        args, kwargs = self.feed_parser.items.call_args
+        self.assertEquals(kwargs['ignore_error'], True)
         self.check_videos('item-1', 'item-2', 'item-3')
 
     def test_import_extra_values(self):
@@ -168,7 +168,7 @@ class VideoImporterTestCase(TestCase):
         ]
         links_iter = iter(links)
         urls_parsed = []
-        def make_feed_parser(url):
+        def make_feed_parser(url, **kwargs):
             urls_parsed.append(url)
             self.setup_feed_items([], links_iter.next())
             return self.feed_parser
@@ -186,12 +186,44 @@ class VideoImporterTestCase(TestCase):
         self.run_import_videos(import_next=False)
         self.assertEquals(urls_parsed, [self.feed_url()])
 
+    def test_not_modified(self):
+        self.setup_feed_items([
+            ('item-1', {}),
+        ])
+        self.feed_parser.not_modified.return_value = True
+        import_obj = importer.VideoImporter(self.feed_url(), self.user,
+                                            etag='abc', last_entry_id='foo')
+        self.assertEquals(import_obj.import_videos(), [])
+        self.mock_feedparser_class.assert_called_with(
+            self.feed_url(), etag='abc', modified=None)
+        self.assertEquals(Video.objects.count(), 0)
+        # we should keep the values from the last import
+        self.assertEquals(import_obj.etag, 'abc')
+        self.assertEquals(import_obj.last_entry_id, 'foo')
+
+    def test_last_entry_id(self):
+        self.setup_feed_items([
+            ('item-2', {}),
+            ('item-1', {}),
+        ])
+        import_obj = importer.VideoImporter(self.feed_url(), self.user,
+                                            last_entry_id=self.url('item-0'))
+        import_obj.import_videos()
+        args, kwargs = self.feed_parser.items.call_args
+        self.assertEquals(kwargs['stop_at_entry'], self.url('item-0'))
+        # last_entry_id should now be the id of the top entry
+        self.assertEquals(import_obj.last_entry_id, self.url('item-2'))
+
 class VideoFeedTest(TestCase):
     @test_utils.patch_for_test('videos.models.VideoImporter')
     def setUp(self, MockVideoImporter):
         self.MockVideoImporter = MockVideoImporter
         self.mock_video_importer = mock.Mock()
         self.mock_video_importer.last_link = None
+        self.mock_video_importer.etag = None
+        self.mock_video_importer.modified = None
+        self.mock_video_importer.last_entry_id = None
+        self.mock_video_importer.checked_entries = 0
         MockVideoImporter.return_value = self.mock_video_importer
 
     def test_video_feed(self):
@@ -208,7 +240,8 @@ class VideoFeedTest(TestCase):
 
         self.mock_video_importer.import_videos.return_value = feed_videos
         rv = feed.update()
-        self.MockVideoImporter.assert_called_with(url, user)
+        self.MockVideoImporter.assert_called_with(
+            url, user, etag='', modified='', last_entry_id='')
         self.mock_video_importer.import_videos.assert_called_with(import_next=True)
         self.assertEquals(rv, feed_videos)
         mock_feed_imported_handler.assert_called_with(
@@ -217,12 +250,72 @@ class VideoFeedTest(TestCase):
         # import_next=False
         self.mock_video_importer.import_videos.return_value = []
         rv = feed.update()
-        self.MockVideoImporter.assert_called_with(url, user)
+        self.MockVideoImporter.assert_called_with(
+            url, user, etag='', modified='', last_entry_id='')
         self.mock_video_importer.import_videos.assert_called_with(import_next=False)
         self.assertEquals(rv, [])
         mock_feed_imported_handler.assert_called_with(
             signal=signals.feed_imported, sender=feed, new_videos=[])
 
+    def test_schedule_next_update(self):
+        feed = VideoFeed(url='http://example.com/feed.rss',
+                         last_update=datetime.datetime(2000, 1, 1))
+        # no changes, update_interval should double
+        feed.schedule_next_update(changed=False)
+        self.assertEquals(feed.update_interval, 7200)
+        self.assertEquals(feed.next_update,
+                          datetime.datetime(2000, 1, 1, 2))
+        # changes, update_interval should be halved
+        feed.schedule_next_update(changed=True)
+        self.assertEquals(feed.update_interval, 3600)
+        # test the limits
+        for i in xrange(20):
+            feed.schedule_next_update(changed=True)
+        self.assertEquals(feed.update_interval, VideoFeed.MIN_UPDATE_INTERVAL)
+        for i in xrange(20):
+            feed.schedule_next_update(changed=False)
+        self.assertEquals(feed.update_interval, VideoFeed.MAX_UPDATE_INTERVAL)
+
+    @test_utils.patch_for_test('videos.models.VideoFeed.now')
+    def test_update_stores_polling_state(self, mock_now):
+        mock_now.return_value = datetime.datetime(2000, 1, 1)
+        feed = VideoFeed.objects.create(url='http://example.com/feed.rss')
+        self.mock_video_importer.import_videos.return_value = []
+        self.mock_video_importer.etag = 'abc'
+        self.mock_video_importer.modified = 'Sat, 01 Jan 2000 00:00:00 GMT'
+        self.mock_video_importer.last_entry_id = 'entry-1'
+        feed.update()
+        feed = VideoFeed.objects.get(pk=feed.pk)
+        self.assertEquals(feed.etag, 'abc')
+        self.assertEquals(feed.last_modified, 'Sat, 01 Jan 2000 00:00:00 GMT')
+        self.assertEquals(feed.last_entry_id, 'entry-1')
+        self.assertEquals(feed.next_update, datetime.datetime(2000, 1, 1, 2))
+        # the feed shouldn't be updated again until next_update
+        self.assertEquals(list(VideoFeed.feeds_to_update()), [])
+        mock_now.return_value = datetime.datetime(2000, 1, 1, 2)
+        self.assertEquals(list(VideoFeed.feeds_to_update()), [feed])
+
+    @test_utils.patch_for_test('videos.tasks.update_video_feed')
+    @test_utils.patch_for_test('videos.models.VideoFeed.now')
+    def test_update_from_feed_queues_once(self, mock_now,
+                                          mock_update_video_feed):
+        from videos.tasks import update_from_feed
+        mock_now.return_value = datetime.datetime(2000, 1, 1)
+        feed = VideoFeed.objects.create(url='http://example.com/feed.rss')
+        update_from_feed()
+        self.assertEquals(mock_update_video_feed.delay.call_count, 1)
+        self.assertEquals(mock_update_video_feed.delay.call_args,
+                          ((feed.pk,), {}))
+        # if the update hasn't run yet, the next check shouldn't queue the
+        # feed again
+        mock_now.return_value = datetime.datetime(2000, 1, 1, 0, 10)
+        update_from_feed()
+        self.assertEquals(mock_update_video_feed.delay.call_count, 1)
+        # but it should once MIN_UPDATE_INTERVAL has passed
+        mock_now.return_value = datetime.datetime(2000, 1, 1, 0, 15)
+        update_from_feed()
+        self.assertEquals(mock_update_video_feed.delay.call_count, 2)
+
     def make_video(self, number):
         video_url = 'http://example.com/video-{0}.mp4'.format(number)
         return VideoFactory.create(video_url__url=video_url)
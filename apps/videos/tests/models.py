@@ -23,7 +23,7 @@ import mock
 from auth.models import CustomUser as User
 from subtitles import pipeline
 from subtitles.models import SubtitleLanguage
-from videos.models import Video
+from videos.models import Video, bulk_prefetch_languages
 from videos.tasks import video_changed_tasks
 from videos.tests.data import (
     get_video, make_subtitle_language, make_subtitle_version, make_rollback_to
@@ -313,3 +313,43 @@ class TestSubtitleLanguageCaching(TestCase):
                 # fetching the version video should be cached
                 lang.get_tip(public=True).video
                 lang.get_tip(public=False).video
+
+class TestBulkPrefetchLanguages(TestCase):
+    def setUp(self):
+        self.videos, self.langs, self.versions = bulk_subs({
+            'video1': {
+                'en': [{}, {}],
+                'fr': [{}, {'visibility': 'private'}],
+            },
+            'video2': {
+                'en': [{}],
+                'de': [{'visibility': 'private'}],
+            },
+        })
+        # use fresh video objects, so nothing is cached
+        self.video_list = list(Video.objects.filter(
+            id__in=[v.id for v in self.videos.values()]))
+
+    def test_prefetch(self):
+        with self.assertNumQueries(3):
+            bulk_prefetch_languages(self.video_list, with_public_tips=True,
+                                    with_private_tips=True)
+        with self.assertNumQueries(0):
+            for video in self.video_list:
+                for lang in video.all_subtitle_languages():
+                    self.assertEquals(lang.video.id, video.id)
+                    lang.get_tip(public=True)
+                    lang.get_tip(public=False)
+
+    def test_prefetch_languages(self):
+        video1 = [v for v in self.video_list
+                  if v.id == self.videos['video1'].id][0]
+        with self.assertNumQueries(1):
+            bulk_prefetch_languages(self.video_list, languages=['en', 'de'])
+        with self.assertNumQueries(0):
+            for video in self.video_list:
+                self.assertNotEquals(video.subtitle_language('en'), None)
+            # languages that don't exist should be cached as well
+            self.assertEquals(video1.subtitle_language('de'), None)
+        with self.assertNumQueries(1):
+            video1.subtitle_language('fr')
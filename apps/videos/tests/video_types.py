@@ -288,6 +288,79 @@ class VideoTypeRegistrarTest(TestCase):
         self.assertRaises(VideoTypeError, video_type_registrar.video_type_for_url,
                           'http://youtube.com/v=100500')
 
+    def test_host_index(self):
+        registrar = VideoTypeRegistrar()
+
+        class FooVideoType(VideoType):
+            abbreviation = 'foo'
+            name = 'Foo'
+            url_domains = ('foo.com',)
+
+            @classmethod
+            def matches_video_url(cls, url):
+                return True
+
+        class FileVideoType(VideoType):
+            abbreviation = 'file'
+            name = 'File'
+
+            @classmethod
+            def matches_video_url(cls, url):
+                return url.endswith('.mp4')
+
+        registrar.register(FileVideoType)
+        registrar.register(FooVideoType)
+        self.assertEquals(registrar.types_for_host('foo.com'),
+                          [FileVideoType, FooVideoType])
+        self.assertEquals(registrar.types_for_host('www.foo.com'),
+                          [FileVideoType, FooVideoType])
+        self.assertEquals(registrar.types_for_host('barfoo.com'),
+                          [FileVideoType])
+        self.assertEquals(registrar.types_for_host(None), [FileVideoType])
+        # types get checked in the order they were registered
+        self.assertEquals(
+            registrar.video_type_class_for_url('http://foo.com/video.mp4'),
+            FileVideoType)
+        self.assertEquals(
+            registrar.video_type_class_for_url('http://foo.com/video'),
+            FooVideoType)
+        self.assertEquals(
+            registrar.video_type_class_for_url('http://bar.com/video'),
+            None)
+        self.assertEquals(
+            registrar.video_type_class_for_url('http://bar.com/video.mp4'),
+            FileVideoType)
+
+    def test_host_index_matches_linear_scan(self):
+        urls = [
+            'http://www.youtube.com/watch?v=UOtJUmiUZ08',
+            'http://youtu.be/UOtJUmiUZ08',
+            'http://vimeo.com/22070806',
+            'http://player.vimeo.com/video/22070806',
+            'http://blip.tv/day9tv/day-9-daily-101-kawaiirice-vs-idra-zvp-'
+            '5237281',
+            'http://link.brightcove.com/services/link/bcpid1234/bctid5678',
+            'http://bcove.me/services/link/bcpid1234/bctid5678',
+            'http://home.wistia.com/medias/e4a27b971d',
+            'http://www.kaltura.com/p/1492321/sp/149232100/serveFlavor/'
+            'entryId/1_zr7niumr/flavorId/1_djpnqf7y/name/a.mp4',
+            'http://example.com/video.mp4',
+            'http://example.com/video.flv',
+            'http://example.com/audio.mp3',
+            'http://vimeo.com/video.webm',
+            'http://example.com/page.html',
+            'some url',
+        ]
+        for url in urls:
+            correct = None
+            for video_type in video_type_registrar.type_list:
+                if video_type.matches_video_url(url):
+                    correct = video_type
+                    break
+            self.assertEquals(
+                video_type_registrar.video_type_class_for_url(url), correct,
+                url)
+
 class BrightcoveVideoTypeTest(TestCase):
     player_id = '1234'
     video_id = '5678'
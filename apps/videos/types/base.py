@@ -26,6 +26,11 @@ class VideoType(object):
 
     CAN_IMPORT_SUBTITLES = False
 
+    # Domains that URLs for this type can be on.  URLs on subdomains match
+    # too.  VideoTypeRegistrar uses this to avoid calling matches_video_url()
+    # for URLs on other sites.  None means URLs can be on any domain.
+    url_domains = None
+
     requires_url_exists = True
     def __init__(self, url):
         self.url = url
@@ -63,11 +68,17 @@ class VideoType(object):
 class VideoTypeRegistrar(dict):
     
     domains = []
+    # max number of hosts to keep in the dispatch cache
+    HOST_CACHE_SIZE = 1000
     
     def __init__(self, *args, **kwargs):
         super(VideoTypeRegistrar, self).__init__(*args, **kwargs)
         self.choices = []
         self.type_list = []
+        # maps domains to the video types with that domain in url_domains
+        self.domain_index = {}
+        # maps hosts to the video types to check for URLs on that host
+        self.host_cache = {}
         
     def register(self, video_type):
         self[video_type.abbreviation] = video_type
@@ -75,11 +86,49 @@ class VideoTypeRegistrar(dict):
         self.choices.append((video_type.abbreviation, video_type.name))
         domain = getattr(video_type, 'site', None)
         domain and self.domains.append(domain)
+        for url_domain in video_type.url_domains or ():
+            self.domain_index.setdefault(url_domain, []).append(video_type)
+        self.host_cache.clear()
+
+    def types_for_host(self, host):
+        """Get the video types that could match URLs on a host.
+
+        This is the types whose url_domains contain the host or one of its
+        parent domains, plus the types that don't set url_domains, in the
+        order they were registered.
+        """
+        try:
+            return self.host_cache[host]
+        except KeyError:
+            pass
+        matching_types = set()
+        if host:
+            parts = host.split('.')
+            for i in xrange(len(parts)):
+                domain = '.'.join(parts[i:])
+                matching_types.update(self.domain_index.get(domain, ()))
+        types = [video_type for video_type in self.type_list
+                 if video_type.url_domains is None or
+                 video_type in matching_types]
+        if len(self.host_cache) >= self.HOST_CACHE_SIZE:
+            self.host_cache.clear()
+        self.host_cache[host] = types
+        return types
         
-    def video_type_for_url(self, url):
-        for video_type in self.type_list:
+    def video_type_class_for_url(self, url):
+        """Get the VideoType subclass that matches a URL, or None."""
+        try:
+            host = urlparse(url.strip()).hostname
+        except ValueError:
+            host = None
+        for video_type in self.types_for_host(host):
             if video_type.matches_video_url(url):
-                return video_type(url)
+                return video_type
+        
+    def video_type_for_url(self, url):
+        video_type = self.video_type_class_for_url(url)
+        if video_type is not None:
+            return video_type(url)
             
 class VideoTypeError(Exception):
     pass
@@ -30,6 +30,7 @@ class BlipTvVideoType(VideoType):
     abbreviation = 'B'
     name = 'Blip.tv'  
     site = 'blip.tv'
+    url_domains = ('blip.tv',)
 
     pattern = re.compile(r"^https?://blip.tv/(?P<subsite>[a-zA-Z0-9-]+)/(?P<file_id>[a-zA-Z0-9-]+)/?$")
     
@@ -30,6 +30,7 @@ class DailymotionVideoType(VideoType):
     abbreviation = 'D'
     name = 'dailymotion.com'
     site = 'dailymotion.com'
+    url_domains = ('dailymotion.com',)
 
     def __init__(self, url):
         self.url = url
@@ -332,6 +332,7 @@ class YoutubeVideoType(VideoType):
     abbreviation = 'Y'
     name = 'Youtube'
     site = 'youtube.com'
+    url_domains = ('youtube.com', 'youtu.be')
 
     # changing this will cause havock, let's talks about this first
     URL_TEMPLATE = 'http://www.youtube.com/watch?v=%s'
@@ -56,8 +56,7 @@ from apps.subtitles import models as sub_models
 from apps.subtitles.forms import SubtitlesUploadForm
 from apps.subtitles.pipeline import rollback_to
 from apps.teams.models import Task
-from apps.teams.permissions import (can_create_and_edit_subtitles,
-                                    can_create_and_edit_translations)
+from apps.teams.permissions import get_permission_context
 from apps.videos import permissions
 from apps.videos.decorators import get_video_revision, get_video_from_code
 from apps.videos.forms import (
@@ -333,8 +332,11 @@ class VideoPageContext(dict):
         if team_video is not None:
             self['team'] = team_video.team
             self['team_video'] = team_video
-            self['can_create_subs'] = can_create_and_edit_subtitles(
-                request.user, team_video)
+            # share the permission context with the template filters
+            permission_context = get_permission_context(request.user,
+                                                        team_video.team)
+            self['can_create_subs'] = (
+                permission_context.can_create_and_edit_subtitles(team_video))
             self['user_is_team_member'] = team_video.team.user_is_member(
                 request.user)
         else:
@@ -669,7 +671,9 @@ class LanguagePageContextRevisions(LanguagePageContext):
         revisions, pagination_info = paginate(
             revisions_qs, self.REVISIONS_PER_PAGE, request.GET.get('page'))
         self.update(pagination_info)
-        self['revisions'] = language.optimize_versions(revisions)
+        revisions = language.optimize_versions(revisions)
+        language.load_version_changes(revisions)
+        self['revisions'] = revisions
 
 class LanguagePageContextSyncHistory(LanguagePageContext):
     def setup_tab(self, request, video, language, version):
@@ -27,8 +27,9 @@ from subtitles import models as new_models
 from teams.models import Task, Workflow, Team, BillingRecord
 from teams.moderation_const import APPROVED, UNMODERATED, WAITING_MODERATION
 from teams.permissions import (
-    can_create_and_edit_subtitles, can_create_and_edit_translations,
-    can_publish_edits_immediately, can_review, can_approve, can_add_version,
+    can_create_and_edit_subtitles, can_publish_edits_immediately,
+    can_review, can_approve, can_add_version,
+    get_permission_context
 )
 from teams.signals import (
     api_subtitles_edited, api_subtitles_approved, api_subtitles_rejected,
@@ -105,10 +106,12 @@ class Rpc(BaseRpc):
 
 
     # Widget
-    def _check_visibility_policy_for_widget(self, request, video_id):
+    def _check_visibility_policy_for_widget(self, request, video_id,
+                                            visibility_policy=None):
         """Return an error if the user cannot see the widget, None otherwise."""
 
-        visibility_policy = video_cache.get_visibility_policies(video_id)
+        if visibility_policy is None:
+            visibility_policy = video_cache.get_visibility_policies(video_id)
 
         if not visibility_policy.get("is_public", True):
             team = Team.objects.get(id=visibility_policy['team_id'])
@@ -116,11 +119,11 @@ class Rpc(BaseRpc):
             if not team.is_member(request.user):
                 return {"error_msg": _("Video embedding disabled by owner")}
 
-    def _get_video_urls_for_widget(self, video_url, video_id):
-        """Return the video URLs, 'cleaned' video id, and error."""
+    def _get_widget_data(self, video_url, video_id, language_codes):
+        """Return the video_cache widget data, 'cleaned' video id, and error."""
 
         try:
-            video_urls = video_cache.get_video_urls(video_id)
+            data = video_cache.get_widget_data(video_id, language_codes)
         except models.Video.DoesNotExist:
             video_cache.invalidate_video_id(video_url)
 
@@ -129,9 +132,9 @@ class Rpc(BaseRpc):
             except Exception as e:
                 return None, None, {"error_msg": unicode(e)}
 
-            video_urls = video_cache.get_video_urls(video_id)
+            data = video_cache.get_widget_data(video_id, language_codes)
 
-        return video_urls, video_id, None
+        return data, video_id, None
 
     def _find_remote_autoplay_language(self, request):
         language = None
@@ -141,7 +144,39 @@ class Rpc(BaseRpc):
             language = request.user.preferred_language
         return language if language != '' else None
 
-    def _get_subtitles_for_widget(self, request, base_state, video_id, is_remote):
+    def _widget_language_codes(self, request, base_state, is_remote):
+        """Get the language codes that _get_subtitles_for_widget() will pass
+        to pk_for_default_language().
+        """
+        # keeping both forms valid as backwards compatibility layer
+        lang_code = base_state and base_state.get("language_code", base_state.get("language", None))
+
+        if base_state is not None and lang_code is not None:
+            if base_state.get('language_pk', None) is None:
+                return [lang_code]
+            else:
+                return []
+        elif is_remote:
+            return [self._find_remote_autoplay_language(request)]
+        else:
+            return []
+
+    def _get_subtitles_for_widget(self, request, base_state, video_id,
+                                  is_remote, language_pks=None):
+        """Get the subtitles for the widget to play.
+
+        :param language_pks: dict of language pks that were already looked up
+            with video_cache.get_widget_data()
+        """
+        def pk_for_default_language(language_code):
+            if language_pks is not None:
+                try:
+                    return language_pks[language_code or None]
+                except KeyError:
+                    pass
+            return video_cache.pk_for_default_language(video_id,
+                                                       language_code)
+
         # keeping both forms valid as backwards compatibility layer
         lang_code = base_state and base_state.get("language_code", base_state.get("language", None))
 
@@ -149,14 +184,14 @@ class Rpc(BaseRpc):
             lang_pk = base_state.get('language_pk', None)
 
             if lang_pk is  None:
-                lang_pk = video_cache.pk_for_default_language(video_id, lang_code)
+                lang_pk = pk_for_default_language(lang_code)
 
             return self._autoplay_subtitles(request.user, video_id, lang_pk,
                                             base_state.get('revision', None))
         else:
             if is_remote:
                 autoplay_language = self._find_remote_autoplay_language(request)
-                language_pk = video_cache.pk_for_default_language(video_id, autoplay_language)
+                language_pk = pk_for_default_language(autoplay_language)
 
                 if autoplay_language is not None:
                     return self._autoplay_subtitles(request.user, video_id,
@@ -172,12 +207,17 @@ class Rpc(BaseRpc):
         if video_id is None:
             return None
 
-        error = self._check_visibility_policy_for_widget(request, video_id)
+        # Fetch everything we need from the video cache in one go
+        language_codes = self._widget_language_codes(request, base_state,
+                                                     is_remote)
+        data, video_id, error = self._get_widget_data(video_url, video_id,
+                                                      language_codes)
 
         if error:
             return error
 
-        video_urls, video_id, error = self._get_video_urls_for_widget(video_url, video_id)
+        error = self._check_visibility_policy_for_widget(
+            request, video_id, data['visibility_policies'])
 
         if error:
             return error
@@ -185,9 +225,9 @@ class Rpc(BaseRpc):
         resp = {
             'video_id' : video_id,
             'subtitles': None,
-            'video_urls': video_urls,
-            'is_moderated': video_cache.get_is_moderated(video_id),
-            'filename': video_cache.get_download_filename(video_id),
+            'video_urls': data['video_urls'],
+            'is_moderated': data['is_moderated'],
+            'filename': data['filename'],
         }
 
         if additional_video_urls is not None:
@@ -199,10 +239,10 @@ class Rpc(BaseRpc):
         if request.user.is_authenticated():
             resp['username'] = request.user.username
 
-        resp['drop_down_contents'] = video_cache.get_video_languages(video_id)
+        resp['drop_down_contents'] = data['video_languages']
         resp['my_languages'] = get_user_languages_from_request(request)
-        resp['subtitles'] = self._get_subtitles_for_widget(request, base_state,
-                                                           video_id, is_remote)
+        resp['subtitles'] = self._get_subtitles_for_widget(
+            request, base_state, video_id, is_remote, data['language_pks'])
         return resp
 
     def track_subtitle_play(self, request, video_id):
@@ -516,8 +556,10 @@ class Rpc(BaseRpc):
             can_subtitle = True
             can_translate = True
         else:
-            can_subtitle = can_create_and_edit_subtitles(request.user, team_video)
-            can_translate = can_create_and_edit_translations(request.user, team_video)
+            context = get_permission_context(request.user, team_video.team)
+            can_subtitle = context.can_create_and_edit_subtitles(team_video)
+            can_translate = context.can_create_and_edit_translations(
+                team_video)
 
         return { 'response': 'ok',
                  'can_subtitle': can_subtitle,
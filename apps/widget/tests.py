@@ -1040,6 +1040,60 @@ class TestCache(TestCase):
         video_id = video_cache.get_video_id(url)
         video_cache.get_subtitles_dict(video_id, 0, 0, lambda x: x)
 
+    def test_invalidate_cache(self):
+        video = VideoFactory()
+        url = video.get_video_url()
+        video_id = video_cache.get_video_id(url)
+        video_cache.get_video_urls(video_id)
+        video_cache.get_is_moderated(video_id)
+        keys = [
+            video_cache._video_id_key(url),
+            video_cache._video_urls_key(video_id),
+            video_cache._video_is_moderated_key(video_id),
+        ]
+        for key in keys:
+            self.assertNotEquals(video_cache.cache.get(key), None)
+        video_cache.invalidate_cache(video_id)
+        keys = [
+            video_cache._video_id_key(url),
+            video_cache._video_urls_key(video_id),
+            video_cache._video_is_moderated_key(video_id),
+        ]
+        for key in keys:
+            self.assertEquals(video_cache.cache.get(key), None)
+
+    def test_get_widget_data(self):
+        video = VideoFactory(primary_audio_language_code='en')
+        language = sub_models.SubtitleLanguage.objects.create(
+            video=video, language_code='en')
+        video_id = video.video_id
+        data = video_cache.get_widget_data(video_id, ['en', 'fr', None])
+        self.assertEquals(data['video_urls'],
+                          video_cache.get_video_urls(video_id))
+        self.assertEquals(data['is_moderated'],
+                          video_cache.get_is_moderated(video_id))
+        self.assertEquals(data['filename'],
+                          video_cache.get_download_filename(video_id))
+        self.assertEquals(data['visibility_policies'],
+                          video_cache.get_visibility_policies(video_id))
+        self.assertEquals(data['video_languages'],
+                          video_cache.get_video_languages(video_id))
+        self.assertEquals(data['language_pks'], {
+            'en': language.pk,
+            'fr': None,
+            None: language.pk,
+        })
+        # once the cache is warm, we shouldn't need to use the DB.  (Except
+        # for missing languages, since we can't tell a cached None from a
+        # cache miss).
+        with self.assertNumQueries(0):
+            data2 = video_cache.get_widget_data(video_id, ['en', None])
+        self.assertEquals(data2['video_urls'], data['video_urls'])
+        self.assertEquals(data2['language_pks'], {
+            'en': language.pk,
+            None: language.pk,
+        })
+
 class TestCaching(TestCase):
     fixtures = ['test_widget.json']
 
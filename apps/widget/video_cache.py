@@ -24,21 +24,41 @@ from django.utils.translation import (
     ugettext_lazy as _
 )
 
+from utils.cache import KeyNamespace, LocalCache
 from videos.types import video_type_registrar
 from videos.types.base import VideoTypeError
 import unilangs
 
 TIMEOUT = 60 * 60 * 24 * 5 # 5 days
 
+# Most keys are stored in this namespace, so that invalidate_cache() can clear
+# them all at once.  The exceptions are keys that we look up by something
+# other than the video_id (the video URL or team video id).
+video_namespace = KeyNamespace('widget-video')
+
+# In-process cache for the lookups that happen on every widget embed.  Entries
+# are grouped by video_id.  This is disabled unless VIDEO_CACHE_LOCAL_SIZE is
+# set.
+local_cache = LocalCache('widget-video',
+                         getattr(settings, 'VIDEO_CACHE_LOCAL_SIZE', 0),
+                         getattr(settings, 'VIDEO_CACHE_LOCAL_TIMEOUT', 10))
+# Used to tell a missing local cache entry apart from a cached None
+_missing = object()
+
 
 def get_video_id(video_url, public_only=False, referer=None):
     """
     Returns the cache video_id for this video
     If public only is
     """
+    local_key = ('video_id', video_url)
+    value = local_cache.get(local_key)
+    if value:
+        return value
     cache_key = _video_id_key(video_url)
     value = cache.get(cache_key)
     if bool(value):
+        local_cache.set(value, local_key, value)
         return value
     else:
         from videos.models import Video
@@ -53,6 +73,7 @@ def get_video_id(video_url, public_only=False, referer=None):
         video_id = video.video_id
 
         cache.set(cache_key, video_id, TIMEOUT)
+        local_cache.set(video_id, local_key, video_id)
         return video_id
 
 def associate_extra_url(video_url, video_id):
@@ -72,43 +93,38 @@ def associate_extra_url(video_url, video_id):
 
 # Invalidation
 def invalidate_cache(video_id):
-    cache.delete(_video_urls_key(video_id))
+    invalidate_cache_for_videos([video_id])
 
-    try:
-        from apps.videos.models import Video
-        video = Video.objects.get(video_id=video_id)
-        for l in video.newsubtitlelanguage_set.all():
-            cache.delete(_subtitles_dict_key(video_id, l.pk))
-    except Video.DoesNotExist:
-        pass
-
-    for language in settings.ALL_LANGUAGES:
-        cache.delete(_subtitle_language_pk_key(video_id, language[0]))
-
-    cache.delete(_subtitle_language_pk_key(video_id, None))
-    cache.delete(_subtitles_dict_key(video_id, None))
-    cache.delete(_subtitles_count_key(video_id))
-    cache.delete(_video_languages_key(video_id))
-    cache.delete(_video_languages_verbose_key(video_id))
-    cache.delete(_video_is_moderated_key(video_id))
-    cache.delete(_video_visibility_policy_key(video_id))
-    cache.delete(_video_filename_key(video_id))
+def invalidate_cache_for_videos(video_ids):
+    """Invalidate the caches for a list of video ids.
 
-    from videos.models import Video
-    try:
-        video = Video.objects.get(video_id=video_id)
-        for url in video.videourl_set.all():
-            cache.delete(_video_id_key(url.url))
-
-        team_video = video.get_team_video()
-
-        if team_video:
-            cache.delete(_video_completed_languages(team_video.id))
-    except Video.DoesNotExist:
-        pass
+    This works like calling invalidate_cache() for each video, but fetches the
+    urls and team videos for all of them with a single query each.
+    """
+    from teams.models import TeamVideo
+    from videos.models import VideoUrl
+
+    for video_id in video_ids:
+        video_namespace.invalidate(video_id)
+        local_cache.invalidate(video_id)
+
+    keys = [_video_id_key(url) for url in
+            VideoUrl.objects.filter(video__video_id__in=video_ids)
+            .values_list('url', flat=True)]
+    keys.extend(_video_completed_languages(team_video_id)
+                for team_video_id in
+                TeamVideo.objects.filter(video__video_id__in=video_ids)
+                .values_list('id', flat=True))
+    cache.delete_many(keys)
 
 def invalidate_video_id(video_url):
-    cache.delete(_video_id_key(video_url))
+    cache_key = _video_id_key(video_url)
+    if local_cache.enabled:
+        video_id = (local_cache.get(('video_id', video_url)) or
+                    cache.get(cache_key))
+        if video_id:
+            local_cache.invalidate(video_id)
+    cache.delete(cache_key)
 
 def invalidate_video_moderation(video_id):
     cache.delete(_video_is_moderated_key(video_id))
@@ -127,20 +143,21 @@ def on_video_url_delete(sender, instance, **kwargs):
 def _video_id_key(video_url):
     return 'video_id_{0}'.format(sha_constructor(video_url).hexdigest())
 
-def _video_urls_key(video_id):
-    return 'widget_video_urls_{0}'.format(video_id)
+def _video_urls_key(video_id, generation=None):
+    return video_namespace.key(video_id, 'video_urls', generation)
 
 def _subtitles_dict_key(video_id, language_pk, version_no=None):
-    return 'widget_subtitles_{0}{1}{2}'.format(video_id, language_pk, version_no)
+    return video_namespace.key(
+        video_id, u'subtitles_{0}_{1}'.format(language_pk, version_no))
 
 def _subtitles_count_key(video_id):
-    return "subtitle_count_{0}".format(video_id)
+    return video_namespace.key(video_id, 'subtitle_count')
 
-def _video_languages_key(video_id):
-    return "widget_video_languages_{0}".format(video_id)
+def _video_languages_key(video_id, generation=None):
+    return video_namespace.key(video_id, 'video_languages', generation)
 
 def _video_languages_verbose_key(video_id):
-    return "widget_video_languages_verbose_{0}".format(video_id)
+    return video_namespace.key(video_id, 'video_languages_verbose')
 
 def _video_completed_languages(video_id):
     return "video_completed_verbose_{0}".format(video_id)
@@ -148,50 +165,66 @@ def _video_completed_languages(video_id):
 def _video_writelocked_langs_key(video_id):
     return "writelocked_langs_{0}".format(video_id)
 
-def _subtitle_language_pk_key(video_id, language_code):
-    return "sl_pk_{0}{1}".format(video_id, language_code)
+def _subtitle_language_pk_key(video_id, language_code, generation=None):
+    return video_namespace.key(video_id,
+                               u'sl_pk_{0}'.format(language_code), generation)
 
-def _video_is_moderated_key(video_id):
-    return 'widget_video_is_moderated_{0}'.format(video_id)
+def _video_is_moderated_key(video_id, generation=None):
+    return video_namespace.key(video_id, 'is_moderated', generation)
 
-def _video_filename_key(video_id):
-    return 'widget_video_filename_{0}'.format(video_id)
+def _video_filename_key(video_id, generation=None):
+    return video_namespace.key(video_id, 'filename', generation)
 
-def _video_visibility_policy_key(video_id):
-    return 'widget_video_vis_key_{0}'.format(video_id)
+def _video_visibility_policy_key(video_id, generation=None):
+    return video_namespace.key(video_id, 'vis_key', generation)
 
 
 def pk_for_default_language(video_id, language_code):
     # the widget sends langauge code as an empty dict
     # don't ask me why
     language_code = language_code or None
+    local_key = ('sl_pk', video_id, language_code)
+    value = local_cache.get(local_key, _missing)
+    if value is not _missing:
+        return value
+
     cache_key = _subtitle_language_pk_key(video_id, language_code)
     value = cache.get(cache_key)
 
     if value is None:
         from videos.models import Video
-        sl = Video.objects.get(video_id=video_id).subtitle_language(
-            language_code)
-        value = None if sl is None else sl.pk
+        value = _calc_language_pk(Video.objects.get(video_id=video_id),
+                                  language_code)
         cache.set(cache_key, value, TIMEOUT)
 
+    local_cache.set(video_id, local_key, value)
     return value
 
 def get_video_urls(video_id):
+    local_key = ('video_urls', video_id)
+    video_urls = local_cache.get(local_key)
+    if video_urls is not None:
+        return video_urls
+
     cache_key = _video_urls_key(video_id)
     video_urls = cache.get(cache_key)
 
     if video_urls is None:
         from videos.models import Video
-        video_urls = [vu.effective_url for vu
-                 in Video.objects.get(video_id=video_id).videourl_set.all()]
+        video_urls = _calc_video_urls(Video.objects.get(video_id=video_id))
         cache.set(cache_key, video_urls, TIMEOUT)
 
+    local_cache.set(video_id, local_key, video_urls)
     return video_urls
 
 def get_subtitles_dict(video_id, language_pk, version_number, 
                        subtitles_dict_fn, is_remote=False):
 
+    local_key = ('subtitles', video_id, language_pk, version_number)
+    cached_value = local_cache.get(local_key)
+    if cached_value is not None:
+        return cached_value
+
     cache_key = _subtitles_dict_key(video_id, language_pk, version_number)
     cached_value = cache.get(cache_key)
 
@@ -218,25 +251,17 @@ def get_subtitles_dict(video_id, language_pk, version_number,
 
             cache.set(cache_key, cached_value, TIMEOUT)
 
+    if cached_value is not None:
+        local_cache.set(video_id, local_key, cached_value)
     return cached_value
 
 def get_video_languages(video_id):
-    from apps.widget.rpc import language_summary
-
     cache_key = _video_languages_key(video_id)
     value = cache.get(cache_key)
 
     if value is None:
         from videos.models import Video
-        video = Video.objects.get(video_id=video_id)
-        languages = video.newsubtitlelanguage_set.having_nonempty_versions()
-
-        team_video = video.get_team_video()
-
-        if team_video:
-            languages = languages.filter(language_code__in=team_video.team.get_readable_langs())
-
-        value = [language_summary(l) for l in languages]
+        value = _calc_video_languages(Video.objects.get(video_id=video_id))
         cache.set(cache_key, value, TIMEOUT)
 
     return value
@@ -296,8 +321,7 @@ def get_is_moderated(video_id):
 
     if value is None:
         from videos.models import Video
-        video = Video.objects.get(video_id=video_id)
-        value = video.is_moderated
+        value = _calc_is_moderated(Video.objects.get(video_id=video_id))
         cache.set(cache_key, value, TIMEOUT)
 
     return value
@@ -308,8 +332,8 @@ def get_download_filename(video_id):
 
     if value is None:
         from videos.models import Video
-        video = Video.objects.get(video_id=video_id)
-        value = video.get_download_filename()
+        value = _calc_download_filename(
+            Video.objects.get(video_id=video_id))
         cache.set(cache_key, value, TIMEOUT)
 
     return value
@@ -326,24 +350,141 @@ def get_visibility_policies(video_id):
         except Video.DoesNotExist:
             return {}
 
-        team_video = video.get_team_video()
+        value = _calc_visibility_policies(video)
+        cache.set(cache_key, value, TIMEOUT)
 
-        if team_video:
-            team = team_video.team
-            is_public = team.is_visible
-            team_id = team.id
-        else:
-            is_public = True
-            team_id = None
+    return value
 
-        value = {
-            "is_public": is_public,
-            "team_id": team_id
-        }
+# Functions to calculate values from the DB
+def _calc_language_pk(video, language_code):
+    sl = video.subtitle_language(language_code)
+    return None if sl is None else sl.pk
 
-        cache.set(cache_key, value, TIMEOUT)
+def _calc_video_urls(video):
+    return [vu.effective_url for vu in video.videourl_set.all()]
 
-    return value
+def _calc_video_languages(video):
+    from apps.widget.rpc import language_summary
+
+    languages = video.newsubtitlelanguage_set.having_nonempty_versions()
+
+    team_video = video.get_team_video()
+
+    if team_video:
+        languages = languages.filter(language_code__in=team_video.team.get_readable_langs())
+
+    return [language_summary(l) for l in languages]
+
+def _calc_is_moderated(video):
+    return video.is_moderated
+
+def _calc_download_filename(video):
+    return video.get_download_filename()
+
+def _calc_visibility_policies(video):
+    team_video = video.get_team_video()
+
+    if team_video:
+        team = team_video.team
+        is_public = team.is_visible
+        team_id = team.id
+    else:
+        is_public = True
+        team_id = None
+
+    return {
+        "is_public": is_public,
+        "team_id": team_id
+    }
+
+# Batched lookups
+def get_widget_data(video_id, language_codes=()):
+    """Get all the data that the widget needs for a video at once.
+
+    This works like calling get_video_urls(), get_is_moderated(),
+    get_download_filename(), get_visibility_policies(), get_video_languages()
+    and pk_for_default_language() for each language code, but it only makes
+    2 cache requests: one for the namespace generation and one get_many() for
+    all the values.  Any missing values are calculated using a single Video
+    lookup and stored using set_many().
+
+    :param language_codes: language codes to pass to
+        pk_for_default_language()
+    :returns: dict with video_urls, is_moderated, filename,
+        visibility_policies, video_languages keys, plus a language_pks key
+        that maps the codes in language_codes to SubtitleLanguage pks.
+    :raises Video.DoesNotExist: if values need to be calculated, but the
+        video doesn't exist
+    """
+    generation = video_namespace.generation(video_id)
+    # list of (name, cache key, local key, calc_func) tuples
+    lookups = [
+        ('video_urls', _video_urls_key(video_id, generation),
+         ('video_urls', video_id), _calc_video_urls),
+        ('is_moderated', _video_is_moderated_key(video_id, generation),
+         None, _calc_is_moderated),
+        ('filename', _video_filename_key(video_id, generation),
+         None, _calc_download_filename),
+        ('visibility_policies',
+         _video_visibility_policy_key(video_id, generation),
+         None, _calc_visibility_policies),
+        ('video_languages', _video_languages_key(video_id, generation),
+         None, _calc_video_languages),
+    ]
+    for language_code in set(code or None for code in language_codes):
+        lookups.append((
+            ('language_pk', language_code),
+            _subtitle_language_pk_key(video_id, language_code, generation),
+            ('sl_pk', video_id, language_code),
+            lambda video, language_code=language_code:
+                _calc_language_pk(video, language_code),
+        ))
+
+    values = {}
+    found_locally = set()
+    for name, cache_key, local_key, calc_func in lookups:
+        if local_key is not None:
+            value = local_cache.get(local_key, _missing)
+            if value is not _missing:
+                values[name] = value
+                found_locally.add(name)
+
+    cache_keys = [cache_key for name, cache_key, local_key, calc_func
+                  in lookups if name not in values]
+    if cache_keys:
+        cached_values = cache.get_many(cache_keys)
+    else:
+        cached_values = {}
+
+    to_set = {}
+    video = None
+    for name, cache_key, local_key, calc_func in lookups:
+        if name in values:
+            continue
+        value = cached_values.get(cache_key)
+        if value is None:
+            if video is None:
+                from videos.models import Video
+                video = Video.objects.get(video_id=video_id)
+            value = calc_func(video)
+            to_set[cache_key] = value
+        values[name] = value
+    if to_set:
+        cache.set_many(to_set, TIMEOUT)
+
+    for name, cache_key, local_key, calc_func in lookups:
+        if local_key is not None and name not in found_locally:
+            local_cache.set(video_id, local_key, values[name])
+
+    rv = {
+        'language_pks': {},
+    }
+    for name, value in values.items():
+        if isinstance(name, tuple):
+            rv['language_pks'][name[1]] = value
+        else:
+            rv[name] = value
+    return rv
 
 # Writelocking
 def _writelocked_store_langs(video_id, langs):
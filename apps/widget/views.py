@@ -40,6 +40,7 @@ from simplejson.decoder import JSONDecodeError
 
 import widget
 from auth.models import CustomUser
+from subtitles import downloads
 from teams.models import Task
 from teams.permissions import get_member
 from uslogging.models import WidgetDialogCall
@@ -335,10 +336,7 @@ def download_subtitles(request, format):
     if not format in babelsubs.get_available_formats():
         raise HttpResponseServerError("Format not found")
     
-    subs_text = babelsubs.to(version.get_subtitles(), format, language=version.language_code)
-    # since this is a downlaod, we can afford not to escape tags, specially true
-    # since speaker change is denoted by '>>' and that would get entirely stripped out
-    response = HttpResponse(subs_text, mimetype="text/plain")
+    response = downloads.download_response(request, version, format)
     original_filename = '%s.%s' % (video.lang_filename(language.language_code), format)
 
     if not 'HTTP_USER_AGENT' in request.META or u'WebKit' in request.META['HTTP_USER_AGENT']:
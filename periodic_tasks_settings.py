@@ -69,7 +69,8 @@ CELERYBEAT_SCHEDULE = {
     },
     'update_feeds': {
         'task': 'videos.tasks.update_from_feed',
-        'schedule': crontab(minute=0),
+        # feeds are scheduled individually, see VideoFeed.next_update
+        'schedule': crontab(minute='*/15'),
     },
     'gauge_videos': {
         'task': 'videos.tasks.gauge_videos',
@@ -539,6 +539,14 @@ FEEDBACK_RESPONSE_TEMPLATE = 'feedback_response.html'
 #teams
 TEAMS_ON_PAGE = 12
 
+# Store new subtitle versions using the compact binary format (see
+# apps/subtitles/storage.py)
+COMPACT_SUBTITLE_STORAGE = False
+# Store new subtitle versions as deltas against the version before them.
+# Every SUBTITLE_DELTA_KEYFRAME_INTERVAL versions we store the full subtitles.
+DELTA_SUBTITLE_STORAGE = False
+SUBTITLE_DELTA_KEYFRAME_INTERVAL = 10
+
 PROJECT_VERSION = '0.5'
 
 EDIT_END_THRESHOLD = 120
@@ -574,6 +582,12 @@ EMAIL_BCC_LIST = []
 
 CACHE_BACKEND = 'locmem://'
 
+# Size of the in-process cache for widget.video_cache lookups.  Set this to 0
+# to disable it.
+VIDEO_CACHE_LOCAL_SIZE = 0
+# Max number of seconds to keep entries in the in-process cache
+VIDEO_CACHE_LOCAL_TIMEOUT = 10
+
 #for unisubs.example.com
 RECAPTCHA_PUBLIC = '6LdoScUSAAAAANmmrD7ALuV6Gqncu0iJk7ks7jZ0'
 RECAPTCHA_SECRET = ' 6LdoScUSAAAAALvQj3aI1dRL9mHgh85Ks2xZH1qc'
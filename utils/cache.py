@@ -0,0 +1,256 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along
+# with this program.  If not, see http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""Cache keys that can be invalidated as a group.
+
+A KeyNamespace groups together all the cache keys for an object (a video, a
+team, etc).  Each object has a generation number stored in the cache, which
+gets embedded in all of its keys.  To invalidate all of the keys at once, we
+just bump the generation number.  The old keys never get read again and
+eventually expire.
+
+This means that invalidation is a single cache operation, no matter how many
+keys there are, and we don't need to know which keys were actually set.
+
+LocalCache is a small in-process cache that can sit in front of the Django
+cache for values that get read very often.
+"""
+
+from collections import OrderedDict
+import cPickle as pickle
+import threading
+import time
+
+from django.core.cache import cache
+
+from utils.metrics import Meter
+
+# This should be longer than the timeout of any key in the namespace
+GENERATION_TIMEOUT = 60 * 60 * 24 * 10 # 10 days
+
+def _new_generation():
+    # Use the current time rather than starting at 0.  If the generation key
+    # gets evicted, this ensures that we won't reuse an older generation and
+    # read stale data.
+    return int(time.time() * 1000)
+
+class KeyNamespace(object):
+    """Manage cache keys for a type of object.
+
+    :param prefix: string to prefix all keys with.  Each namespace should use
+        a different prefix.
+    """
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+    def _generation_key(self, obj_id):
+        return u'{0}-{1}-generation'.format(self.prefix, obj_id)
+
+    def generation(self, obj_id):
+        """Get the current generation number for an object."""
+        generation_key = self._generation_key(obj_id)
+        value = cache.get(generation_key)
+        if value is None:
+            value = _new_generation()
+            if not cache.add(generation_key, value, GENERATION_TIMEOUT):
+                # someone else set the generation before us, use theirs
+                value = cache.get(generation_key, value)
+        return value
+
+    def key(self, obj_id, name, generation=None):
+        """Get a cache key for an object.
+
+        :param obj_id: id of the object the key is for
+        :param name: name of the key.  This must be unique for each value
+            stored for the object.
+        :param generation: generation number to use.  Pass this in if you've
+            already fetched it to avoid another cache request.
+        """
+        if generation is None:
+            generation = self.generation(obj_id)
+        return u'{0}-{1}-{2}-{3}'.format(self.prefix, obj_id, generation,
+                                         name)
+
+    def invalidate(self, obj_id):
+        """Invalidate all keys for an object."""
+        generation_key = self._generation_key(obj_id)
+        try:
+            cache.incr(generation_key)
+        except ValueError:
+            # the key isn't in the cache, so there's nothing to invalidate.
+            # We still set a new generation to be safe in case another
+            # process is setting the old one right now.
+            cache.set(generation_key, _new_generation(), GENERATION_TIMEOUT)
+
+class LocalCache(object):
+    """In-process LRU cache to put in front of the Django cache.
+
+    Each entry belongs to a group (for example, all entries for a video).
+    invalidate() drops all entries for a group in this process and records the
+    invalidation in the Django cache.  Other processes check that record at
+    most once every poll_interval seconds and drop their entries for the
+    group too.  If a process falls too far behind, it just clears everything.
+
+    Entries also expire after timeout seconds, which limits how stale they
+    can get if something goes wrong.
+
+    Values are stored pickled, so that like with the Django cache, callers
+    get a new copy each time and can modify it.
+
+    Hit and miss counts are sent to our metrics server every
+    metrics_interval seconds.
+
+    :param name: name for the cache, used for the Django cache keys and the
+        metrics names
+    :param max_size: max number of entries to store.  If this is 0, the
+        cache is disabled: get() always misses and set()/invalidate() do
+        nothing.
+    :param timeout: max number of seconds to keep an entry
+    """
+    # how many invalidations to keep in the Django cache
+    LOG_SIZE = 100
+    LOG_TIMEOUT = 60 * 10
+
+    def __init__(self, name, max_size, timeout, poll_interval=1,
+                 metrics_interval=60):
+        self.name = name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.metrics_interval = metrics_interval
+        self.lock = threading.Lock()
+        # maps keys to (expire_time, group, value) tuples
+        self.entries = OrderedDict()
+        # maps groups to sets of keys
+        self.groups = {}
+        self.last_seq = None
+        self.next_poll = 0
+        self.hits = self.misses = 0
+        self.next_metrics_report = time.time() + metrics_interval
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def _seq_key(self):
+        return u'{0}-invalidation-seq'.format(self.name)
+
+    def _log_key(self, seq):
+        return u'{0}-invalidation-{1}'.format(self.name, seq)
+
+    def get(self, key, default=None):
+        """Get a value from the cache.
+
+        :returns: the cached value, or default if it's not present
+        """
+        if not self.enabled:
+            return default
+        now = time.time()
+        if now >= self.next_poll:
+            self._check_invalidations()
+            self.next_poll = now + self.poll_interval
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None and entry[0] > now:
+                # re-insert the entry to mark it as the most recently used
+                self.entries[key] = entry
+                self.hits += 1
+            else:
+                if entry is not None:
+                    self._forget_key(key, entry[1])
+                    entry = None
+                self.misses += 1
+        if now >= self.next_metrics_report:
+            self._report_metrics(now)
+        if entry is None:
+            return default
+        return pickle.loads(entry[2])
+
+    def set(self, group, key, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            old_entry = self.entries.pop(key, None)
+            if old_entry is not None:
+                self._forget_key(key, old_entry[1])
+            self.entries[key] = (time.time() + self.timeout, group,
+                                 pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+            self.groups.setdefault(group, set()).add(key)
+            while len(self.entries) > self.max_size:
+                old_key, old_entry = self.entries.popitem(last=False)
+                self._forget_key(old_key, old_entry[1])
+
+    def invalidate(self, group):
+        """Invalidate all entries for group, in all processes."""
+        if not self.enabled:
+            return
+        self._drop_group(group)
+        try:
+            seq = cache.incr(self._seq_key())
+        except ValueError:
+            # Start the sequence with a time-based value for the same reason
+            # as KeyNamespace does.
+            cache.add(self._seq_key(), _new_generation(), GENERATION_TIMEOUT)
+            seq = cache.incr(self._seq_key())
+        cache.set(self._log_key(seq), group, self.LOG_TIMEOUT)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.groups.clear()
+
+    def _forget_key(self, key, group):
+        # needs to be called with the lock held
+        keys = self.groups.get(group)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.groups[group]
+
+    def _drop_group(self, group):
+        with self.lock:
+            for key in self.groups.pop(group, ()):
+                self.entries.pop(key, None)
+
+    def _check_invalidations(self):
+        seq = cache.get(self._seq_key())
+        if seq == self.last_seq:
+            return
+        # If we haven't seen the sequence number before, or it was evicted,
+        # then we can't tell what's been invalidated.
+        if (self.last_seq is None or seq is None or seq < self.last_seq or
+            seq - self.last_seq > self.LOG_SIZE):
+            self.clear()
+        else:
+            log_keys = [self._log_key(i)
+                        for i in xrange(self.last_seq + 1, seq + 1)]
+            groups = cache.get_many(log_keys)
+            if len(groups) < len(log_keys):
+                # some of the log entries are missing, play it safe
+                self.clear()
+            else:
+                for group in groups.values():
+                    self._drop_group(group)
+        self.last_seq = seq
+
+    def _report_metrics(self, now):
+        with self.lock:
+            hits, misses = self.hits, self.misses
+            self.hits = self.misses = 0
+            self.next_metrics_report = now + self.metrics_interval
+        Meter('local-cache.{0}.hits'.format(self.name)).inc(hits)
+        Meter('local-cache.{0}.misses'.format(self.name)).inc(misses)
@@ -0,0 +1,124 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along
+# with this program.  If not, see http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""Coalesce bursts of task calls into a single run.
+
+Some tasks get triggered several times in a row for the same object, for
+example pushing subtitles to a video site each time they're edited.  A
+CoalescingQueue runs the task once, after the changes stop coming in.
+
+Usage:
+
+queue = CoalescingQueue('my-queue', quiet_period=60, max_wait=600)
+
+def on_change(obj):
+    queue.add(obj.id, my_task, args=(obj.id,), value=obj.version)
+
+@task
+def my_task(obj_id):
+    if queue.reschedule(obj_id, my_task, args=(obj_id,)):
+        return
+    version = queue.pop(obj_id)
+    ...
+"""
+
+import time
+
+from django.core.cache import cache
+
+class CoalescingQueue(object):
+    """Schedule tasks to run once changes for a key stop coming in.
+
+    :param name: name for the queue, used to build cache keys
+    :param quiet_period: run the task once there have been no changes for
+        this many seconds
+    :param max_wait: never wait longer than this many seconds after the first
+        change before running the task
+    """
+    def __init__(self, name, quiet_period, max_wait):
+        self.name = name
+        self.quiet_period = quiet_period
+        self.max_wait = max_wait
+        # this is a fallback in case a task gets lost somehow
+        self.timeout = max_wait * 2
+
+    def _pending_key(self, key):
+        return u'{0}-pending-{1}'.format(self.name, key)
+
+    def _last_change_key(self, key):
+        return u'{0}-last-change-{1}'.format(self.name, key)
+
+    def _value_key(self, key):
+        return u'{0}-value-{1}'.format(self.name, key)
+
+    def add(self, key, task, args=(), value=None):
+        """Record a change and schedule task if it's not already pending.
+
+        :param key: identifies what changed.  Changes with the same key get
+            coalesced.
+        :param task: celery task to run
+        :param args: arguments to pass to task
+        :param value: value to store with the change.  pop() returns the
+            value from the latest change.
+        """
+        now = time.time()
+        cache.set_many({
+            self._last_change_key(key): now,
+            self._value_key(key): value,
+        }, self.timeout)
+        # the pending key stores the time of the first change
+        if cache.add(self._pending_key(key), now, self.timeout):
+            task.apply_async(args=args, countdown=self.quiet_period)
+
+    def wait_time(self, key):
+        """Get the number of seconds to wait before running the task."""
+        now = time.time()
+        values = cache.get_many([self._pending_key(key),
+                                 self._last_change_key(key)])
+        first_change = values.get(self._pending_key(key))
+        last_change = values.get(self._last_change_key(key))
+        if first_change is None or last_change is None:
+            return 0
+        return max(0, min(last_change + self.quiet_period,
+                          first_change + self.max_wait) - now)
+
+    def reschedule(self, key, task, args=()):
+        """Reschedule task if changes are still coming in.
+
+        Tasks should call this first thing.  If it returns True, the task has
+        been scheduled to run again later and should just return.
+
+        Tasks run eagerly (for example in the unittests) are never
+        rescheduled.
+        """
+        wait_time = self.wait_time(key)
+        if wait_time <= 0 or task.request.is_eager:
+            return False
+        task.apply_async(args=args, countdown=wait_time)
+        return True
+
+    def pop(self, key):
+        """Get the value from the latest change and clear the pending state.
+
+        Changes that come in after this get scheduled in a new run of the
+        task.
+        """
+        # Delete the pending key before reading the value.  If a change comes
+        # in between the two, it schedules a new task instead of getting
+        # lost.
+        cache.delete(self._pending_key(key))
+        return cache.get(self._value_key(key))
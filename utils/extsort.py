@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along
+# with this program.  If not, see http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""Sort iterables that are too big to comfortably keep in memory."""
+
+import cPickle as pickle
+import heapq
+import tempfile
+
+def _read_run(f, key, run_index):
+    f.seek(0)
+    seq = 0
+    while True:
+        try:
+            item = pickle.load(f)
+        except EOFError:
+            return
+        # run_index and seq make the sort stable and ensure that we never
+        # compare the items themselves.
+        yield (key(item), run_index, seq), item
+        seq += 1
+
+def external_sort(iterable, key, run_size=10000):
+    """Sort the items from iterable, using temp files to bound memory usage.
+
+    Items are sorted in memory in runs of run_size.  If there's more than one
+    run, they get pickled to temp files and merged together at the end.  Like
+    sorted(), the sort is stable.
+
+    :returns: iterator that yields the items in order
+    """
+    runs = []
+    buf = []
+    try:
+        for item in iterable:
+            buf.append(item)
+            if len(buf) >= run_size:
+                buf.sort(key=key)
+                f = tempfile.TemporaryFile()
+                for buffered_item in buf:
+                    pickle.dump(buffered_item, f, pickle.HIGHEST_PROTOCOL)
+                runs.append(f)
+                buf = []
+        buf.sort(key=key)
+        if not runs:
+            for item in buf:
+                yield item
+            return
+        iterators = [_read_run(run, key, i) for i, run in enumerate(runs)]
+        # the last run can stay in memory
+        iterators.append(((key(item), len(runs), seq), item)
+                         for seq, item in enumerate(buf))
+        for sort_key, item in heapq.merge(*iterators):
+            yield item
+    finally:
+        for f in runs:
+            f.close()
@@ -1,7 +1,10 @@
 from utils.tests.behaviors import *
 from utils.tests.behaviors import *
 from utils.tests.chunkediter import *
+from utils.tests.extsort import *
 from utils.tests.bleech import *
+from utils.tests.cache import *
+from utils.tests.coalesce import *
 from utils.tests.compress import *
 from utils.tests.multiqueryset import *
 from utils.tests.text import *
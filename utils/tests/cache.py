@@ -0,0 +1,146 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along
+# with this program.  If not, see http://www.gnu.org/licenses/agpl-3.0.html.
+
+from django.core.cache import cache
+from django.test import TestCase
+import mock
+
+from utils.cache import KeyNamespace, LocalCache
+
+class KeyNamespaceTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.namespace = KeyNamespace('test-namespace')
+
+    def test_invalidate(self):
+        cache.set(self.namespace.key(1, 'a'), 'value-1a')
+        cache.set(self.namespace.key(1, 'b'), 'value-1b')
+        cache.set(self.namespace.key(2, 'a'), 'value-2a')
+        self.namespace.invalidate(1)
+        self.assertEquals(cache.get(self.namespace.key(1, 'a')), None)
+        self.assertEquals(cache.get(self.namespace.key(1, 'b')), None)
+        # other objects shouldn't be affected
+        self.assertEquals(cache.get(self.namespace.key(2, 'a')), 'value-2a')
+
+    def test_generation_is_stable(self):
+        self.assertEquals(self.namespace.key(1, 'a'),
+                          self.namespace.key(1, 'a'))
+        self.assertNotEquals(self.namespace.key(1, 'a'),
+                             self.namespace.key(1, 'b'))
+
+    def test_generation_evicted(self):
+        # if the generation key gets evicted, we shouldn't go back to an old
+        # generation.
+        with mock.patch('time.time') as mock_time:
+            mock_time.return_value = 1000.0
+            old_key = self.namespace.key(1, 'a')
+            cache.set(old_key, 'value')
+            cache.delete(self.namespace._generation_key(1))
+            mock_time.return_value = 1001.0
+            self.assertNotEquals(self.namespace.key(1, 'a'), old_key)
+
+class LocalCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def make_local_cache(self, max_size=10, timeout=10):
+        # use poll_interval=0 so that we check for invalidations on every
+        # get() call
+        return LocalCache('test-local-cache', max_size, timeout,
+                          poll_interval=0)
+
+    def test_get_and_set(self):
+        local_cache = self.make_local_cache()
+        self.assertEquals(local_cache.get('a'), None)
+        self.assertEquals(local_cache.get('a', 'default'), 'default')
+        local_cache.set('group', 'a', ['value'])
+        self.assertEquals(local_cache.get('a'), ['value'])
+        # we should get a copy of the value each time
+        local_cache.get('a').append('changed')
+        self.assertEquals(local_cache.get('a'), ['value'])
+
+    def test_lru(self):
+        local_cache = self.make_local_cache(max_size=2)
+        local_cache.set('group', 'a', 1)
+        local_cache.set('group', 'b', 2)
+        # access a, so that b becomes the least recently used entry
+        local_cache.get('a')
+        local_cache.set('group', 'c', 3)
+        self.assertEquals(local_cache.get('a'), 1)
+        self.assertEquals(local_cache.get('b'), None)
+        self.assertEquals(local_cache.get('c'), 3)
+
+    def test_timeout(self):
+        local_cache = self.make_local_cache(timeout=10)
+        with mock.patch('time.time') as mock_time:
+            mock_time.return_value = 1000.0
+            local_cache.set('group', 'a', 1)
+            mock_time.return_value = 1009.0
+            self.assertEquals(local_cache.get('a'), 1)
+            mock_time.return_value = 1011.0
+            self.assertEquals(local_cache.get('a'), None)
+
+    def test_disabled(self):
+        local_cache = self.make_local_cache(max_size=0)
+        local_cache.set('group', 'a', 1)
+        self.assertEquals(local_cache.get('a'), None)
+
+    def test_invalidate(self):
+        # simulate 2 processes by creating 2 LocalCache objects
+        local_cache = self.make_local_cache()
+        other_local_cache = self.make_local_cache()
+        local_cache.invalidate('group-3')
+        for lc in (local_cache, other_local_cache):
+            # the first get() syncs up with the invalidation log
+            lc.get('a')
+            lc.set('group-1', 'a', 1)
+            lc.set('group-1', 'b', 2)
+            lc.set('group-2', 'c', 3)
+        local_cache.invalidate('group-1')
+        for lc in (local_cache, other_local_cache):
+            self.assertEquals(lc.get('a'), None)
+            self.assertEquals(lc.get('b'), None)
+            self.assertEquals(lc.get('c'), 3)
+
+    def test_invalidation_log_missing(self):
+        local_cache = self.make_local_cache()
+        other_local_cache = self.make_local_cache()
+        local_cache.invalidate('group-1')
+        other_local_cache.get('a')
+        other_local_cache.set('group-2', 'a', 1)
+        local_cache.invalidate('group-1')
+        # if we can't tell which groups were invalidated, we should clear
+        # everything
+        cache.clear()
+        self.assertEquals(other_local_cache.get('a'), None)
+
+    @mock.patch('utils.cache.Meter')
+    def test_metrics(self, mock_meter):
+        local_cache = LocalCache('test-local-cache', 10, 10,
+                                 metrics_interval=0)
+        local_cache.set('group', 'a', 1)
+        local_cache.get('a')
+        local_cache.get('b')
+        self.assertEquals(mock_meter.call_args_list, [
+            mock.call('local-cache.test-local-cache.hits'),
+            mock.call('local-cache.test-local-cache.misses'),
+            mock.call('local-cache.test-local-cache.hits'),
+            mock.call('local-cache.test-local-cache.misses'),
+        ])
+        self.assertEquals(mock_meter.return_value.inc.call_args_list, [
+            mock.call(1), mock.call(0), mock.call(0), mock.call(1),
+        ])
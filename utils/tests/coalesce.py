@@ -0,0 +1,105 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along
+# with this program.  If not, see http://www.gnu.org/licenses/agpl-3.0.html.
+
+from django.core.cache import cache
+from django.test import TestCase
+import mock
+
+from utils.coalesce import CoalescingQueue
+
+class CoalescingQueueTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.queue = CoalescingQueue('test-queue', quiet_period=10,
+                                     max_wait=60)
+        self.task = mock.Mock()
+        self.task.request.is_eager = False
+        self.time_patcher = mock.patch('time.time')
+        self.mock_time = self.time_patcher.start()
+        self.mock_time.return_value = 1000.0
+
+    def tearDown(self):
+        self.time_patcher.stop()
+
+    def test_add_schedules_once(self):
+        self.queue.add(1, self.task, args=(1,), value='a')
+        self.queue.add(1, self.task, args=(1,), value='b')
+        self.assertEquals(self.task.apply_async.call_count, 1)
+        self.task.apply_async.assert_called_with(args=(1,), countdown=10)
+        # other keys get their own task
+        self.queue.add(2, self.task, args=(2,))
+        self.assertEquals(self.task.apply_async.call_count, 2)
+
+    def test_pop(self):
+        self.queue.add(1, self.task, args=(1,), value='a')
+        self.queue.add(1, self.task, args=(1,), value='b')
+        self.assertEquals(self.queue.pop(1), 'b')
+        # after popping, the next change should schedule a new task
+        self.queue.add(1, self.task, args=(1,), value='c')
+        self.assertEquals(self.task.apply_async.call_count, 2)
+
+    def test_add_during_pop(self):
+        self.queue.add(1, self.task, args=(1,), value='a')
+        # simulate another change coming in between the cache operations
+        # that pop() makes
+        real_get = cache.get
+        real_delete = cache.delete
+        changes = ['b']
+        def add_change():
+            if changes:
+                self.queue.add(1, self.task, args=(1,), value=changes.pop())
+        def get(*args, **kwargs):
+            rv = real_get(*args, **kwargs)
+            add_change()
+            return rv
+        def delete(*args, **kwargs):
+            rv = real_delete(*args, **kwargs)
+            add_change()
+            return rv
+        with mock.patch.object(cache, 'get', get):
+            with mock.patch.object(cache, 'delete', delete):
+                self.queue.pop(1)
+        # the change should have scheduled a new task, which will see the
+        # latest value
+        self.assertEquals(self.task.apply_async.call_count, 2)
+        self.assertEquals(self.queue.pop(1), 'b')
+
+    def test_reschedule_after_more_changes(self):
+        self.queue.add(1, self.task, args=(1,))
+        self.mock_time.return_value = 1005.0
+        self.queue.add(1, self.task, args=(1,))
+        self.mock_time.return_value = 1010.0
+        # the last change was 5 seconds ago, so we should wait 5 more
+        self.assertTrue(self.queue.reschedule(1, self.task, args=(1,)))
+        self.task.apply_async.assert_called_with(args=(1,), countdown=5.0)
+        self.mock_time.return_value = 1015.0
+        self.assertFalse(self.queue.reschedule(1, self.task, args=(1,)))
+
+    def test_max_wait(self):
+        for i in range(12):
+            self.mock_time.return_value = 1000.0 + i * 5
+            self.queue.add(1, self.task, args=(1,))
+        # changes keep coming in, but we shouldn't wait past max_wait
+        self.mock_time.return_value = 1055.0
+        self.assertEquals(self.queue.wait_time(1), 5.0)
+        self.mock_time.return_value = 1060.0
+        self.assertFalse(self.queue.reschedule(1, self.task, args=(1,)))
+
+    def test_no_reschedule_when_eager(self):
+        self.task.request.is_eager = True
+        self.queue.add(1, self.task, args=(1,))
+        self.assertFalse(self.queue.reschedule(1, self.task, args=(1,)))
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2013 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from django.test import TestCase
+
+from utils.extsort import external_sort
+
+class ExternalSortTest(TestCase):
+    def check_sort(self, data, run_size):
+        key = lambda item: item[0]
+        self.assertEqual(list(external_sort(data, key, run_size)),
+                         sorted(data, key=key))
+
+    def test_sort(self):
+        data = [(3, 'a'), (1, 'b'), (2, 'c'), (1, 'd'), (3, 'e'), (0, 'f'),
+                (2, 'g')]
+        # run_size=1 and 3 make us merge multiple runs from temp files,
+        # the large run_size sorts everything in memory
+        for run_size in (1, 3, 100):
+            self.check_sort(data, run_size)
+
+    def test_empty(self):
+        self.check_sort([], 1)
+        self.check_sort([], 100)